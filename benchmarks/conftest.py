@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from benchmarks import fixtures
+from benchmarks.stand_in import StandInServer
+
+
+@pytest.fixture(scope="session")
+def fixture_dir(tmp_path_factory):
+    """
+    Recorded fixtures from $ATLAS_BENCH_FIXTURES (see benchmarks/record.py), or a synthetic set of the same shape
+    """
+    recorded = os.environ.get("ATLAS_BENCH_FIXTURES")
+    if recorded:
+        return Path(recorded)
+    return fixtures.build(tmp_path_factory.mktemp("fixtures"))
+
+
+@pytest.fixture(scope="session")
+def stand_in(fixture_dir):
+    with StandInServer(fixture_dir) as server:
+        yield server
+
+
+@pytest.fixture
+def ssb(stand_in, monkeypatch):
+    """
+    Point the results and mapping collectors at the stand-in server with fresh (cold) clients
+    """
+    from src.utils.fetch import ResilientFetcher
+    from src.nor.nor_klass import KlassMappingService
+    from src.nor.nor_div_mapping import StatNorMappings
+    from src.nor.nor_results import NorResultsParliament
+    from src.nor.nor_pxweb import PxWebQueryPlanner
+    from src.nor.nor_engine import NorResultsEngine
+
+    fetcher = ResilientFetcher(max_retries=0)
+    klass_api = f"{stand_in.url}/api/klass/v1/classifications"
+    ssb_api = f"{stand_in.url}/api/v0/no/table"
+    monkeypatch.setattr(NorResultsParliament, "SSB_API", ssb_api)
+    monkeypatch.setattr(NorResultsParliament, "fetcher", fetcher)
+    pxweb = PxWebQueryPlanner(fetcher, ssb_api)
+    monkeypatch.setattr(NorResultsParliament, "pxweb", pxweb)
+    # no cube cache, so every round measures the fetch
+    monkeypatch.setattr(NorResultsParliament, "engine", NorResultsEngine("parliamentary", pxweb, ttl=0))
+    monkeypatch.setattr(StatNorMappings, "KLASS_API", klass_api)
+    monkeypatch.setattr(StatNorMappings, "fetcher", fetcher)
+    monkeypatch.setattr(StatNorMappings, "klass", KlassMappingService(fetcher, klass_api))
+    return stand_in
+
+
+@pytest.fixture(scope="session")
+def level_2_codes(fixture_dir):
+    return fixtures.level_2_codes(fixture_dir)
@@ -0,0 +1,217 @@
+import io
+import json
+import random
+import zipfile
+from pathlib import Path
+
+YEAR = 2021
+UPDATED = f"{YEAR}-09-14T06:00:00Z"
+GEOJSON_ZIP = "Basisdata_0000_Norge_4258_Kommuner_GEOJSON.zip"
+
+PARTIES = [
+    ("01", "Arbeiderpartiet"), ("02", "Fremskrittspartiet"), ("03", "Høyre"), ("04", "Kristelig Folkeparti"),
+    ("05", "Senterpartiet"), ("06", "Sosialistisk Venstreparti"), ("07", "Venstre"),
+    ("08", "Miljøpartiet De Grønne"), ("55", "Rødt"), ("09", "Andre"),
+]
+
+
+def jsonstat(dimensions: dict, values: list) -> dict:
+    """
+    Minimal json-stat2 dataset in the shape returned by SSB's PxWeb API
+    :param dimensions: dimension id -> list of (code, label)
+    """
+    return {
+        "version": "2.0",
+        "class": "dataset",
+        "updated": UPDATED,
+        "id": list(dimensions),
+        "size": [len(categories) for categories in dimensions.values()],
+        "dimension": {
+            name: {
+                "label": name,
+                "category": {
+                    "index": {code: i for i, (code, _) in enumerate(categories)},
+                    "label": {code: label for code, label in categories},
+                },
+            }
+            for name, categories in dimensions.items()
+        },
+        "value": values,
+    }
+
+
+def units(n_level_1=15, n_level_2=357):
+    """
+    Synthetic level 1 -> level 2 unit tree with Norwegian-style codes
+    """
+    tree = {}
+    for i in range(n_level_2):
+        level_1 = f"{(i % n_level_1) + 31:02d}"
+        tree.setdefault(level_1, []).append(f"{level_1}{len(tree.get(level_1, [])) + 1:02d}")
+    return tree
+
+
+def write(path: Path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def build(fixture_dir, year=YEAR, n_level_2=357, seed=0):
+    """
+    Write a synthetic fixture set in the recorded layout served by StandInServer:
+        * KLASS correspondsAt tables for counties (104) and electoral districts (543)
+        * PxWeb metadata and json-stat2 responses for tables 11691, 08092 and 08243 for every level 2 unit
+        * A Kartverket-style zipped GeoJSON of level 2 polygons on a jittered grid
+    """
+    fixture_dir = Path(fixture_dir)
+    rng = random.Random(seed)
+    tree = units(n_level_2=n_level_2)
+
+    items = [
+        {"sourceCode": level_1, "sourceName": f"Fylke {level_1}", "targetCode": code, "targetName": f"Kommune {code}"}
+        for level_1, codes in tree.items() for code in codes
+    ]
+    for classification in ("104", "543"):
+        key = f"date={year}-04-01&targetClassificationId=131.json"
+        write(fixture_dir / "klass" / classification / "correspondsAt" / key, {"correspondenceItems": items})
+
+    for codes in tree.values():
+        for code in codes:
+            region = [(code, f"{code} Kommune {code}")]
+            valid_ed, valid_early = rng.randint(500, 50000), rng.randint(200, 30000)
+            sums = [valid_ed, valid_early, rng.randint(0, 50), rng.randint(0, 50), rng.randint(0, 300),
+                    rng.randint(0, 300)]
+            write(fixture_dir / "ssb" / "11691" / f"{code}.json", jsonstat({
+                "Region": region,
+                "StemmeGyldigNyn": [("1N", "Godkjente"), ("2N", "Forkastede"), ("3N", "Blanke")],
+                "StemmeTidspktNyn": [("1N", "Valgting"), ("2N", "Forhånd")],
+                "Tid": [(str(year), str(year))],
+            }, sums))
+
+            weights = [rng.random() for _ in PARTIES]
+            votes = [round((valid_ed + valid_early) * w / sum(weights)) for w in weights]
+            write(fixture_dir / "ssb" / "08092" / f"{code}.json", jsonstat({
+                "Region": region,
+                "PolitParti": PARTIES,
+                "ContentsCode": [("Godkjente1", "Godkjente stemmesedler")],
+                "Tid": [(str(year), str(year))],
+            }, votes))
+
+            write(fixture_dir / "ssb" / "08243" / f"{code}.json", jsonstat({
+                "Region": region,
+                "ContentsCode": [("Valgdeltakelse", "Valgdeltakelse")],
+                "Tid": [(str(year), str(year))],
+            }, [round(rng.uniform(65, 88), 1)]))
+
+    codes = [code for codes in tree.values() for code in codes]
+    write_metadata(fixture_dir, "11691", codes, year, {
+        "StemmeGyldigNyn": ["1N", "2N", "3N"], "StemmeTidspktNyn": ["1N", "2N"],
+    })
+    write_metadata(fixture_dir, "08092", codes, year, {
+        "PolitParti": [code for code, _ in PARTIES], "ContentsCode": ["Godkjente1"],
+    })
+    write_metadata(fixture_dir, "08243", codes, year, {"ContentsCode": ["Valgdeltakelse"]})
+
+    write_geojson_zip(fixture_dir / "files" / GEOJSON_ZIP, tree, rng)
+    return fixture_dir
+
+
+def write_metadata(fixture_dir: Path, table: str, codes: list, year: int, variables: dict):
+    """
+    PxWeb table metadata (GET /table/{id}/): Region is eliminable, the other variables are not
+    """
+    write(fixture_dir / "ssb" / table / "metadata.json", {
+        "title": f"Table {table}",
+        "variables": [
+            {"code": "Region", "text": "region", "values": codes, "valueTexts": codes, "elimination": True},
+            *[
+                {"code": code, "text": code, "values": values, "valueTexts": values}
+                for code, values in variables.items()
+            ],
+            {"code": "Tid", "text": "år", "values": [str(year)], "valueTexts": [str(year)], "time": True},
+        ],
+    })
+
+
+def write_geojson_zip(path: Path, tree: dict, rng: random.Random, vertices_per_edge=40):
+    """
+    Level 2 polygons on a jittered grid: neighbouring cells share densified edges, as real boundaries do
+    """
+    codes = [code for codes in tree.values() for code in codes]
+    columns = int(len(codes) ** 0.5) + 1
+    step = 0.25
+    jitter = {}
+
+    def point(i, j):
+        if (i, j) not in jitter:
+            jitter[(i, j)] = (rng.uniform(-0.05, 0.05), rng.uniform(-0.05, 0.05))
+        dx, dy = jitter[(i, j)]
+        return 4.5 + i * step + dx, 58.0 + j * step + dy
+
+    def edge(a, b):
+        return [
+            [round(a[0] + (b[0] - a[0]) * k / vertices_per_edge, 6), round(a[1] + (b[1] - a[1]) * k / vertices_per_edge, 6)]
+            for k in range(vertices_per_edge)
+        ]
+
+    features = []
+    for n, code in enumerate(codes):
+        i, j = n % columns, n // columns
+        corners = [point(i, j), point(i + 1, j), point(i + 1, j + 1), point(i, j + 1)]
+        ring = []
+        for a, b in zip(corners, corners[1:] + corners[:1]):
+            ring.extend(edge(a, b))
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "properties": {
+                "kommunenummer": code,
+                "kommunenavn": f"Kommune {code}",
+                "oppdateringsdato": "2021-01-01T00:00:00",
+                "datauttaksdato": "2021-03-01T00:00:00",
+                "gyldigFra": "20200101",
+                "gyldigTil": None,
+            },
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+        })
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("Kommune.geojson", json.dumps({"type": "FeatureCollection", "name": "Kommune", "features": features}))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(buffer.getvalue())
+
+
+def level_2_codes(fixture_dir, year=YEAR) -> list:
+    path = Path(fixture_dir) / "klass" / "104" / "correspondsAt" / f"date={year}-04-01&targetClassificationId=131.json"
+    with open(path, 'r', encoding='utf-8') as f:
+        return [item['targetCode'] for item in json.load(f)['correspondenceItems']]
+
+
+def write_countypres(path: Path, year=2020, n_states=50, counties_per_state=62, seed=0) -> Path:
+    """
+    Synthetic county presidential returns in the MEDSL countypres layout, split by voting mode like the real file,
+    with several candidates under OTHER (one of them without a party) like the real file
+    """
+    import csv
+
+    rng = random.Random(seed)
+    candidates = [("DEMOCRAT", "JOE BIDEN"), ("REPUBLICAN", "DONALD J TRUMP"), ("LIBERTARIAN", "JO JORGENSEN"),
+                  ("GREEN", "HOWIE HAWKINS"), ("OTHER", "OTHER"), ("OTHER", "WRITEIN"), ("", "KANYE WEST")]
+    modes = ["ELECTION DAY", "ABSENTEE", "EARLY VOTING"]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["year", "state", "state_po", "county_name", "county_fips", "office", "candidate", "party",
+                         "candidatevotes", "totalvotes", "version", "mode"])
+        for s in range(1, n_states + 1):
+            for c in range(1, counties_per_state + 1):
+                counts = {(candidate, mode): rng.randint(0, 20_000) for _, candidate in candidates for mode in modes}
+                total = sum(counts.values())
+                for party, candidate in candidates:
+                    for mode in modes:
+                        writer.writerow([year, f"STATE {s}", f"S{s}", f"COUNTY {c}", f"{s * 1000 + 2 * c - 1}",
+                                         "US PRESIDENT", candidate, party, counts[(candidate, mode)], total, 20220315,
+                                         mode])
+    return path
@@ -0,0 +1,65 @@
+"""
+Record live SSB/KLASS/Kartverket responses into the fixture layout replayed by the benchmark stand-in.
+
+Usage:
+    python -m benchmarks.record <year> <fixture_dir>
+
+Then run the benchmarks against the recording with ATLAS_BENCH_FIXTURES=<fixture_dir>.
+"""
+import sys
+from pathlib import Path
+
+import requests
+
+from benchmarks.stand_in import fixture_key
+from src.utils.fetch import ResilientFetcher
+from src.nor.nor_klass import KlassMappingService
+from src.nor.nor_div_mapping import StatNorMappings
+from src.nor.nor_results import NorResultsParliament
+from src.nor.nor_pxweb import PxWebQueryPlanner
+from src.nor.nor_engine import NorResultsEngine
+
+
+class RecordingFetcher(ResilientFetcher):
+    """
+    ResilientFetcher that writes every successful response body to its fixture path
+    """
+    def __init__(self, fixture_dir, **kwargs):
+        super().__init__(**kwargs)
+        self.fixture_dir = Path(fixture_dir)
+
+    def request(self, method, url, **kwargs):
+        response = super().request(method, url, **kwargs)
+        body = response.request.body if method == "POST" else None
+        path = self.fixture_dir / fixture_key(method, url, body)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(response.content)
+        return response
+
+
+def record(year, fixture_dir):
+    fetcher = RecordingFetcher(fixture_dir)
+    StatNorMappings.fetcher = fetcher
+    StatNorMappings.klass = KlassMappingService(fetcher, StatNorMappings.KLASS_API)
+    NorResultsParliament.fetcher = fetcher
+    NorResultsParliament.pxweb = PxWebQueryPlanner(fetcher, NorResultsParliament.SSB_API)
+    NorResultsParliament.engine = NorResultsEngine("parliamentary", NorResultsParliament.pxweb)
+
+    keymap = StatNorMappings.call_api_for_mappings(lvl_1_endpoint='104', year=year)
+    StatNorMappings.call_api_for_mappings(lvl_1_endpoint='543', year=year)
+    unit_codes = [t['target_unit_code'] for unit in keymap['unit_mappings'] for t in unit['target_units']]
+    results, report = NorResultsParliament.run_results(year, unit_codes, level=2)
+    print(f"Recorded {len(results)} units ({len(report.failures)} failed)")
+
+    from benchmarks.fixtures import GEOJSON_ZIP
+    zip_url = f"https://nedlasting.geonorge.no/geonorge/Basisdata/Kommuner/GEOJSON/{GEOJSON_ZIP}"
+    path = Path(fixture_dir) / "files" / GEOJSON_ZIP
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(requests.get(zip_url, timeout=300).content)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        record(int(sys.argv[1]), sys.argv[2])
+    else:
+        print("Usage: python -m benchmarks.record <year> <fixture_dir>")
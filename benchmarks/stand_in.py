@@ -0,0 +1,120 @@
+import hashlib
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qsl
+
+
+def regions(body: dict) -> list:
+    return next(q['selection']['values'] for q in body['query'] if q['code'] == "Region")
+
+
+def ssb_key(table: str, body: dict) -> str:
+    """
+    Fixture path for a PxWeb (json-stat2) POST: ssb/{table}/{region}.json, or a digest of the selection when it
+    covers several regions
+    """
+    region = regions(body)
+    if len(region) == 1:
+        return f"ssb/{table}/{region[0]}.json"
+    digest = hashlib.sha1(json.dumps(body['query'], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return f"ssb/{table}/bulk-{digest}.json"
+
+
+def klass_key(path: str, query: str) -> str:
+    """
+    Fixture path for a KLASS GET: klass/{classification}/{endpoint}/{sorted query}.json
+    """
+    parts = path.rstrip("/").split("/")
+    classification, endpoint = parts[-2], parts[-1]
+    params = "&".join(f"{k}={v}" for k, v in sorted(parse_qsl(query)))
+    return f"klass/{classification}/{endpoint}/{params}.json"
+
+
+def fixture_key(method: str, url: str, body: bytes = None) -> str:
+    parts = urlsplit(url)
+    if "/klass/" in parts.path:
+        return klass_key(parts.path, parts.query)
+    if "/table/" in parts.path:
+        table = parts.path.rstrip("/").split("/")[-1]
+        return ssb_key(table, json.loads(body)) if method == "POST" else f"ssb/{table}/metadata.json"
+    return f"files/{parts.path.rstrip('/').split('/')[-1]}"
+
+
+class StandInServer:
+    """
+    Local HTTP stand-in for SSB (PxWeb json-stat2 and KLASS) and Kartverket downloads.
+
+    Replays fixture files from a directory, keyed by the semantic content of each request (table and region for
+    PxWeb POSTs, classification, endpoint and query for KLASS, file name for downloads), so that the collectors run
+    unchanged against it by pointing their base URLs at `url`.
+
+    PxWeb POSTs selecting several regions that have no fixture of their own are answered by stitching the
+    per-region fixtures, so bulk and chunked queries can be replayed from per-unit recordings.
+    """
+    def __init__(self, fixture_dir, host="127.0.0.1", port=0):
+        self.fixture_dir = Path(fixture_dir)
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # don't let Nagle/delayed-ACK stalls dominate localhost timings
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else None
+                server.requests += 1
+                path = server.fixture_dir / fixture_key(method, self.path, body)
+                if path.exists():
+                    content = path.read_bytes()
+                elif method == "POST" and "/table/" in self.path:
+                    content = server.stitched(self.path, json.loads(body))
+                else:
+                    content = None
+                if content is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json" if path.suffix == ".json" else "application/zip")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def stitched(self, url, body):
+        from src.nor.nor_pxweb import PxWebQueryPlanner
+
+        table = urlsplit(url).path.rstrip("/").split("/")[-1]
+        paths = [self.fixture_dir / "ssb" / table / f"{region}.json" for region in regions(body)]
+        if not all(path.exists() for path in paths):
+            return None
+        cubes = [json.loads(path.read_bytes()) for path in paths]
+        return json.dumps(PxWebQueryPlanner.stitch(cubes), ensure_ascii=False).encode("utf-8")
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
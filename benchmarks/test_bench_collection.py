@@ -0,0 +1,208 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from benchmarks.fixtures import YEAR
+from src.nor.nor_klass import KlassMappingService
+from src.nor.nor_div_mapping import StatNorMappings
+from src.nor.nor_results import NorResultsParliament
+from src.nor.nor_results_table import NorResultsTable
+from src.nor.nor_aggregation import NorResultsAggregator
+
+
+def test_get_result_full_year(benchmark, ssb, level_2_codes):
+    def run():
+        return [NorResultsParliament.get_result(YEAR, unit_code=code, level=2) for code in level_2_codes]
+
+    results = benchmark.pedantic(run, rounds=3, iterations=1)
+    assert len(results) == len(level_2_codes)
+
+
+def test_get_results_bulk(benchmark, ssb, level_2_codes):
+    results = benchmark.pedantic(
+        NorResultsParliament.get_results, args=(YEAR, level_2_codes, 2), rounds=5, iterations=1,
+    )
+    assert [r['unit_code'] for r in results] == level_2_codes
+    assert results[0] == NorResultsParliament.get_result(YEAR, unit_code=level_2_codes[0], level=2)
+
+
+def test_get_results_chunked(benchmark, ssb, level_2_codes, monkeypatch):
+    # a cell limit far below the selection forces the planner to split and stitch every table
+    monkeypatch.setattr(NorResultsParliament.pxweb, "cell_limit", 400)
+    assert len(NorResultsParliament.pxweb.plan("08092", NorResultsParliament.engine.query(
+        "votes", YEAR, level_2_codes, 2))) > 1
+
+    results = benchmark.pedantic(
+        NorResultsParliament.get_results, args=(YEAR, level_2_codes, 2), rounds=5, iterations=1,
+    )
+    assert [r['unit_code'] for r in results] == level_2_codes
+
+
+def test_process_results(benchmark, ssb, level_2_codes, tmp_path, monkeypatch):
+    import shutil
+    from src.nor.norway_collection import NorwayCollector
+
+    keymap = {"unit_mappings": [{"source_unit_code": "0", "target_units": [
+        {"target_unit_code": code} for code in level_2_codes
+    ]}]}
+    monkeypatch.setattr(NorwayCollector, "level_units", staticmethod(lambda *args, **kwargs: (keymap, level_2_codes)))
+    monkeypatch.setattr(NorResultsParliament, "save_locally", staticmethod(lambda data: data['unit_code']))
+    collector = NorwayCollector(base_path=tmp_path)
+
+    def setup():
+        shutil.rmtree(tmp_path / "manifests", ignore_errors=True)  # every round collects the whole level
+
+    manifest = benchmark.pedantic(collector.process_results, args=(YEAR,), setup=setup, rounds=3, iterations=1)
+    assert manifest.summary() == {"done": len(level_2_codes)}
+
+
+def test_compact_local_results(benchmark, ssb, level_2_codes):
+    from src.nor.nor_compact import CompactResults
+    from src.nor.nor_engine import NorResultsEngine
+
+    # decoded as a municipal election: without a ballot-count table, discarded/blank and the counts by time of vote
+    # are empty
+    cubes = NorResultsParliament.engine.fetch(YEAR, level_2_codes, 2, names=["votes", "turnout"])
+    engine = NorResultsEngine("municipal", NorResultsParliament.pxweb)
+    results = [engine.decode_unit(cubes, YEAR, code, 2) for code in level_2_codes]
+    assert results[0]['discarded_votes'] is None
+
+    compact = benchmark(CompactResults.from_results, results)
+    assert compact.to_results() == results
+    table = compact.to_table()
+    assert table.units["discarded_votes"].isna().all()
+    assert (table.units["valid_votes_cast"] == [r['valid_votes_cast'] for r in results]).all()
+
+
+def test_call_api_for_mappings(benchmark, ssb):
+    def setup():
+        # cold cache each round, so the request and grouping are measured rather than a cache hit
+        StatNorMappings.klass = KlassMappingService(StatNorMappings.fetcher, StatNorMappings.KLASS_API)
+
+    mappings = benchmark.pedantic(
+        StatNorMappings.call_api_for_mappings, kwargs={"lvl_1_endpoint": "104", "year": YEAR},
+        setup=setup, rounds=20, iterations=1,
+    )
+    assert mappings['unit_mappings']
+
+
+def test_aggregate_year(benchmark, ssb, level_2_codes):
+    results = [NorResultsParliament.get_result(YEAR, unit_code=code, level=2) for code in level_2_codes]
+    keymap = StatNorMappings.call_api_for_mappings(lvl_1_endpoint='104', year=YEAR)
+    keymap['level_1_type_code'] = "1a"
+
+    def run():
+        table = NorResultsTable.from_results(results)
+        return NorResultsAggregator.aggregate(table, keymap), NorResultsAggregator.national(table)
+
+    level_1, national = benchmark(run)
+    assert national.units['valid_votes_cast'].iloc[0] == sum(r['valid_votes_cast'] for r in results)
+
+
+@pytest.fixture
+def query_engine(ssb, level_2_codes, tmp_path):
+    pytest.importorskip("duckdb")
+    from src.utils.local_store import LocalStore
+    from src.utils.query_engine import AtlasQueryEngine
+
+    table = NorResultsTable.from_results(NorResultsParliament.get_results(YEAR, level_2_codes, 2))
+    store = LocalStore(tmp_path)
+    for year in range(YEAR - 79, YEAR + 1):  # 80 elections of the same shape
+        NorResultsTable(table.units.assign(year=year), table.votes.assign(year=year)).to_store(store, year, "2")
+    return AtlasQueryEngine(store)
+
+
+def test_query_swing(benchmark, query_engine):
+    swing = benchmark(query_engine.swing, "A", YEAR - 4, YEAR)
+    assert len(swing) and (swing['change_points'] == 0).all()
+
+
+def test_query_all_years(benchmark, query_engine):
+    totals = benchmark(query_engine.sql, "SELECT year, sum(votes) AS votes FROM votes GROUP BY year")
+    assert len(totals) == 80
+
+
+def test_validate_year(benchmark, ssb, level_2_codes):
+    from src.nor.nor_validation import NorResultsValidator
+
+    table = NorResultsTable.from_results(NorResultsParliament.get_results(YEAR, level_2_codes, 2))
+    keymap = {"unit_mappings": [{"source_unit_code": "0", "target_units": [
+        {"target_unit_code": code} for code in level_2_codes
+    ]}]}
+    failures = benchmark(NorResultsValidator.validate, table, YEAR, "2", keymap, level_2_codes)
+    assert not (failures['check'].isin(["coverage", "geometry"])).any()
+
+
+def test_context_reconcile(benchmark):
+    """
+    Population measures of 800 historical municipality codes reconciled to 400 successors (pairwise merges)
+    """
+    import numpy as np
+    import pandas as pd
+    from src.nor.nor_context import NorContext
+
+    rng = np.random.default_rng(0)
+    codes = [f"{i:04d}" for i in range(100, 900)]
+    frame = pd.DataFrame(rng.integers(0, 5_000, size=(len(codes), 7)).astype(float), index=pd.Index(codes),
+                         columns=["population", "age_0_17", "age_18_29", "age_30_49", "age_50_66", "age_67_plus",
+                                  "age_years"])
+    changes = [
+        {"old_unit_code": code, "new_unit_code": f"{5000 + i // 2:04d}", "unit_change_occurred": "2020-01-01"}
+        for i, code in enumerate(codes)
+    ]
+
+    def reconcile():
+        return NorContext.reconcile(frame, NorContext.crosswalk(changes, frame.index), {})
+
+    reconciled = benchmark(reconcile)
+    assert len(reconciled) == len(codes) // 2
+    assert reconciled["population"].sum() == frame["population"].sum()
+
+
+def test_us_pipeline(benchmark, tmp_path):
+    """
+    Full adapter run on fixture files: parse 3100 counties, store, roll up to states and the nation
+    """
+    from benchmarks.fixtures import write_countypres
+    from src.nor.nor_results_table import NorResultsTable
+    from src.utils.local_store import LocalStore
+    from us_results_processor import UnitedStatesPipeline
+
+    path = write_countypres(tmp_path / "countypres_2000-2020.csv")
+    store = LocalStore(tmp_path / "store")
+    stored = benchmark(lambda: UnitedStatesPipeline(2020, path, store=store).run())
+    assert stored == {"2": 3100, "1": 50, "0": 1}
+    counties = NorResultsTable.from_store(store, 2020, "2", country="usa")
+    assert not counties.votes.duplicated(["unit_code", "party_code"]).any()
+    national = NorResultsTable.from_store(store, 2020, "0", country="usa")
+    assert national.units["valid_votes_cast"].iloc[0] == counties.units["valid_votes_cast"].sum()
+
+
+def test_build_views_classified(benchmark, ssb, level_2_codes, tmp_path):
+    """
+    Metrics and class breaks for 20 elections of level 2 units, read back through the query engine
+    """
+    import numpy as np
+    from src.nor.norway_collection import NorwayCollector
+    from src.utils.local_store import LocalStore
+
+    table = NorResultsTable.from_results(NorResultsParliament.get_results(YEAR, level_2_codes, 2))
+    rng = np.random.default_rng(0)
+    store = LocalStore(tmp_path)
+    years = list(range(YEAR - 76, YEAR + 1, 4))
+    for year in years:
+        votes = table.votes.assign(year=year, votes=rng.integers(0, 5_000, len(table.votes)))
+        NorResultsTable(table.units.assign(year=year), votes).to_store(store, year, "2")
+    collector = NorwayCollector(base_path=tmp_path, store=store)
+    assert benchmark(collector.build_views, years) == len(years) * len(level_2_codes)
+
+    pytest.importorskip("duckdb")
+    from src.utils.query_engine import AtlasQueryEngine
+
+    engine = AtlasQueryEngine(store)
+    classes = engine.sql("SELECT min(enp_votes_jenks) AS low, max(enp_votes_jenks) AS high, "
+                         "min(share_bin) AS share_bin FROM unit_metrics JOIN party_swing USING (year, unit_code)")
+    assert classes.iloc[0].tolist() == [0, 4, 0]
+    breaks = engine.sql("SELECT breaks FROM class_breaks WHERE metric = 'enp_votes' AND method = 'jenks' "
+                        f"AND year = {YEAR}")
+    assert len(breaks) == 1 and len(breaks['breaks'].iloc[0]) == 6
@@ -0,0 +1,164 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+gpd = pytest.importorskip("geopandas")
+
+from benchmarks.fixtures import YEAR, GEOJSON_ZIP
+
+
+@pytest.fixture(scope="module")
+def geo_processor():
+    try:
+        from src.nor.nor_div_geofiles import NorGeoProcessor
+    except (ImportError, SyntaxError) as e:
+        pytest.skip(f"geometry module unavailable: {e}")
+    return NorGeoProcessor.__new__(NorGeoProcessor)  # no storage client needed for ingestion
+
+
+@pytest.fixture(scope="module")
+def level_2_gdf(stand_in, geo_processor):
+    return geo_processor.L2_gdf_from_geojson(f"{stand_in.url}/files/{GEOJSON_ZIP}")
+
+
+def test_geojson_ingestion(benchmark, stand_in, geo_processor):
+    gdf = benchmark.pedantic(
+        geo_processor.L2_gdf_from_geojson, args=(f"{stand_in.url}/files/{GEOJSON_ZIP}",), rounds=5, iterations=1
+    )
+    assert len(gdf) > 0
+
+
+def test_dissolve_level_1(benchmark, level_2_gdf):
+    gdf = level_2_gdf.assign(level_1_code=level_2_gdf['level_2_code'].str[:2])
+    level_1 = benchmark.pedantic(gdf.dissolve, kwargs={"by": "level_1_code"}, rounds=5, iterations=1)
+    assert len(level_1) == gdf['level_1_code'].nunique()
+
+
+def test_simplify(benchmark, level_2_gdf):
+    simplified = benchmark(level_2_gdf.geometry.simplify, 0.001, preserve_topology=True)
+    assert len(simplified) == len(level_2_gdf)
+
+
+def topojson_server_installed() -> bool:
+    """
+    topojson-server is installed locally (npx must not try to download it: the suite runs offline)
+    """
+    if not shutil.which("npx"):
+        return False
+    try:
+        check = subprocess.run(["npx", "--no-install", "topojson-server", "--version"], capture_output=True, timeout=60)
+    except subprocess.TimeoutExpired:
+        return False
+    return check.returncode == 0
+
+
+def test_topojson(benchmark, level_2_gdf, tmp_path):
+    if not topojson_server_installed():
+        pytest.skip("topojson-server not installed (npm install topojson-server)")
+    geojson_path = tmp_path / "level_2.geojson"
+    geojson_path.write_text(level_2_gdf.to_json())
+    topo_path = tmp_path / "nor.topojson"
+
+    def run():
+        subprocess.run(
+            ["npx", "--no-install", "topojson-server", "--out", str(topo_path), f"municipalities={geojson_path}"],
+            check=True, capture_output=True,
+        )
+        with open(topo_path, 'r') as f:
+            return json.load(f)
+
+    topology = benchmark.pedantic(run, rounds=3, iterations=1)
+    assert topology['type'] == "Topology"
+
+
+@pytest.fixture(scope="module")
+def geometry_store(level_2_gdf, tmp_path_factory):
+    from src.utils.geometry_store import GeometryStore
+    from src.utils.local_store import LocalStore
+
+    store = GeometryStore(LocalStore(tmp_path_factory.mktemp("geometry")))
+    store.write(level_2_gdf.assign(unit_code=level_2_gdf['level_2_code']), country="nor", year=YEAR, level=2)
+    return store
+
+
+def bbox_quarter(gdf):
+    xmin, ymin, xmax, ymax = gdf.total_bounds
+    return xmin, ymin, xmin + (xmax - xmin) / 2, ymin + (ymax - ymin) / 2
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "fgb"])
+def test_bbox_read(benchmark, geometry_store, level_2_gdf, fmt):
+    bbox = bbox_quarter(level_2_gdf)
+    gdf = benchmark(geometry_store.read, "nor", YEAR, 2, bbox=bbox, fmt=fmt)
+    assert 0 < len(gdf) <= len(level_2_gdf)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "fgb"])
+def test_code_read(benchmark, geometry_store, level_2_gdf, fmt):
+    codes = list(level_2_gdf['level_2_code'][:3])
+    gdf = benchmark(geometry_store.read, "nor", YEAR, 2, codes=codes, fmt=fmt)
+    assert sorted(gdf['unit_code']) == sorted(codes)
+
+
+def test_geojson_legacy_write(benchmark, level_2_gdf, tmp_path):
+    path = tmp_path / "level_2.geojson"
+
+    def write():
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(json.loads(level_2_gdf.to_json()), f, indent=2, ensure_ascii=False)
+
+    benchmark.pedantic(write, rounds=3, iterations=1)
+    benchmark.extra_info['bytes'] = path.stat().st_size
+
+
+def test_geojson_streamed_write(benchmark, level_2_gdf, tmp_path):
+    from src.utils import serialization
+
+    path = benchmark.pedantic(
+        serialization.write_feature_collection, args=(level_2_gdf, tmp_path / "level_2.geojson"), rounds=3,
+        iterations=1,
+    )
+    benchmark.extra_info['bytes'] = path.stat().st_size
+    assert len(serialization.loads(path.read_bytes())['features']) == len(level_2_gdf)
+
+
+def test_adjacency(benchmark, level_2_gdf):
+    from src.utils.adjacency import AdjacencyGraph
+
+    graph = benchmark.pedantic(
+        AdjacencyGraph.from_geometries, args=(level_2_gdf['level_2_code'], level_2_gdf.geometry.values), rounds=3,
+        iterations=1,
+    )
+    code = graph.codes[0]
+    assert all(code in graph.neighbours(neighbour) for neighbour in graph.neighbours(code))
+
+
+def test_label_points(benchmark, level_2_gdf):
+    from src.utils.adjacency import label_points
+
+    points = benchmark.pedantic(label_points, args=(level_2_gdf.geometry.values,), rounds=3, iterations=1)
+    assert level_2_gdf.geometry.values.contains(points).all()
+
+
+def test_dorling(benchmark, level_2_gdf):
+    import numpy as np
+    import shapely
+    from src.utils.adjacency import AdjacencyGraph, label_points
+    from src.utils.cartogram import dorling
+
+    projected = level_2_gdf.to_crs("EPSG:25833")
+    graph = AdjacencyGraph.from_geometries(projected['level_2_code'], projected.geometry.values)
+    points = label_points(projected.geometry.values)
+    electorate = np.random.default_rng(0).lognormal(8, 1.3, len(projected))
+    radii = np.sqrt(electorate / electorate.sum() * projected.area.sum() * 0.5 / np.pi)
+
+    x, y = benchmark.pedantic(
+        dorling, args=(shapely.get_x(points), shapely.get_y(points), radii, graph.indptr, graph.indices), rounds=3,
+        iterations=1,
+    )
+    distance = np.hypot(x[:, None] - x, y[:, None] - y)
+    np.fill_diagonal(distance, np.inf)
+    assert (radii[:, None] + radii - distance).max() < 0.1 * radii.mean()
@@ -1,23 +1,38 @@
-import requests
-import json
-from datetime import datetime as dt
-from .results_processor import ResultsPipeline
-from .src.utils.s3manager import S3Manager
+from results_processor import ResultsPipeline
+from src.nor.nor_div_mapping import StatNorMappings
+from src.nor.nor_engine import ELECTIONS, NorResultsEngine
+from src.nor.nor_pxweb import JsonStatCube
+from src.nor.norway_collection import NorwayCollector
 
 
 class NorwayPipeline(ResultsPipeline):
     """
-    Class to get and process historical Norwegian election data from
-    official source ("valgdirektoratet" - Election directorate)
-    Inherits from ResultsPipeline superclass
+    Norwegian election results from SSB's statbank (PxWeb json-stat2).
+
+    Adapter only: sources are the election type's tables in nor_engine.ELECTIONS queried for the units of the year's
+    keymap, parsing is NorResultsEngine.decode_unit, and the hierarchy is the year's 1a/1b keymaps (1b is published
+    by SSB for parliamentary elections and taken from the source).
     """
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.country = "nor"
-        self.year = kwargs.get("year")
-        self.s3 = S3Manager(bucket="election-atlas")
+    country = "nor"
 
-    def get_subdivisions(self):
+    def __init__(self, year, election_type="parliamentary", **kwargs):
+        self.election_type = election_type
+        self.levels = dict(ELECTIONS[election_type]['level_codes'])
+        super().__init__(year, **kwargs)
+        self.engine = NorResultsEngine(election_type, self.pxweb)
+        self.unit_codes = {}
 
+    def sources(self, level) -> list:
+        _, self.unit_codes[level] = NorwayCollector.level_units(self.year, level, self.election_type)
+        regions = [self.engine.region(self.year, unit_code, level) for unit_code in self.unit_codes[level]]
+        return [
+            {"id": name, "pxweb": table['table'], "query": self.engine.query(name, self.year, regions, level)}
+            for name, table in self.engine.tables(level).items()
+        ]
 
+    def parse(self, level, payloads: dict) -> list:
+        cubes = {name: JsonStatCube(payload) for name, payload in payloads.items()}
+        return [self.engine.decode_unit(cubes, self.year, unit_code, level) for unit_code in self.unit_codes[level]]
 
+    def hierarchy(self, table) -> list:
+        return [StatNorMappings.load_locally(level_code, self.year) for level_code in ("1a", "1b")]
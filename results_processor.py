@@ -1,94 +1,173 @@
-import requests
 from abc import ABC, abstractmethod
-import json
-from datetime import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from .src.utils.s3manager import S3Manager
-import pandas as pd
+from pathlib import Path
+
+from src.nor.nor_aggregation import NorResultsAggregator
+from src.nor.nor_pxweb import PxWebQueryPlanner
+from src.nor.nor_results_table import NorResultsTable
+from src.utils.fetch import ResilientFetcher
+from src.utils.local_store import LocalStore
+from src.utils.logging_manager import instrumentation
 
 
 class ResultsPipeline(ABC):
     """
-    Abstract  superclass to ingest election data.
-    Processes results for a single year at a 1st and 2nd subdivision level..
-    Processes and stores results in s3.
+    Plugin framework to ingest election results for one country and year.
+
+    Country adapters only declare:
+        * country   - country code used in storage keys (class attribute)
+        * levels    - {level: level_code} of the unit levels results are published for, e.g. {2: "2"}
+        * sources   - what to fetch for a level: a list of source dicts (see `fetch_source`)
+        * parse     - how fetched payloads become unit result dicts (the NorResultsParliament.get_result shape;
+                      `unit_result` builds one from the fields a source has)
+        * hierarchy - optional keymaps (StatNorMappings shape) to roll the lowest level up to parent units
+
+    Everything else is shared and the same for every country:
+        * fetching  - ResilientFetcher (retries, backoff, circuit breaker) for JSON endpoints, PxWebQueryPlanner for
+                      PxWeb tables (chunked to the cell limit), local files for fixtures and bulk downloads
+        * caching   - fetched payloads are kept under raw/country={country}/year={year}/ and reused unless refreshed
+        * concurrency - the sources of a level are fetched on a thread pool
+        * storage   - columnar NorResultsTable frames under results/country={country}/year={year}/level={level_code}/
+        * aggregation - NorResultsAggregator roll-ups to the hierarchy's parents and to national totals
     """
+    country = None
+    levels = {}
+    election_type = None
 
-    def __init__(self, year):
+    def __init__(self, year, store=None, fetcher=None, workers=4):
+        if not self.country or not self.levels:
+            raise TypeError(f"{type(self).__name__} must declare `country` and `levels`")
         self.year = year
-        self.boundary_date = None
-        self.s3 = S3Manager(bucket="election-atlas", region="us-east-1")
-        self.raw_prefix = f"raw/nor={self.country}/year={self.year}"
-        self.processed_prefix = f'processed/nor={self.country}/year={self.year}'
+        self.store = store or LocalStore()
+        self.fetcher = fetcher or ResilientFetcher()
+        self.pxweb = PxWebQueryPlanner(self.fetcher)
+        self.workers = workers
+        self.raw_prefix = f"raw/country={self.country}/year={self.year}"
 
-    @property
     @abstractmethod
-    def country(self):
+    def sources(self, level) -> list:
         """
-        Specifies nor. Implementation passed on to subclass.
+        Sources to fetch for a level
+        :return: list of source dicts with an "id" and one of
+            {"url": ...}                            GET JSON
+            {"url": ..., "body": {...}}             POST JSON
+            {"pxweb": table, "query": {...}}        PxWeb json-stat2 query (chunked by the planner)
+            {"path": ...}                           local .json or .csv file (read as a DataFrame)
         """
-        pass
-
 
     @abstractmethod
-    def get_raw_results(self, level: int) -> dict:
+    def parse(self, level, payloads: dict) -> list:
         """
-        Method to ingest raw data (implementation passed to subclass)
-        :param level: integer to specify subdivision level, where 1 equals the
-        :return: dict
+        :param payloads: source id -> fetched payload
+        :return: list of unit result dicts
         """
-        pass
 
-    @abstractmethod
-    def calculate_national_result(self):
+    def hierarchy(self, table: NorResultsTable) -> list:
         """
-        Method to calculate national results for the given year (implementation passed to subclass)
-        :return: dict
+        Keymaps ({"level_1_type_code", "unit_mappings": [...]}) to aggregate the lowest level to; none by default
+        :param table: results of the lowest level, for adapters that derive parents from unit codes
         """
-        pass
+        return []
 
-    def store_raw_json(self, data: dict, level: int):
-        key = f"{self.raw_prefix}/level={level}.json"
-        body = json.dumps(data)
-        self.s3.client.put_object(
-            Bucket=self.s3.bucket,
-            Key=key,
-            Body=body,
-            ContentType="application/json"
-        )
+    @staticmethod
+    def unit_result(year, election_type, level_code, unit_code, unit_name, votes: list, valid_votes_cast=None,
+                    discarded_votes=None, blank_votes=None, turnout=None, seats: list = None,
+                    last_updated=None) -> dict:
+        """
+        Unit result dict with the fields a source doesn't publish left empty
+        :param votes: [{"party_code", "party_name", "votes"}]
+        :param valid_votes_cast: defaults to the sum of the party votes
+        """
+        result = {
+            "year": year,
+            "election_type": election_type,
+            "unit_code": unit_code,
+            "unit_name": unit_name,
+            "level_code": level_code,
+            "retrieved_on": date.today().isoformat(),
+            "last_updated": last_updated,
+            "valid_votes_cast": valid_votes_cast if valid_votes_cast is not None else sum(v['votes'] for v in votes),
+            "discarded_votes": discarded_votes,
+            "blank_votes": blank_votes,
+            "turnout": turnout,
+            "votes_by_type": {
+                "election_day_vote": {"valid": None, "discarded": None, "blank": None},
+                "early_vote": {"valid": None, "discarded": None, "blank": None},
+            },
+            "results": votes,
+        }
+        if seats is not None:
+            result['seat_distribution'] = seats
+        return result
 
+    def raw_key(self, level, source_id) -> str:
+        return f"{self.raw_prefix}/level={level}/{source_id}.json"
 
-    @abstractmethod
-    def get_subdivision_changes(self, level: int) -> pd.DataFrame:
+    def fetch_source(self, level, source: dict, refresh=False):
         """
-        Get correspondence table for subdivision changes over time
-        :param self:
-        :param level:
-        :return:
+        Fetch one source, served from the raw cache unless refreshed (local files are always read directly)
         """
-        pass
+        if "path" in source:
+            import pandas as pd
+
+            path = Path(source['path'])
+            return pd.read_csv(path, dtype=str) if path.suffix == ".csv" else pd.read_json(path, dtype=False)
 
-    def build_or_refresh_dimension(self, dim_key: str):
-        try:
-            return self.s3.read_parquet(dim_key)
-        except Exception:
-            raw_crosswalks = self.load_all_raw_crosswalks()
-            from src.utils.aggregation import build_dimension_from_crosswalks
-            return build_dimension_from_crosswalks(raw_crosswalks)
+        key = self.raw_key(level, source['id'])
+        if not refresh and self.store.exists(key):
+            instrumentation.cache_hit("raw")
+            return self.store.read_json(key)
+        instrumentation.cache_miss("raw")
+        if "pxweb" in source:
+            payload = self.pxweb.query(source['pxweb'], source['query'])
+        elif "body" in source:
+            payload = self.fetcher.post_json(source['url'], source['body'])
+        else:
+            payload = self.fetcher.get_json(source['url'])
+        self.store.write_json(payload, key)
+        return payload
 
+    def get_raw_results(self, level, refresh=False) -> dict:
+        """
+        Fetch every source of a level concurrently
+        :return: source id -> payload
+        """
+        sources = self.sources(level)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(sources)))) as pool:
+            payloads = pool.map(lambda source: self.fetch_source(level, source, refresh), sources)
+            return {source['id']: payload for source, payload in zip(sources, payloads)}
 
-    def load_all_raw_crosswalks(self) -> list:
-        keys = self.s3.list_keys(f"{self.raw_prefix}")
-        dfs = []
-        for key in filter(lambda k: 'crosswalk' in k, keys):
-            content = self.s3.client.get_object(Bucket=self.s3.bucket, Key=key)["Body"].read()
-            dfs.append(pd.read_json(content))
-        return dfs
+    def results(self, level, refresh=False) -> NorResultsTable:
+        if level not in self.levels:
+            raise ValueError(f"Level {level} not available for {self.country}, expected one of {list(self.levels)}")
+        return NorResultsTable.from_results(self.parse(level, self.get_raw_results(level, refresh)))
 
+    def calculate_national_result(self, table: NorResultsTable) -> NorResultsTable:
+        return NorResultsAggregator.national(table)
 
-    @abstractmethod
-    def run(self):
+    @instrumentation.timed("pipeline")
+    def run(self, refresh=False) -> dict:
         """
-        Run the pipeline for the given year.
+        Collect every level, derive the hierarchy's parent levels and the national totals from the lowest level and
+        store them all
+        :return: dict of level_code -> number of units stored
         """
-        pass
\ No newline at end of file
+        stored = {}
+        tables = {level: self.results(level, refresh) for level in sorted(self.levels)}
+        for level, table in tables.items():
+            table.to_store(self.store, self.year, self.levels[level], country=self.country)
+            stored[self.levels[level]] = len(table)
+
+        lowest = tables[max(tables)]
+        for keymap in self.hierarchy(lowest):
+            level_code = keymap['level_1_type_code']
+            if level_code in stored:
+                continue  # published by the source itself
+            aggregated = NorResultsAggregator.aggregate(lowest, keymap)
+            aggregated.to_store(self.store, self.year, level_code, country=self.country)
+            stored[level_code] = len(keymap['unit_mappings'])
+        national = self.calculate_national_result(lowest)
+        national.to_store(self.store, self.year, NorResultsAggregator.NATIONAL_LEVEL, country=self.country)
+        stored[NorResultsAggregator.NATIONAL_LEVEL] = len(national)
+        return stored
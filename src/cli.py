@@ -0,0 +1,232 @@
+"""
+Command line entry point for the Democracy Atlas pipelines.
+
+    atlas mappings 2021 [2025]          keymaps for a year or range of years
+    atlas results 2021 --level 2        unit results (resumable, shardable; --election-type municipal|county)
+    atlas poll 2025 --interval 60       election night polling into the snapshot store
+    atlas precincts 2021 --geometry     level 3 results (incremental) and geometry
+    atlas geodata 2021                  geometry (GeoParquet/FlatGeobuf, GeoJSON/TopoJSON, adjacency)
+    atlas topology 2021                 rebuild adjacency graphs and label points from stored geometry
+    atlas validate 2021                 integrity checks and report for a year's results
+    atlas layouts 2017 2021 2025        Dorling cartograms and hex layouts (process pool, cached)
+    atlas aggregate 2021                columnar tables and derived 1a/1b/national results
+    atlas views 2017 2021 2025          metrics and choropleth class breaks across years (--level 3 for precincts)
+    atlas context 2017 2021 2025        population, income and education per unit, reconciled to each year's units
+    atlas pipeline 2017 2025            full DAG run
+    atlas query "SELECT ..."            SQL over the results, metrics and geometry stores
+    atlas serve --port 8765             read-only SQL endpoint (GET /sql?q=...)
+
+Only argparse is imported at startup; each subcommand imports what it needs when it runs, so the frequently spawned
+mappings/results commands never load pandas or geopandas/GDAL.
+"""
+import argparse
+import sys
+
+DEFAULT_BASE_PATH = "/Users/holden-data/Desktop/democracy-atlas/data/raw/nor"
+
+
+def collector(args):
+    from src.nor.norway_collection import NorwayCollector
+    return NorwayCollector(base_path=args.base_path)
+
+
+def failed(manifest) -> int:
+    return 1 if manifest.summary().get("failed") else 0
+
+
+def run_mappings(args):
+    end_year = args.end_year or args.start_year
+    if args.prefetch:
+        from src.nor.nor_div_mapping import StatNorMappings
+        StatNorMappings.prefetch(args.start_year, end_year)
+    return failed(collector(args).process_mappings(args.start_year, end_year, shard=args.shard, shards=args.shards))
+
+
+def run_results(args):
+    manifest = collector(args).process_results(
+        args.year, level=args.level, shard=args.shard, shards=args.shards, election_type=args.election_type
+    )
+    return failed(manifest)
+
+
+def run_poll(args):
+    collector(args).poll_results(
+        args.year, level=args.level, election_type=args.election_type, interval=args.interval, rounds=args.rounds
+    )
+    return 0
+
+
+def run_precincts(args):
+    summary = collector(args).process_precincts(
+        args.year, election_type=args.election_type, geometry=args.geometry or bool(args.geometry_url),
+        refresh=not args.full, geometry_url=args.geometry_url
+    )
+    return 1 if summary['failed'] else 0
+
+
+def run_geodata(args):
+    collector(args).process_geodata(args.year)
+    return 0
+
+
+def run_topology(args):
+    collector(args).process_topology(args.year)
+    return 0
+
+
+def run_validate(args):
+    reports = collector(args).validate_results(args.year, level_codes=args.levels)
+    return 1 if any(report['failures'] for report in reports.values()) else 0
+
+
+def run_layouts(args):
+    collector(args).process_layouts(args.years, workers=args.workers, force=args.force)
+    return 0
+
+
+def run_aggregate(args):
+    print(f"Aggregated {collector(args).aggregate_results(args.year)} units for {args.year}")
+    return 0
+
+
+def run_views(args):
+    count = collector(args).build_views(args.years, level_code=args.level, election_type=args.election_type)
+    print(f"Built metrics for {count} unit-years")
+    return 0
+
+
+def run_context(args):
+    written = collector(args).process_context(args.years, names=args.tables)
+    print(f"Context rows written: {written}")
+    return 0
+
+
+def run_pipeline(args):
+    workers = {}
+    for item in args.workers or []:
+        stage, _, count = item.partition("=")
+        workers[stage] = int(count)
+    outcomes = collector(args).run_pipeline(range(args.start_year, args.end_year + 1), workers=workers)
+    return 1 if any(o['status'] != "done" for o in outcomes.values()) else 0
+
+
+def query_engine(args):
+    from src.utils.query_engine import AtlasQueryEngine
+    from src.utils.local_store import LocalStore
+    return AtlasQueryEngine(LocalStore(args.store_root) if args.store_root else None)
+
+
+def run_query(args):
+    import pandas as pd
+    with pd.option_context("display.max_rows", args.max_rows, "display.width", None):
+        print(query_engine(args).sql(args.sql))
+    return 0
+
+
+def run_serve(args):
+    query_engine(args).serve(host=args.host, port=args.port)
+    return 0
+
+
+def shard_arguments(parser):
+    parser.add_argument("--shard", type=int, default=0, help="index of this worker's shard")
+    parser.add_argument("--shards", type=int, default=1, help="total number of shards")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="atlas", description="Democracy Atlas data pipelines")
+    parser.add_argument("--base-path", default=DEFAULT_BASE_PATH, help="root of the raw data directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    mappings = commands.add_parser("mappings", help="collect unit keymaps")
+    mappings.add_argument("start_year", type=int)
+    mappings.add_argument("end_year", type=int, nargs="?")
+    mappings.add_argument("--prefetch", action="store_true", help="load the year range with ranged KLASS requests")
+    shard_arguments(mappings)
+    mappings.set_defaults(func=run_mappings)
+
+    results = commands.add_parser("results", help="collect unit results")
+    results.add_argument("year", type=int)
+    results.add_argument("--level", type=int, choices=[1, 2], default=2)
+    results.add_argument("--election-type", choices=["parliamentary", "municipal", "county"], default="parliamentary")
+    shard_arguments(results)
+    results.set_defaults(func=run_results)
+
+    poll = commands.add_parser("poll", help="poll live results into the snapshot store")
+    poll.add_argument("year", type=int)
+    poll.add_argument("--level", type=int, choices=[1, 2], default=2)
+    poll.add_argument("--election-type", choices=["parliamentary", "municipal", "county"], default="parliamentary")
+    poll.add_argument("--interval", type=float, default=60, help="seconds between polls")
+    poll.add_argument("--rounds", type=int, help="stop after this many polls")
+    poll.set_defaults(func=run_poll)
+
+    precincts = commands.add_parser("precincts", help="ingest level 3 (precinct) results and geometry")
+    precincts.add_argument("year", type=int)
+    precincts.add_argument("--election-type", choices=["parliamentary", "municipal", "county"], default="parliamentary")
+    precincts.add_argument("--geometry", action="store_true", help="also ingest precinct polygons (current year)")
+    precincts.add_argument("--geometry-url", help="Kartverket precinct zip of the year, for geometry of past years")
+    precincts.add_argument("--full", action="store_true", help="re-ingest municipalities that haven't changed")
+    precincts.set_defaults(func=run_precincts)
+
+    geodata = commands.add_parser("geodata", help="build geometry files")
+    geodata.add_argument("year", type=int)
+    geodata.set_defaults(func=run_geodata)
+
+    topology = commands.add_parser("topology", help="build adjacency graphs and label points")
+    topology.add_argument("year", type=int)
+    topology.set_defaults(func=run_topology)
+
+    validate = commands.add_parser("validate", help="check a year's results and write a validation report")
+    validate.add_argument("year", type=int)
+    validate.add_argument("--levels", nargs="+", default=["2", "1a", "1b"])
+    validate.set_defaults(func=run_validate)
+
+    layouts = commands.add_parser("layouts", help="build cartogram and hex layouts")
+    layouts.add_argument("years", type=int, nargs="+")
+    layouts.add_argument("--workers", type=int, default=4, help="worker processes")
+    layouts.add_argument("--force", action="store_true", help="rebuild layouts whose inputs haven't changed")
+    layouts.set_defaults(func=run_layouts)
+
+    aggregate = commands.add_parser("aggregate", help="build columnar tables and derived results")
+    aggregate.add_argument("year", type=int)
+    aggregate.set_defaults(func=run_aggregate)
+
+    views = commands.add_parser("views", help="compute metrics across years")
+    views.add_argument("years", type=int, nargs="+")
+    views.add_argument("--level", default="2")
+    views.add_argument("--election-type", default="parliamentary", help="election of the level 3 partitions")
+    views.set_defaults(func=run_views)
+
+    context = commands.add_parser("context", help="ingest demographic and economic context tables")
+    context.add_argument("years", type=int, nargs="+")
+    context.add_argument("--tables", nargs="*", help="subset of population, income, education")
+    context.set_defaults(func=run_context)
+
+    pipeline = commands.add_parser("pipeline", help="run the full pipeline DAG")
+    pipeline.add_argument("start_year", type=int)
+    pipeline.add_argument("end_year", type=int)
+    pipeline.add_argument("--workers", nargs="*", metavar="STAGE=N", help="worker count per stage")
+    pipeline.set_defaults(func=run_pipeline)
+
+    query = commands.add_parser("query", help="run SQL against the stores")
+    query.add_argument("sql")
+    query.add_argument("--store-root", help="root of the processed data store")
+    query.add_argument("--max-rows", type=int, default=50)
+    query.set_defaults(func=run_query)
+
+    serve = commands.add_parser("serve", help="serve read-only SQL over HTTP")
+    serve.add_argument("--store-root", help="root of the processed data store")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.set_defaults(func=run_serve)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import pandas as pd
+
+from src.nor.nor_results_table import NorResultsTable
+
+
+class NorResultsAggregator:
+    """
+    Rolls level 2 (municipality) results up to level 1 units and to national totals.
+
+    Aggregation is driven by the keymap valid for the year (as produced by StatNorMappings.get_mappings), so the same
+    level 2 results can be rolled up to administrative counties (1a), electoral districts (1b) or the whole country.
+
+    All operations are grouped sums over the columnar NorResultsTable frames:
+        * Vote totals and the early/election-day split are summed directly
+        * Party votes are summed per parent unit and party
+        * Turnout is re-derived from summed ballots over the summed (estimated) electorate, i.e. weighted by electorate;
+          it is NaN for a parent with any child lacking ballots or electorate, rather than biased by a partial sum
+
+    Derived level 1 results can be compared against SSB's own level 1 numbers with `compare`.
+    """
+    NATIONAL_CODE = "0"
+    NATIONAL_NAME = "Norge"
+    NATIONAL_LEVEL = "0"
+
+    @classmethod
+    def keymap_frame(cls, mappings: dict) -> pd.DataFrame:
+        """
+        Flatten a keymap dictionary to a level 2 -> level 1 lookup frame
+        :param mappings: keymap dict from StatNorMappings.get_mappings
+        :return: DataFrame with columns unit_code, parent_code, parent_name
+        """
+        rows = [
+            (target['target_unit_code'], unit['source_unit_code'], unit['source_unit_name'])
+            for unit in mappings['unit_mappings']
+            for target in unit['target_units']
+        ]
+        return pd.DataFrame(rows, columns=["unit_code", "parent_code", "parent_name"])
+
+    @classmethod
+    def aggregate(cls, table: NorResultsTable, mappings: dict) -> NorResultsTable:
+        """
+        Aggregate level 2 results to the level 1 units of a keymap
+        :param table: NorResultsTable with level 2 results
+        :param mappings: keymap dict for the same year (level 1a or 1b)
+        :return: NorResultsTable with one unit per level 1 unit
+        """
+        keymap = cls.keymap_frame(mappings)
+        return cls.rollup(table, keymap, level_code=mappings['level_1_type_code'])
+
+    @classmethod
+    def national(cls, table: NorResultsTable) -> NorResultsTable:
+        """
+        Aggregate results for any complete partition of the country (level 2 or level 1) to national totals
+        """
+        keymap = pd.DataFrame({
+            "unit_code": table.units["unit_code"].unique(),
+            "parent_code": cls.NATIONAL_CODE,
+            "parent_name": cls.NATIONAL_NAME,
+        })
+        return cls.rollup(table, keymap, level_code=cls.NATIONAL_LEVEL)
+
+    @classmethod
+    def rollup(cls, table: NorResultsTable, keymap: pd.DataFrame, level_code: str) -> NorResultsTable:
+        """
+        Grouped sum of unit results into parent units
+        :param table: NorResultsTable with child unit results
+        :param keymap: DataFrame with columns unit_code, parent_code, parent_name
+        :param level_code: level code assigned to the parent units
+        :return: NorResultsTable with parent unit results
+        """
+        parents = keymap.drop_duplicates("unit_code")
+        group_keys = ["year", "parent_code"]
+
+        units = table.units.merge(parents, on="unit_code", how="inner")
+        child_cast = units["valid_votes_cast"] + units["discarded_votes"] + units["blank_votes"]
+        units["turnout_complete"] = child_cast.notna() & units["electorate"].notna()
+        sums = units.groupby(group_keys, sort=True)[NorResultsTable.COUNT_COLUMNS + ["electorate"]].sum(min_count=1)
+        complete = units.groupby(group_keys, sort=True)["turnout_complete"].all()
+        firsts = units.groupby(group_keys, sort=True).agg(
+            parent_name=("parent_name", "first"),
+            election_type=("election_type", "first"),
+            retrieved_on=("retrieved_on", "min"),
+            last_updated=("last_updated", "max"),
+        )
+        agg_units = sums.join(firsts).join(complete).reset_index()
+
+        cast = agg_units["valid_votes_cast"] + agg_units["discarded_votes"] + agg_units["blank_votes"]
+        agg_units["turnout"] = (cast / agg_units["electorate"]).where(agg_units["turnout_complete"]).round(4)
+        agg_units["level_code"] = level_code
+        agg_units = agg_units.rename(columns={"parent_code": "unit_code", "parent_name": "unit_name"})
+
+        agg_votes = cls._rollup_parties(table.votes, parents, "votes", level_code)
+
+        return NorResultsTable(
+            units=agg_units[NorResultsTable.UNIT_COLUMNS],
+            votes=agg_votes[NorResultsTable.VOTE_COLUMNS],
+        )
+
+    @classmethod
+    def _rollup_parties(cls, frame: pd.DataFrame, parents: pd.DataFrame, value: str, level_code: str):
+        merged = frame.merge(parents[["unit_code", "parent_code"]], on="unit_code", how="inner")
+        grouped = merged.groupby(["year", "parent_code", "party_code"], sort=True).agg(
+            party_name=("party_name", "first"),
+            **{value: (value, "sum")},
+        ).reset_index()
+        grouped["level_code"] = level_code
+        return grouped.rename(columns={"parent_code": "unit_code"})
+
+    @classmethod
+    def unmatched_units(cls, table: NorResultsTable, mappings: dict) -> dict:
+        """
+        Level 2 units present in only one of the results and the keymap
+        :return: dict with 'missing_from_keymap' and 'missing_from_results' lists of unit codes
+        """
+        keymap_codes = set(cls.keymap_frame(mappings)["unit_code"])
+        result_codes = set(table.units["unit_code"])
+        return {
+            "missing_from_keymap": sorted(result_codes - keymap_codes),
+            "missing_from_results": sorted(keymap_codes - result_codes),
+        }
+
+    @classmethod
+    def compare(cls, derived: NorResultsTable, reported: NorResultsTable, tolerance: int = 0) -> pd.DataFrame:
+        """
+        Consistency check between derived (aggregated) results and results reported by SSB for the same units
+        :param derived: NorResultsTable from `aggregate` or `national`
+        :param reported: NorResultsTable collected from SSB at the same level
+        :param tolerance: absolute difference allowed before a value is reported
+        :return: DataFrame with one row per mismatching value (empty if consistent)
+        """
+        keys = ["year", "unit_code"]
+        units = derived.units.merge(reported.units, on=keys, how="outer", suffixes=("_derived", "_reported"))
+        frames = []
+        for column in NorResultsTable.COUNT_COLUMNS:
+            frames.append(pd.DataFrame({
+                "year": units["year"],
+                "unit_code": units["unit_code"],
+                "party_code": None,
+                "field": column,
+                "derived": units[f"{column}_derived"],
+                "reported": units[f"{column}_reported"],
+            }))
+
+        votes = derived.votes.merge(
+            reported.votes, on=keys + ["party_code"], how="outer", suffixes=("_derived", "_reported")
+        )
+        frames.append(pd.DataFrame({
+            "year": votes["year"],
+            "unit_code": votes["unit_code"],
+            "party_code": votes["party_code"],
+            "field": "votes",
+            "derived": votes["votes_derived"],
+            "reported": votes["votes_reported"],
+        }))
+
+        comparison = pd.concat(frames, ignore_index=True)
+        comparison["difference"] = comparison["derived"] - comparison["reported"]
+        mismatch = comparison["difference"].abs().gt(tolerance) | comparison["difference"].isna()
+        return comparison[mismatch].reset_index(drop=True)
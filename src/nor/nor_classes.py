@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from src.utils import classification
+
+
+class NorClassBreaks:
+    """
+    Choropleth class breaks and per-unit class indices for the materialized metric views, so map clients colour
+    units by lookup instead of classifying the whole dataset themselves.
+
+    Per year and level:
+        * every unit metric (METRICS, plus bloc shares) gets quantile and Jenks breaks over the year's units, and
+          columns {metric}_quantile / {metric}_jenks with each unit's class index
+        * party vote shares get the fixed PARTY_SHARE_BREAKS bins (share_bin) and Jenks breaks per party
+          (share_jenks)
+
+    Class indices are int8, -1 where the unit has no value. The breaks are stored next to the views:
+        metrics/country=nor/level={level_code}/class_breaks.parquet    year, metric, method, breaks
+        metrics/country=nor/level={level_code}/class_breaks.json       {year: {metric: {method: breaks}}}
+    Party metrics are named share:{party_code}.
+    """
+    CLASSES = 5
+    METHODS = {"quantile": classification.quantile_breaks, "jenks": classification.jenks_breaks}
+    METRICS = ["turnout", "enp_votes", "enp_seats", "pedersen_volatility", "gallagher_index"]
+    PRECISION = 4
+
+    @classmethod
+    def metrics(cls, unit_metrics: pd.DataFrame) -> list:
+        return [m for m in cls.METRICS if m in unit_metrics] + [c for c in unit_metrics if c.startswith("bloc_")]
+
+    @classmethod
+    def breaks_row(cls, year, metric, method, breaks) -> dict:
+        return {"year": int(year), "metric": metric, "method": method,
+                "breaks": np.round(breaks, cls.PRECISION).tolist()}
+
+    @classmethod
+    def classify_units(cls, unit_metrics: pd.DataFrame):
+        """
+        :return: (unit_metrics with class columns, list of breaks rows)
+        """
+        unit_metrics = unit_metrics.reset_index(drop=True)
+        metrics = cls.metrics(unit_metrics)
+        classes = {f"{metric}_{method}": np.full(len(unit_metrics), -1, dtype=np.int8)
+                   for metric in metrics for method in cls.METHODS}
+        rows = []
+        for year, index in unit_metrics.groupby("year").indices.items():
+            for metric in metrics:
+                values = unit_metrics[metric].to_numpy(dtype=float)[index]
+                for method, breaks_of in cls.METHODS.items():
+                    breaks = breaks_of(values, cls.CLASSES)
+                    classes[f"{metric}_{method}"][index] = classification.classify(values, breaks)
+                    rows.append(cls.breaks_row(year, metric, method, breaks))
+        return unit_metrics.assign(**classes), rows
+
+    @classmethod
+    def classify_parties(cls, party_swing: pd.DataFrame):
+        """
+        :return: (party_swing with share_bin and share_jenks, list of breaks rows)
+        """
+        party_swing = party_swing.reset_index(drop=True)
+        shares = party_swing["share"].to_numpy(dtype=float)
+        jenks = np.full(len(party_swing), -1, dtype=np.int8)
+        rows = []
+        for (year, party_code), index in party_swing.groupby(["year", "party_code"]).indices.items():
+            breaks = classification.jenks_breaks(shares[index], cls.CLASSES)
+            jenks[index] = classification.classify(shares[index], breaks)
+            rows.append(cls.breaks_row(year, f"share:{party_code}", "jenks", breaks))
+        for year in party_swing["year"].unique():
+            rows.append(cls.breaks_row(year, "share", "party_bins", classification.PARTY_SHARE_BREAKS))
+        return party_swing.assign(
+            share_bin=classification.classify(shares, classification.PARTY_SHARE_BREAKS), share_jenks=jenks
+        ), rows
+
+    @classmethod
+    def classify(cls, unit_metrics: pd.DataFrame, party_swing: pd.DataFrame):
+        """
+        :return: (unit_metrics, party_swing, breaks DataFrame)
+        """
+        unit_metrics, unit_rows = cls.classify_units(unit_metrics)
+        party_swing, party_rows = cls.classify_parties(party_swing)
+        breaks = pd.DataFrame(unit_rows + party_rows, columns=["year", "metric", "method", "breaks"])
+        return unit_metrics, party_swing, breaks
+
+    @classmethod
+    def key(cls, level_code, name):
+        return f"metrics/country=nor/level={level_code}/{name}"
+
+    @classmethod
+    def to_store(cls, store, breaks: pd.DataFrame, level_code):
+        store.write_parquet(breaks, cls.key(level_code, "class_breaks.parquet"))
+        nested = {}
+        for row in breaks.itertuples(index=False):
+            nested.setdefault(str(row.year), {}).setdefault(row.metric, {})[row.method] = row.breaks
+        store.write_json(nested, cls.key(level_code, "class_breaks.json"), compressed=True)
@@ -0,0 +1,253 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from src.nor.nor_results_table import NorResultsTable
+
+
+class StringPool:
+    """
+    Interns repeated strings (party names, unit names, dates, level codes) as integer codes.
+    Each distinct string is stored once; records hold 4-byte codes instead of references to string objects.
+    """
+    __slots__ = ("strings", "codes")
+
+    def __init__(self):
+        self.strings = []
+        self.codes = {}
+
+    def encode(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.codes[value] = code
+            self.strings.append(value)
+        return code
+
+    def decode(self, code: int):
+        return self.strings[code]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class CompactResults:
+    """
+    Compact struct-of-arrays container for unit results.
+
+    Unit results from NorResultsParliament.get_result are deep nested dicts with the same strings repeated across
+    every unit, year and party. CompactResults stores them as typed columns (array.array) with all strings interned
+    in a shared StringPool, and party/seat distributions as flat columns addressed by per-unit offsets (CSR layout).
+    A full historical load is a few dozen flat buffers rather than millions of small dict and str objects.
+
+    Records are rebuilt in the original dict shape on demand (`result(i)`, iteration, `to_results`), and columns can
+    be exposed as numpy arrays without copying for vectorized work (`to_table`).
+
+    Counts SSB doesn't publish (local elections have no discarded/blank or time-of-vote counts) are stored as the
+    MISSING sentinel and a missing turnout as NaN; both come back as None in records and as NaN in tables.
+    """
+    __slots__ = (
+        "strings", "year", "election_type", "level_code", "unit_code", "unit_name", "retrieved_on", "last_updated",
+        "counts", "turnout", "party_offsets", "party_code", "party_name", "votes",
+        "seat_offsets", "has_seats", "seat_party_code", "seat_party_name", "seats",
+    )
+
+    STRING_FIELDS = ("election_type", "level_code", "unit_code", "unit_name", "retrieved_on", "last_updated")
+    MISSING = np.iinfo(np.int64).min
+
+    def __init__(self, strings: StringPool = None):
+        self.strings = strings if strings is not None else StringPool()
+
+        self.year = array("H")
+        for field in self.STRING_FIELDS:
+            setattr(self, field, array("I"))
+        self.counts = {column: array("q") for column in NorResultsTable.COUNT_COLUMNS}
+        self.turnout = array("d")
+
+        self.party_offsets = array("I", [0])
+        self.party_code = array("I")
+        self.party_name = array("I")
+        self.votes = array("q")
+
+        self.seat_offsets = array("I", [0])
+        self.has_seats = array("b")
+        self.seat_party_code = array("I")
+        self.seat_party_name = array("I")
+        self.seats = array("H")
+
+    def __len__(self):
+        return len(self.year)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.result(i)
+
+    def __getitem__(self, i):
+        return self.result(i)
+
+    @classmethod
+    def from_results(cls, results, strings: StringPool = None):
+        compact = cls(strings)
+        compact.extend(results)
+        return compact
+
+    def extend(self, results):
+        for result in results:
+            if result is not None:
+                self.append(result)
+
+    def append(self, result: dict):
+        """
+        Add one unit result in the get_result dict shape
+        """
+        encode = self.strings.encode
+
+        self.year.append(result['year'])
+        for field in self.STRING_FIELDS:
+            getattr(self, field).append(encode(result[field]))
+
+        election_day = result['votes_by_type']['election_day_vote']
+        early = result['votes_by_type']['early_vote']
+        values = (
+            result['valid_votes_cast'], result['discarded_votes'], result['blank_votes'],
+            election_day['valid'], election_day['discarded'], election_day['blank'],
+            early['valid'], early['discarded'], early['blank'],
+        )
+        for column, value in zip(NorResultsTable.COUNT_COLUMNS, values):
+            self.counts[column].append(self.MISSING if value is None else value)
+        self.turnout.append(np.nan if result['turnout'] is None else result['turnout'])
+
+        for party in result['results']:
+            self.party_code.append(encode(party['party_code']))
+            self.party_name.append(encode(party['party_name']))
+            self.votes.append(party['votes'])
+        self.party_offsets.append(len(self.votes))
+
+        seat_distribution = result.get('seat_distribution')
+        self.has_seats.append(seat_distribution is not None)
+        for party in seat_distribution or []:
+            self.seat_party_code.append(encode(party['party_code']))
+            self.seat_party_name.append(encode(party['party_name']))
+            self.seats.append(party['seats'])
+        self.seat_offsets.append(len(self.seats))
+
+    def result(self, i: int) -> dict:
+        """
+        Rebuild unit result i in the get_result dict shape
+        """
+        decode = self.strings.decode
+        counts = {
+            column: None if (value := self.counts[column][i]) == self.MISSING else value
+            for column in NorResultsTable.COUNT_COLUMNS
+        }
+        turnout = self.turnout[i]
+
+        result = {
+            "year": self.year[i],
+            "election_type": decode(self.election_type[i]),
+            "unit_code": decode(self.unit_code[i]),
+            "unit_name": decode(self.unit_name[i]),
+            "level_code": decode(self.level_code[i]),
+            "retrieved_on": decode(self.retrieved_on[i]),
+            "last_updated": decode(self.last_updated[i]),
+            "valid_votes_cast": counts['valid_votes_cast'],
+            "discarded_votes": counts['discarded_votes'],
+            "blank_votes": counts['blank_votes'],
+            "turnout": None if np.isnan(turnout) else turnout,
+            "votes_by_type": {
+                "election_day_vote": {
+                    "valid": counts['election_day_valid'],
+                    "discarded": counts['election_day_discarded'],
+                    "blank": counts['election_day_blank'],
+                },
+                "early_vote": {
+                    "valid": counts['early_valid'],
+                    "discarded": counts['early_discarded'],
+                    "blank": counts['early_blank'],
+                },
+            },
+            "results": [
+                {
+                    "party_code": decode(self.party_code[j]),
+                    "party_name": decode(self.party_name[j]),
+                    "votes": self.votes[j],
+                }
+                for j in range(self.party_offsets[i], self.party_offsets[i + 1])
+            ],
+        }
+
+        if self.has_seats[i]:
+            result['seat_distribution'] = [
+                {
+                    "party_code": decode(self.seat_party_code[j]),
+                    "party_name": decode(self.seat_party_name[j]),
+                    "seats": self.seats[j],
+                }
+                for j in range(self.seat_offsets[i], self.seat_offsets[i + 1])
+            ]
+
+        return result
+
+    def to_results(self) -> list:
+        return list(self)
+
+    def nbytes(self) -> int:
+        """
+        Approximate size of the column buffers in bytes (excluding the string pool)
+        """
+        columns = [getattr(self, name) for name in self.__slots__ if name not in ("strings", "counts")]
+        columns += list(self.counts.values())
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def _decoded(self, codes: array, pool: np.ndarray) -> np.ndarray:
+        return pool[np.frombuffer(codes, dtype=np.uint32)]
+
+    def _count_column(self, values: array) -> np.ndarray:
+        """
+        int64 view of a count buffer, or a float copy with NaN where the buffer holds MISSING
+        """
+        counts = np.frombuffer(values, dtype=np.int64)
+        missing = counts == self.MISSING
+        return np.where(missing, np.nan, counts) if missing.any() else counts
+
+    def to_table(self) -> NorResultsTable:
+        """
+        Columnar NorResultsTable view of the container.
+        Numeric columns are zero-copy views of the buffers (count columns with missing values are copied to float);
+        string columns reference the pooled string objects.
+        """
+        pool = np.array(self.strings.strings, dtype=object)
+        n_parties = np.diff(np.frombuffer(self.party_offsets, dtype=np.uint32))
+        n_seats = np.diff(np.frombuffer(self.seat_offsets, dtype=np.uint32))
+        years = np.frombuffer(self.year, dtype=np.uint16).astype(np.int64)
+
+        units = pd.DataFrame({
+            "year": years,
+            **{field: self._decoded(getattr(self, field), pool) for field in self.STRING_FIELDS},
+            **{column: self._count_column(values) for column, values in self.counts.items()},
+            "turnout": np.frombuffer(self.turnout, dtype=np.float64),
+        })
+        units = NorResultsTable.with_electorate(units)[NorResultsTable.UNIT_COLUMNS]
+
+        def expand(column, repeats):
+            return np.repeat(units[column].to_numpy(), repeats)
+
+        votes = pd.DataFrame({
+            "year": np.repeat(years, n_parties),
+            "level_code": expand("level_code", n_parties),
+            "unit_code": expand("unit_code", n_parties),
+            "party_code": self._decoded(self.party_code, pool),
+            "party_name": self._decoded(self.party_name, pool),
+            "votes": np.frombuffer(self.votes, dtype=np.int64),
+        })
+        seats = pd.DataFrame({
+            "year": np.repeat(years, n_seats),
+            "level_code": expand("level_code", n_seats),
+            "unit_code": expand("unit_code", n_seats),
+            "party_code": self._decoded(self.seat_party_code, pool),
+            "party_name": self._decoded(self.seat_party_name, pool),
+            "seats": np.frombuffer(self.seats, dtype=np.uint16).astype(np.int64),
+        })
+
+        return NorResultsTable(units=units, votes=votes, seats=seats)
@@ -0,0 +1,273 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from src.nor.nor_aggregation import NorResultsAggregator
+from src.nor.nor_div_mapping import StatNorMappings
+from src.nor.nor_pxweb import PxWebQueryPlanner, JsonStatCube
+from src.nor.nor_results_table import unit_ids
+from src.utils.fetch import ResilientFetcher
+from src.utils.local_store import LocalStore
+from src.utils.logging_manager import instrumentation
+
+# SSB statbank tables of the contextual layer. Each table is pulled for every municipality and year in one logical
+# query (chunked by the PxWeb planner) with the fixed `selections` given here, pivoted on `pivot` and reduced to raw
+# measures by the table's `measures_*` method. Measures are counts that add up when units merge or roll up, except
+# those in `weights`, which are averaged weighted by another measure.
+#   * population - persons by age on 1 January (population, age bands, mean age)
+#   * income     - households and median household income after tax
+#   * education  - persons 16 and over by highest completed education level on 1 October
+# `lag` is the number of years between a table's latest useful year and the election: population is counted on
+# 1 January of the election year, income and education describe the year before.
+CONTEXT_TABLES = {
+    "population": {
+        "table": "07459",
+        "selections": {"Alder": ("all", ["*"]), "ContentsCode": ("item", ["Personer1"])},
+        "pivot": "Alder",
+        "lag": 0,
+        "weights": {},
+    },
+    "income": {
+        "table": "06944",
+        "selections": {"HusholdType": ("item", ["0000"]), "ContentsCode": ("item", ["AntallHushold", "InntSkatt"])},
+        "pivot": "ContentsCode",
+        "lag": 1,
+        "weights": {"median_income": "households"},
+    },
+    "education": {
+        "table": "09429",
+        "selections": {
+            "Nivaa": ("item", ["01", "02a", "11", "03a", "04a", "09a"]), "ContentsCode": ("item", ["Personer"])
+        },
+        "pivot": "Nivaa",
+        "lag": 1,
+        "weights": {},
+    },
+}
+
+AGE_BANDS = {"0_17": (0, 17), "18_29": (18, 29), "30_49": (30, 49), "50_66": (50, 66), "67_plus": (67, 200)}
+EDUCATION_LEVELS = {
+    "01": "basic", "02a": "upper_secondary", "11": "vocational", "03a": "higher_short", "04a": "higher_long",
+    "09a": "unknown",
+}
+
+
+class NorContext:
+    """
+    Demographic and economic context for every unit and election year, keyed like the results.
+
+    Each SSB table in CONTEXT_TABLES is fetched once for all municipalities and years. For an election year the
+    latest available year of each table (at most `lag` years before the election) is reconciled to the election's
+    unit codes:
+        * KLASS change lists (classification 131) between the data year and the election are followed code by code,
+          so municipalities merged since then are summed into their successor
+        * counts of municipalities split since then can't be allocated and are left empty for the successors;
+          weighted measures (median income) carry over
+        * level 2 units are rolled up to 1a and 1b with the year's keymaps
+
+    Frames carry an integer `unit_id` next to `unit_code` (see nor_results_table.unit_ids), so joins to the results
+    tables are integer lookups.
+
+    Storage layout:
+        context/country=nor/year={year}/level={level_code}/{population|income|education}.parquet
+    """
+    fetcher = ResilientFetcher()
+    pxweb = PxWebQueryPlanner(fetcher)
+    klass = StatNorMappings.klass
+    MUNICIPALITY = re.compile(r"^\d{4}$")
+
+    def __init__(self, store=None):
+        self.store = store or LocalStore()
+
+    def query(self, name, regions, years) -> dict:
+        spec = CONTEXT_TABLES[name]
+        return {
+            "query": [
+                {"code": "Region", "selection": {"filter": "item", "values": list(regions)}},
+                *[
+                    {"code": code, "selection": {"filter": filter, "values": values}}
+                    for code, (filter, values) in spec['selections'].items()
+                ],
+                {"code": "Tid", "selection": {"filter": "item", "values": list(years)}},
+            ],
+            "response": {"format": "json-stat2"},
+        }
+
+    def fetch(self, name, start_year) -> pd.DataFrame:
+        """
+        One table for every municipality code SSB publishes (current and historical) and every year from start_year
+        :return: DataFrame indexed by (Region, Tid) with the table's raw measures; rows without data are dropped
+        """
+        spec = CONTEXT_TABLES[name]
+        metadata = self.pxweb.metadata(spec['table'])
+        regions = [code for code in metadata['Region']['values'] if self.MUNICIPALITY.match(code)]
+        years = [year for year in metadata['Tid']['values'] if int(year) >= start_year]
+
+        cube = JsonStatCube(self.pxweb.query(spec['table'], self.query(name, regions, years)))
+        long = cube.to_frame()
+        wide = long.pivot_table(index=["Region", "Tid"], columns=spec['pivot'], values="value", aggfunc="first",
+                                observed=True, dropna=False)
+        measures = getattr(self, f"measures_{name}")(wide)
+        measures = measures[measures.notna().any(axis=1)]  # codes that didn't exist in a year have no values
+        print(f"Context table {name} ({spec['table']}): {len(measures)} unit-years")
+        return measures
+
+    @staticmethod
+    def measures_population(wide: pd.DataFrame) -> pd.DataFrame:
+        ages = np.array([int(code.rstrip("+")) for code in wide.columns])
+        counts = wide.to_numpy(dtype=float)
+        measures = pd.DataFrame({"population": np.nansum(counts, axis=1)}, index=wide.index)
+        for band, (low, high) in AGE_BANDS.items():
+            measures[f"age_{band}"] = np.nansum(counts[:, (ages >= low) & (ages <= high)], axis=1)
+        measures["age_years"] = np.nansum(counts * ages, axis=1)  # for the mean age after merges and roll-ups
+        measures[~np.isfinite(counts).any(axis=1)] = np.nan
+        return measures
+
+    @staticmethod
+    def measures_income(wide: pd.DataFrame) -> pd.DataFrame:
+        return pd.DataFrame({
+            "households": wide["AntallHushold"], "median_income": wide["InntSkatt"]
+        }, index=wide.index)
+
+    @staticmethod
+    def measures_education(wide: pd.DataFrame) -> pd.DataFrame:
+        return wide.rename(columns={code: f"education_{level}" for code, level in EDUCATION_LEVELS.items()})[
+            [f"education_{level}" for level in EDUCATION_LEVELS.values()]
+        ]
+
+    @staticmethod
+    def derive(name, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rates from the reconciled counts
+        """
+        frame = frame.copy()
+        if name == "population":
+            frame["mean_age"] = (frame.pop("age_years") / frame["population"]).round(2)
+        elif name == "education":
+            levels = [f"education_{level}" for level in EDUCATION_LEVELS.values()]
+            total = frame[levels].sum(axis=1, min_count=len(levels))
+            frame["education_higher_share"] = (
+                (frame["education_higher_short"] + frame["education_higher_long"]) / total
+            ).round(4)
+        return frame
+
+    @staticmethod
+    def crosswalk(changes, codes) -> pd.DataFrame:
+        """
+        Follow codes through a change list in date order
+        :param changes: KLASS changes (old_unit_code, new_unit_code, unit_change_occurred)
+        :param codes: codes valid at the start of the change list
+        :return: DataFrame of source_code, unit_code (a split code has one row per successor)
+        """
+        by_date = defaultdict(list)
+        for change in changes:
+            by_date[change['unit_change_occurred']].append(change)
+
+        current = {code: {code} for code in codes}
+        for day in sorted(by_date):
+            successors = defaultdict(set)
+            for change in by_date[day]:
+                successors[change['old_unit_code']].add(change['new_unit_code'])
+            for code, targets in current.items():
+                current[code] = set().union(*(successors.get(target, {target}) for target in targets))
+
+        rows = [(source, target) for source, targets in current.items() for target in sorted(targets)]
+        return pd.DataFrame(rows, columns=["source_code", "unit_code"])
+
+    @staticmethod
+    def reconcile(frame: pd.DataFrame, crosswalk: pd.DataFrame, weights: dict) -> pd.DataFrame:
+        """
+        Combine source units into target units along a crosswalk
+        :param frame: measures indexed by source code
+        :param crosswalk: source_code, unit_code pairs (code changes or a keymap roll-up)
+        :param weights: measure -> weight measure for measures averaged instead of summed
+        :return: measures indexed by unit_code; a count is empty if any of its sources was split or empty
+        """
+        merged = crosswalk.merge(frame, left_on="source_code", right_index=True, how="inner")
+        sums = [column for column in frame.columns if column not in weights]
+        for column, weight in weights.items():
+            merged[f"{column}__weight"] = merged[weight].where(merged[column].notna())
+            merged[column] = merged[column] * merged[f"{column}__weight"]
+
+        split = merged.groupby("source_code")["unit_code"].transform("size").to_numpy() > 1
+        merged.loc[split, sums] = np.nan
+
+        grouped = merged.groupby("unit_code", sort=True)
+        incomplete = merged[sums].isna().groupby(merged["unit_code"], sort=True).any()
+        reconciled = grouped[sums].sum(min_count=1).mask(incomplete)
+        for column in weights:
+            reconciled[column] = grouped[column].sum(min_count=1) / grouped[f"{column}__weight"].sum(min_count=1)
+        return reconciled[list(frame.columns)]
+
+    @staticmethod
+    def source_year(frame: pd.DataFrame, year, lag) -> int:
+        """
+        Latest year of a table at most `lag` years before the election (older if SSB hasn't published it yet)
+        """
+        years = sorted(int(y) for y in frame.index.get_level_values("Tid").unique())
+        available = [y for y in years if y <= year - lag]
+        if not available:
+            raise ValueError(f"No data before {year - lag} (first year {years[0] if years else None})")
+        return available[-1]
+
+    def reconcile_year(self, name, measures: pd.DataFrame, year) -> dict:
+        """
+        One table reconciled to an election year's level 2 units and rolled up to 1a and 1b
+        :return: dict of level_code -> frame
+        """
+        spec = CONTEXT_TABLES[name]
+        source_year = self.source_year(measures, year, spec['lag'])
+        frame = measures.xs(str(source_year), level="Tid")
+
+        changes = self.klass.changes_between("131", f"{source_year}-01-02", f"{year}-04-02")
+        level_2 = self.reconcile(frame, self.crosswalk(changes, frame.index), spec['weights'])
+
+        keymaps = {level_code: StatNorMappings.load_locally(level_code, year) for level_code in ("1a", "1b")}
+        codes = NorResultsAggregator.keymap_frame(keymaps["1a"])["unit_code"]
+        missing = sorted(set(codes) - set(level_2.index))
+        if missing:
+            print(f"Context {name} {year}: no {source_year} data for {len(missing)} units, e.g. {missing[:5]}")
+        frames = {"2": level_2.reindex(pd.Index(codes, name="unit_code").sort_values())}
+
+        for level_code, keymap in keymaps.items():
+            parents = NorResultsAggregator.keymap_frame(keymap).rename(
+                columns={"unit_code": "source_code", "parent_code": "unit_code"}
+            )
+            frames[level_code] = self.reconcile(frames["2"], parents[["source_code", "unit_code"]], spec['weights'])
+
+        output = {}
+        for level_code, reconciled in frames.items():
+            reconciled = self.derive(name, reconciled).reset_index()
+            reconciled.insert(0, "unit_id", unit_ids(reconciled["unit_code"]))
+            reconciled.insert(0, "level_code", level_code)
+            reconciled.insert(0, "year", year)
+            reconciled["source_year"] = source_year
+            output[level_code] = reconciled
+        return output
+
+    @classmethod
+    def key(cls, year, level_code, name):
+        return f"context/country=nor/year={year}/level={level_code}/{name}.parquet"
+
+    @instrumentation.timed("context")
+    def ingest(self, years, names=None) -> dict:
+        """
+        Fetch, reconcile and store the context tables for a set of election years
+        :param names: subset of CONTEXT_TABLES (defaults to all)
+        :return: dict of table name -> number of unit rows written
+        """
+        years = sorted(years)
+        written = {}
+        for name in names or CONTEXT_TABLES:
+            measures = self.fetch(name, min(years) - CONTEXT_TABLES[name]['lag'] - 1)
+            written[name] = 0
+            for year in years:
+                for level_code, frame in self.reconcile_year(name, measures, year).items():
+                    self.store.write_parquet(frame, self.key(year, level_code, name))
+                    written[name] += len(frame)
+        return written
+
+    def load(self, year, level_code, name) -> pd.DataFrame:
+        return self.store.read_parquet(self.key(year, level_code, name))
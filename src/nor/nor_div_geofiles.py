@@ -4,7 +4,10 @@ import zipfile
 import io
 import geopandas as gpd
 import pandas as pd
-from src.utils.s3manager import S3Manager
+from src.utils.logging_manager import instrumentation
+from src.utils.local_store import LocalStore
+from src.utils.geometry_store import GeometryStore
+from src.utils import serialization
 from datetime import date, datetime as dt
 import tempfile
 import os
@@ -37,7 +40,8 @@ class NorGeoProcessor:
         * Kartverket (Mapping Authority):
             - Source for geographic data from 1997 to the current year
             - Files from 2019 to current year are available as straight GeoJSON files
-            - Files from 1997 - 2018 are available as single SOSI file (unique format for Norway) that's handled accordingly.
+            - Files from 1997 - 2018 are only available as single SOSI file (unique format for Norway), which is not
+              supported: years before GEOJSON_START_AT_SOURCE have no boundaries
 
     DATA PROCESSING:
         *Raw Data
@@ -52,13 +56,28 @@ class NorGeoProcessor:
 
     DATA STORAGE:
         *AWS S3
+        *Boundaries per year and level as GeoParquet and FlatGeobuf (GeometryStore)
     """
-    def __init__(self, year):
+    VIEW_PRECISION = 4  # ~10 m, plenty for simplified display geometry
+    GEOJSON_START_AT_SOURCE = 2019  # first year Kartverket publishes as GeoJSON
+    TOPOJSON_QUANTIZATION = 100_000
+
+    def __init__(self, year, store=None):
         self.year = year
-        self.configure_s3()
+        if store is not None:
+            # any store with the S3Manager interface, e.g. LocalStore during development
+            self.s3 = store
+            self.configure_prefixes()
+        else:
+            self.configure_s3()
+        self.geometry = GeometryStore(store if isinstance(store, LocalStore) else LocalStore())
 
     def configure_s3(self):
+        from src.utils.s3manager import S3Manager
         self.s3 = S3Manager(bucket="election-atlas", region="us-east-1")
+        self.configure_prefixes()
+
+    def configure_prefixes(self):
         self.raw = "raw/country=Norway/"
         self.geodata = "geodata/country=Norway/"
         self.dimensions = "dimensions/country=Norway/"
@@ -96,8 +115,7 @@ class NorGeoProcessor:
 
         self.s3.write_json(
             data = data,
-            key = key,
-            indent= 2
+            key = key
         )
         return data
 
@@ -150,46 +168,103 @@ class NorGeoProcessor:
     def get_geodata(self, year=None, keymap: dict = None):
         """
         Method to get and process GeoJSON data from Norway's mapping authority valid during the specified year.
-        Stores geoJSON data in S3.
+        Builds level 2 (municipality) and level 1 (county) boundaries and stores each level once, as GeoParquet and
+        FlatGeobuf (see GeometryStore), plus the consolidated GeoJSON used to build the TopoJSON view.
 
         :param year: year for which to get subdivision data. Defaults to 'self.year' if None
-        :return:
+        :param keymap: level 1a keymap (StatNorMappings format); loaded from the saved mappings if None
+        :return: level 1 GeoDataFrame, level 2 GeoDataFrame
         """
         if not year:
             year = self.year
 
         if not keymap:
-            keymap = self.s3.read_json(
-                key=f"raw/country=nor/year={year}/subdivision_keymap.json"
-            )
+            from src.nor.nor_div_mapping import StatNorMappings
+            keymap = StatNorMappings.load_locally("1a", year)
 
         zip_url, file_type = self.get_direct_zip_url(year=year)
 
-        if file_type == "SOSI":
-            gdf_all_L2 = self.L2_gdf_from_sosi(zip_url)
-        elif file_type == "GeoJson":
+        if file_type == "GeoJSON":
             gdf_all_L2 = self.L2_gdf_from_geojson(zip_url)
         else:
             raise ValueError(f"Invalid file type: {file_type}")
 
-        gdfs_single_L1 = []
-        for L1_region in keymap.keys()
-            gdf_filtered_L2 = self.process_individual_L2(L1_region, gdf_all_L2)
-            gdf_single_L1 = self.build_L1(L1_region, gdf_filtered_L2)
-            gdfs_single_L1.append(gdf_single_L1)
-        gdf_all_L1 = pd.concat(gdfs_single_L1)
+        gdf_all_L2 = self.assign_L1(gdf_all_L2, keymap)
+        gdf_all_L1 = self.build_L1(gdf_all_L2, keymap)
+
+        self.consolidate_L1(gdf_all_L1, year)
+        self.consolidate_L2(gdf_all_L2, year)
+        return gdf_all_L1, gdf_all_L2
+
+    @staticmethod
+    def assign_L1(gdf, keymap: dict):
+        """
+        Fill in each level 2 unit's level 1 code from the keymap
+        """
+        parents = {
+            target['target_unit_code']: unit['source_unit_code']
+            for unit in keymap['unit_mappings'] for target in unit['target_units']
+        }
+        gdf = gdf.copy()
+        gdf['level_1_code'] = gdf['level_2_code'].map(parents)
+        unmatched = gdf['level_1_code'].isna().sum()
+        if unmatched:
+            print(f"{unmatched} level 2 units not in keymap: {sorted(gdf.loc[gdf['level_1_code'].isna(), 'level_2_code'])}")
+        return gdf
+
+    @staticmethod
+    def build_L1(gdf_L2, keymap: dict):
+        """
+        Dissolve level 2 boundaries into their level 1 units
+        """
+        names = {unit['source_unit_code']: unit['source_unit_name'] for unit in keymap['unit_mappings']}
+        gdf_L1 = gdf_L2.dropna(subset=['level_1_code']).dissolve(
+            by='level_1_code', aggfunc={'level_2_code': 'count', 'retrieved_at': 'first'}
+        ).reset_index().rename(columns={'level_2_code': 'num_municipalities'})
+        gdf_L1['level_1_name'] = gdf_L1['level_1_code'].map(names)
+        return gdf_L1[['level_1_code', 'level_1_name', 'retrieved_at', 'num_municipalities', 'geometry']]
+
+    def consolidate_L1(self, gdf, year):
+        self.store_level(gdf.assign(unit_code=gdf['level_1_code']), year, level=1)
 
-        self.consolidate_L1(gdf_all_L1)
-        self.consolidate_L2(gdf_all_L2)
+    def consolidate_L2(self, gdf, year):
+        self.store_level(gdf.assign(unit_code=gdf['level_2_code']), year, level=2)
 
-        level_1_gdfs = self.process_individual_L2(level_2_gdf)
-        self.process_individual_L1(level_1_gdfs)
-        self.process_consolidated_L
-    def process_individual_L2(self, gdf):
-        pass
+    def store_level(self, gdf, year, level):
+        """
+        Write one level's boundaries: GeoParquet/FlatGeobuf for partial reads, adjacency graph and label points,
+        consolidated GeoJSON for the TopoJSON build and a simplified, pre-compressed GeoJSON view
+        """
+        self.geometry.write(gdf, country="nor", year=year, level=level)
+        self.geometry.write_topology(gdf, country="nor", year=year, level=level)
+        self.geometry.store.write_geojson(gdf, key=self.consolidated_key(year, level))
+        simplified = gdf.copy()
+        simplified['geometry'] = simplified.geometry.simplify(0.001, preserve_topology=True)
+        self.geometry.store.write_geojson(
+            simplified,
+            key=f"views/country=nor/year={year}/level={level}/simplified.geojson",
+            precision=self.VIEW_PRECISION,
+            compressed=True
+        )
 
+    def build_topology(self, year=None, levels=(1, 2)):
+        """
+        Rebuild adjacency graphs and label points from already stored boundaries
+        :return: dict of level -> AdjacencyGraph
+        """
+        if not year:
+            year = self.year
+        return {
+            level: self.geometry.write_topology(self.geometry.read("nor", year, level), country="nor", year=year,
+                                                level=level)
+            for level in levels
+        }
 
+    @staticmethod
+    def consolidated_key(year, level):
+        return f"shapefiles/country=nor/year={year}/consolidated/level_{level}.geojson"
 
+    @instrumentation.timed("geometry")
     def L2_gdf_from_geojson(self, zip_url: str):
         """
         Processes a GeoJSON for a particular year from .zip file url to output
@@ -224,159 +299,41 @@ class NorGeoProcessor:
                        'valid_to', 'geometry']].copy()
             return gdf
 
-    def L2_gdf_from_sosi(self, zip_url: str):
-        pass
-
-
     def process_geofiles(self, year=None):
         """
         Method to get and process GeoJSON data from Norway's mapping authority valid during the specified year.
-        Stores geoJSON data in S3.
+        Boundaries are stored per level (GeoParquet/FlatGeobuf) rather than as one GeoJSON object per unit.
 
         :param year: year for which to get subdivision data. Defaults to 'self.year' if None
-        :return:
+        :return: level 2 GeoDataFrame
         """
-        # if not year:
-        #     year = self.year
-        #
-        # zip_url, file_type = self.get_direct_zip_url(year=year)
-        #
-        # zip_bytes = requests.get(zip_url).content
-        #
-        # region_keymap = self.s3.read_json(
-        #     key = f"raw/country=nor/year={year}/subdivision_keymap.json"
-        # )
-
-        # if file_type == "GeoJSON":
-        #     with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
-        #         name = [n for n in zf.namelist() if n.lower().endswith('.geojson')][0]
-        #         with zf.open(name) as f:
-        #             gdf = gpd.read_file(f, layer="Kommune")
-        #
-        #         gdf = gdf.rename(
-        #                 columns={
-        #                     "oppdateringsdato":"latest_update",
-        #                     "datauttaksdato":"retrieved_at",
-        #                     "kommunenummer":"level_2_code",
-        #                     "kommunenavn":"level_2_name",
-        #                     "gyldigFra":"valid_from",
-        #                     "gyldigTil":"valid_to"
-        #                 }
-        #             )
-        #         gdf['level_1_code'] = None
-        #         gdf['retrieved_at'] = gdf['retrieved_at'].dt.strftime('%Y-%m-%d')
-        #         gdf['latest_update'] = gdf['latest_update'].dt.strftime('%Y-%m-%d')
-        #         gdf['valid_from'] = pd.to_datetime(gdf['valid_from'], format='%Y%m%d', errors='coerce').dt.strftime('%Y-%m-%d')
-        #         gdf['valid_to'] = pd.to_datetime(gdf['valid_to'], format='%Y%m%d', errors='coerce').dt.strftime('%Y-%m-%d')
-        #
-        #         gdf = gdf[['level_2_code', 'level_2_name', 'level_1_code', 'retrieved_at', 'latest_update', 'valid_from', 'valid_to', 'geometry']].copy()
-
-            region_gdfs = []
-
-            for region in region_keymap:
-
-                district_gdfs = []
-
-                level_1_code = region['level_1_code']
-                level_1_name = region['level_1_name']
-
-                for district in region['constituents']:
-                    level_2_code = district['level_2_code']
-                    level_1_code = region['level_1_code']
-                    filtered_gdf = gdf[gdf['level_2_code'] == level_2_code].copy()
-                    filtered_gdf['level_1_code'] = level_1_code
-
-                    if not filtered_gdf.empty:
-
-                        geojson_dict = json.loads(filtered_gdf.to_json())
-
-                        path = f"shapefiles/country=nor/year={year}/level=2/{level_2_code}"
-                        self.s3.write_json(data=geojson_dict,key=path, indent=2)
-
-                        district_gdfs.append(geojson_dict)
-
-               if district_gdfs:
-                    combined_gdf = gpd.GeoDataFrame.from_dict(district_gdfs)
-                    unified_geo = combined_gdf.geometry.unary_union
-
-                    all_level_2_gdf = pd.concat(district_gdfs, ignore_index=True)
-                    simplified_l2_gdf = all_level_2_gdf.copy()
-                    simplified_l2_gdf['geometry'] = simplified_l2_gdf.geometry.simplify(0.001, preserve_topology=True)
-                    simplified_geojson = json.loads(simplified_l2_gdf.to_json())
-
-                    path = f"views/country=nor/year={year}/level=2/simplified.geojson"
-                    self.s3.write_json(data=simplified_geojson, key=path, indent=2)
-
-
-                    level_1_data = {
-                        'level_1_code': level_1_code,
-                        'level_1_name': level_1_name,
-                        'retrieved_at': combined_gdf['retrieved_at'].iloc[0],
-                        'num_municipalities': len(district_gdfs),
-                        'geometry': unified_geo
-                    }
-
-                    level_1_gdf = gpd.GeoDataFrame([level_1_data], geometry='geometry', crs=gdf.crs)
-                    level_1_geojson = json.loads(level_1_gdf.to_json())
-
-                    path = f"shapefiles/country=nor/level=1/{level_1_code}.geojson"
-                    self.s3.write_json(data=level_1_geojson,key=path, indent=2)
-                    region_gdfs.append(level_1_gdf)
-
-                    simplified_district_gdf = level_1_gdf.copy()
-                    simplified_district_gdf['geometry'] = simplified_district_gdf.geometry.simplify(0.001, preserve_topology=True)
-                    simplified_district_geojson = json.loads(simplified_district_gdf.to_json())
-                    path = f"shapefiles/country=nor/year={year}/level=1/simplified/{level_1_code}.geojson"
-
-            if region_gdfs:
-                all_level_1 = pd.concat(region_gdfs, ignore_index=True)
-                all_level_1_geojson = json.loads(all_level_1.to_json())
-                path = f"shapefiles/country=nor/year={year}/level=1/simplified.geojson"
-                self.s3.write_json(data=all_level_1_geojson, key = path, indent=2)
-
-
-            return gdf
+        return self.get_geodata(year=year)[1]
 
+    @instrumentation.timed("geometry")
     def create_topojson_file(self, year):
         """Create consolidated TopoJSON file for web display"""
-        import tempfile
         import subprocess
 
-        # Create temporary directory
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Path for GeoJSON files
-            l1_path = os.path.join(tmpdir, "level_1.geojson")
-            l2_path = os.path.join(tmpdir, "level_2.geojson")
-
-            # Output path
-            topo_path = os.path.join(tmpdir, "nor.topojson")
-
-            # Get consolidated GeoJSON files from S3
-            l1_geojson = self.s3.read_json(f"shapefiles/country=nor/year={year}/consolidated/level_1.geojson")
-            l2_geojson = self.s3.read_json(f"shapefiles/country=nor/year={year}/consolidated/level_2.geojson")
-
-            # Write to temp files
-            with open(l1_path, 'w') as f:
-                json.dump(l1_geojson, f)
-            with open(l2_path, 'w') as f:
-                json.dump(l2_geojson, f)
-
-            # Run topojson command (requires Node.js and topojson-server)
-            subprocess.run([
-                'npx', 'topojson-server',
-                '--out', topo_path,
-                '--properties',  # Preserve properties
-                f'counties={l1_path}',
-                f'municipalities={l2_path}'
-            ], check=True)
-
-            # Read the TopoJSON file
-            with open(topo_path, 'r') as f:
-                topojson_data = json.load(f)
-
-            # Save to S3
-            web_path = f"views/country=nor/year={year}/nor.topojson"
-            self.s3.write_json(data=topojson_data, key=web_path)
+        store = self.geometry.store
+        web_path = f"views/country=nor/year={year}/nor.topojson"
+        topo_path = store.path(web_path)
+        topo_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Run topojson command on the consolidated GeoJSON files (requires Node.js and topojson-server);
+        # quantized arcs are delta-encoded integers, which keeps the output compact
+        subprocess.run([
+            'npx', 'topojson-server',
+            '--out', str(topo_path),
+            '--quantization', str(self.TOPOJSON_QUANTIZATION),
+            f'counties={store.path(self.consolidated_key(year, 1))}',
+            f'municipalities={store.path(self.consolidated_key(year, 2))}'
+        ], check=True)
+        serialization.compress(topo_path)
+
+        # Publish to the bucket when it isn't the local store
+        if self.s3 is not store:
+            self.s3.write_json(data=store.read_json(web_path), key=web_path)
+        return topo_path
 
     def level_2_to_dict(geo_df, level_2_code):
         """
@@ -404,23 +361,24 @@ class NorGeoProcessor:
         return result
 
     def get_direct_zip_url(self, year):
-
+        """
+        :return: (url, file type) of the year's municipality boundaries
+        :raises ValueError: for years only published as SOSI (before GEOJSON_START_AT_SOURCE)
+        """
         CURRENT_YEAR = date.today().year
-        GEOJSON_START_AT_SOURCE = 2019
-        HISTORICAL_START = 1997
 
         if year == CURRENT_YEAR:
             return f"https://nedlasting.geonorge.no/geonorge/Basisdata/Kommuner/GEOJSON/Basisdata_0000_Norge_4258_Kommuner_GEOJSON.zip", "GeoJSON"
 
-        elif year >= GEOJSON_START_AT_SOURCE:
+        elif year >= self.GEOJSON_START_AT_SOURCE:
             return f"https://nedlasting.geonorge.no/geonorge/Basisdata/Kommuner{year}/GEOJSON/Basisdata_0000_Norge_4258_Kommuner{year}_GEOJSON.zip", "GeoJSON"
 
-        elif year >= HISTORICAL_START:
-            # SOSI format for historical data (1997-2018)
-            return f"https://nedlasting.geonorge.no/geonorge/Basisdata/AdministrativeEnheter{year}/SOSI/Basisdata_0000_Norge_25833_AdministrativeEnheter{year}_SOSI.zip", "SOSI"
-        else:
-            # Fallback to 1997 for earlier years
-            return f"https://nedlasting.geonorge.no/geonorge/Basisdata/AdministrativeEnheter1997/SOSI/Basisdata_0000_Norge_25833_AdministrativeEnheter1997_SOSI.zip", "SOSI"
+        # 1997 - 2018 are only published as SOSI (AdministrativeEnheter{year}/SOSI), which GDAL can't read without
+        # the optional SOSI driver
+        raise ValueError(
+            f"No boundaries for {year}: Kartverket only publishes years before {self.GEOJSON_START_AT_SOURCE} as SOSI, "
+            f"which is not supported"
+        )
 
     # def get_geojson(self, feed, l2_code):
     #     """
@@ -1,17 +1,11 @@
-import requests
-from copy import deepcopy
 import json
-import zipfile
-import io
-import geopandas as gpd
-import pandas as pd
 #from src.utils.s3manager import S3Manager
 from datetime import date, datetime as dt
-import tempfile
-import os
-import json
 import os
 from pathlib import Path
+from src.utils.fetch import ResilientFetcher
+from src.utils import serialization
+from src.nor.nor_klass import KlassMappingService
 
 
 class StatNorMappings:
@@ -26,7 +20,7 @@ class StatNorMappings:
         * 1a - Level 1 units - counties for administrative and local/regional election purposes
         * 1b - Level 1 units - counties for parliamentary election purposes - electoral districts (2020 - current)
         * 2 - Level 2 units - municipalities
-        * 3 - Level 3 units - precincts (where available - implementation pending)
+        * 3 - Level 3 units - precincts (where available - collected by NorPrecincts, see nor_precincts.py)
 
     Collection process:
         * Defines API endpoints based on year and unit level - 1b transitions from equivalent to admin. counties to electoral districts in 2020
@@ -39,11 +33,17 @@ class StatNorMappings:
     Outputs:
         * Level 1a dictionary - dictionary with entries for each unit at level 1a and their constituent level 2 units
         * Level 1b dictionary - dictionary with entries for each unit at level 1b and their constituent level 2 units
-        * 2 dictionary - level 2 dictionary with an entry for each level 2  corresponding level 3 unit codes (Pending implementation)
+        * 3 dictionary - level 2 dictionary with an entry for each level 2 unit and its level 3 unit codes (written by NorPrecincts)
 
     Purpose:
         * Collects data structures containing valid unit codes and their relationships valid in a specific year
     """
+    KLASS_API = "https://data.ssb.no/api/klass/v1/classifications"
+    fetcher = ResilientFetcher()
+    klass = KlassMappingService(fetcher, KLASS_API)
+    # split change lists per year from each classification's bulk change history instead of one request per year
+    BULK_CHANGES = True
+
     def __init__(self):
         pass
 
@@ -73,6 +73,8 @@ class StatNorMappings:
         # get level 1b keymap:
         if year == 2020:
             lvl_1b_mappings = cls.level_1b_transition() # handles the full processing for level 1b separately
+            lvl_1b_mappings['level_1_type_name'] = "electoral district"
+            lvl_1b_mappings['level_1_type_code'] = "1b"
 
         elif year > 2020:
             lvl_1b_endpoint = "543"
@@ -84,7 +86,12 @@ class StatNorMappings:
             lvl_1b_mappings['unit_changes']['level_2_changes'] = lvl_2_unit_changes
 
         else: # if year < 2020
-            lvl_1b_mappings = deepcopy(lvl_1a_mappings)
+            # same units as 1a: share the (immutable) unit mappings and change lists rather than deep-copying them
+            lvl_1b_mappings = {
+                **lvl_1a_mappings,
+                "metadata": dict(lvl_1a_mappings['metadata']),
+                "unit_changes": dict(lvl_1a_mappings['unit_changes']),
+            }
             lvl_1b_mappings['level_1_type_name'] = "electoral county uniform with administrative county"
             lvl_1b_mappings['level_1_type_code'] = "1b"
 
@@ -125,33 +132,7 @@ class StatNorMappings:
 
         lvl_2_endpoint = '131'
 
-        url = f'https://data.ssb.no/api/klass/v1/classifications/{lvl_1_endpoint}/correspondsAt?targetClassificationId={lvl_2_endpoint}&date={year}-04-01'
-
-        response = requests.get(url)
-        r = json.loads(response.content)
-        data = r['correspondenceItems']
-
-        grouped_dict = {}
-        #
-        for entry in data:
-
-            source_code = entry['sourceCode']
-            source_name = entry['sourceName']
-            target_code = entry['targetCode']
-            target_name = entry['targetName']
-
-            if source_code not in grouped_dict:
-                grouped_dict[source_code] = {
-                    'source_unit_code': source_code,
-                    'source_unit_name': source_name,
-                    'target_units': []
-                }
-
-            grouped_dict[source_code]['target_units'].append(
-                {
-                    'target_unit_code': target_code,
-                    'target_unit_name': target_name,
-                })
+        unit_mappings = cls.klass.correspondence_units(lvl_1_endpoint, lvl_2_endpoint, f"{year}-04-01")
 
         mappings = {
             "level_1_type_code": "",
@@ -161,35 +142,33 @@ class StatNorMappings:
                 "retrieved_on": date.today().isoformat(),
                 "year": year,
             },
-            "unit_mappings": list(grouped_dict.values()),
+            "unit_mappings": unit_mappings,
             "unit_changes": {"level_1_changes": [],
                              "level_2_changes": []}
         }
         return mappings
 
     @classmethod
-    def call_api_for_unit_changes(cls, endpoint, year):
-
-        url = f'https://data.ssb.no/api/klass/v1/classifications/{endpoint}/changes?from={year-1}-04-01&to={year}-04-01'
-
-        response = requests.get(url)
-        r = json.loads(response.content)
-        data = r['codeChanges']
-
-        changed_units = []
+    def prefetch(cls, start_year, end_year):
+        """
+        Load correspondence tables for a range of years with one ranged KLASS request per classification,
+        so that subsequent get_mappings calls for those years are served from cache.
 
-        for entry in data if len(data) > 0 else []:
+        Level 1a ('104') is read for every year. Electoral districts ('543') are read from 2021, and the 2020
+        transition (see level_1b_transition) reads '543' for 2021 and '104' for 2019, so the ranges are widened to
+        cover them.
+        """
+        transition = start_year <= 2020 <= end_year
+        cls.klass.prefetch_correspondences('104', '131', min(start_year, 2019) if transition else start_year, end_year)
+        if end_year >= 2020:
+            cls.klass.prefetch_correspondences('543', '131', max(start_year, 2021), max(end_year, 2021))
 
-            changes = {
-                "old_unit_code": entry['oldCode'],
-                "old_unit_name": entry['oldName'],
-                "new_unit_code": entry['newCode'],
-                "new_unit_name": entry['newName'],
-                "unit_change_occurred": entry['changeOccurred']
-            }
-            changed_units.append(changes)
+    @classmethod
+    def call_api_for_unit_changes(cls, endpoint, year):
 
-        return changed_units
+        if cls.BULK_CHANGES:
+            return cls.klass.changes_for_year(endpoint, year)
+        return cls.klass.changes(endpoint, f"{year-1}-04-01", f"{year}-04-01")
 
     @classmethod
     def to_gcp(cls, data):
@@ -210,20 +189,29 @@ class StatNorMappings:
 
         file_path = save_path / filename
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        serialization.write_json(data, file_path)
 
         print(f"Saved to: {file_path}")
         return file_path
 
+    @classmethod
+    def load_locally(cls, level_code, year):
+        """
+        Load a keymap previously saved with save_locally
+        :param level_code: '1a' or '1b'
+        :param year: validity year
+        :return: keymap dict
+        """
+        file_path = Path("/Users/holden-data/Desktop/democracy-atlas/data/raw/nor/mappings") / level_code / f"{year}.json"
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
 if __name__ == "__main__":
     import sys
+    from src.cli import main
 
-    if len(sys.argv) == 3 and sys.argv[1] == "mappings":
-        year = int(sys.argv[2])
-        StatNorMappings.get_mappings(year)
-    else:
-        print("Usage: python nor_div_mapping.py mappings <year>")
+    # kept for existing cron entries; `atlas mappings <year>` is the preferred entry point
+    sys.exit(main(sys.argv[1:]))
     #
     # # collect social data for year x, level z
     #
@@ -0,0 +1,203 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from src.nor.nor_parties import SSB_PARTY_CODES
+from src.nor.nor_pxweb import JsonStatCube
+
+# SSB statbank tables per election type. Each logical table is fetched with the Region selection for the requested
+# units and the fixed `selections` given here (plus the year); `levels` restricts a table to some unit levels.
+#   * counts  - ballots by validity (1N valid, 2N discarded, 3N blank) and time of vote (1N election day, 2N early)
+#   * votes   - valid votes by party/list
+#   * turnout - turnout in percent
+#   * seats   - seats by party/list
+# Local elections have no published ballot-count table: their valid votes are summed from the party/list votes and
+# discarded/blank counts are left empty.
+ELECTIONS = {
+    "parliamentary": {
+        "level_codes": {1: "1b", 2: "2"},
+        "filters": {1: "vs:ValgdistrikterMedBergen", 2: "vs:KommunValg"},
+        "prefix": {1: ("v", 2020)},  # electoral district codes were prefixed with "v" before 2020
+        "tables": {
+            "counts": {"table": "11691", "selections": {"StemmeGyldigNyn": ["1N", "2N", "3N"],
+                                                        "StemmeTidspktNyn": ["1N", "2N"]}},
+            "votes": {"table": "08092", "selections": {"ContentsCode": ["Godkjente1"]}},
+            "turnout": {"table": "08243", "selections": {}},
+            "seats": {"table": "08219", "selections": {"PolitParti": SSB_PARTY_CODES}, "levels": [1]},
+        },
+    },
+    "municipal": {
+        "level_codes": {2: "2"},
+        "filters": {2: "vs:Kommun"},
+        "prefix": {},
+        "tables": {
+            "votes": {"table": "01182", "selections": {}},
+            "turnout": {"table": "09475", "selections": {}},
+            "seats": {"table": "01181", "selections": {}},
+        },
+    },
+    "county": {
+        "level_codes": {1: "1a", 2: "2"},
+        "filters": {1: "vs:Fylker", 2: "vs:Kommun"},
+        "prefix": {},
+        "tables": {
+            "votes": {"table": "01187", "selections": {}},
+            "turnout": {"table": "09476", "selections": {}},
+            "seats": {"table": "01188", "selections": {}, "levels": [1]},
+        },
+    },
+}
+
+
+class NorResultsEngine:
+    """
+    Table-driven fetch and decode of SSB election results, shared by parliamentary and local elections.
+
+    For a year, level and list of units the engine issues one logical query per table of the election type (see
+    ELECTIONS), concurrently, through the PxWeb planner - which chunks them to SSB's cell limit - and decodes the
+    returned cubes into unit result dictionaries of the NorResultsParliament.get_result shape. Decoded cubes are
+    cached per (table, year, level, units) for `ttl` seconds, so per-unit accessors (votes, turnout, seats) reuse one
+    fetch while pollers still see updated counts.
+    """
+    def __init__(self, election_type, pxweb, workers=4, ttl=300):
+        if election_type not in ELECTIONS:
+            raise ValueError(f"Unknown election type {election_type}, expected one of {list(ELECTIONS)}")
+        self.election_type = election_type
+        self.spec = ELECTIONS[election_type]
+        self.pxweb = pxweb
+        self.workers = workers
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def level_code(self, level) -> str:
+        if level not in self.spec['level_codes']:
+            raise ValueError(f"Level {level} not available for {self.election_type} elections")
+        return self.spec['level_codes'][level]
+
+    def region(self, year, unit_code, level) -> str:
+        prefix, until = self.spec['prefix'].get(level, ("", 0))
+        return f"{prefix}{unit_code}" if year < until else unit_code
+
+    def tables(self, level) -> dict:
+        return {
+            name: table for name, table in self.spec['tables'].items()
+            if level in table.get('levels', self.spec['level_codes'])
+        }
+
+    def query(self, name, year, regions, level) -> dict:
+        table = self.spec['tables'][name]
+        return {
+            "query": [
+                {"code": "Region", "selection": {"filter": self.spec['filters'][level], "values": list(regions)}},
+                *[
+                    {"code": code, "selection": {"filter": "item", "values": values}}
+                    for code, values in table['selections'].items()
+                ],
+                {"code": "Tid", "selection": {"filter": "item", "values": [f"{year}"]}},
+            ],
+            "response": {"format": "json-stat2"},
+        }
+
+    def cube(self, name, year, regions, level) -> JsonStatCube:
+        key = (name, year, level, tuple(regions))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+        cube = JsonStatCube(self.pxweb.query(self.spec['tables'][name]['table'], self.query(name, year, regions, level)))
+        with self._lock:
+            self._cache[key] = (time.monotonic(), cube)
+        return cube
+
+    def fetch(self, year, unit_codes, level, names=None) -> dict:
+        """
+        Fetch the election type's tables for a set of units concurrently
+        :param names: subset of table names (defaults to every table for the level)
+        :return: dict of table name -> JsonStatCube
+        """
+        self.level_code(level)
+        regions = [self.region(year, unit_code, level) for unit_code in unit_codes]
+        names = [name for name in (names or self.tables(level)) if name in self.tables(level)]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(names))) as pool:
+            cubes = pool.map(lambda name: self.cube(name, year, regions, level), names)
+            return dict(zip(names, cubes))
+
+    @staticmethod
+    def parties(cube: JsonStatCube, region: str, column: str, keep) -> list:
+        return [
+            {"party_code": party_code, "party_name": cube.label("PolitParti", party_code), column: value}
+            for party_code in cube.categories("PolitParti")
+            if keep(value := cube.value(Region=region, PolitParti=party_code))
+        ]
+
+    def decode_unit(self, cubes, year, unit_code, level) -> dict:
+        region = self.region(year, unit_code, level)
+        votes = cubes['votes']
+        if region not in votes.index['Region']:
+            raise ValueError(f"Unit {unit_code} ({year}) missing from SSB table {self.spec['tables']['votes']['table']}")
+
+        vote_distribution = self.parties(votes, region, "votes", lambda v: v is not None)
+        counts = cubes.get('counts')
+        if counts is not None:
+            by_type = {
+                (valid, when): counts.value(Region=region, StemmeGyldigNyn=valid, StemmeTidspktNyn=when)
+                for valid in ("1N", "2N", "3N") for when in ("1N", "2N")
+            }
+            # a cell SSB leaves empty (null) makes the total unknown rather than failing the unit
+            totals = {
+                valid: None if None in (by_type[(valid, "1N")], by_type[(valid, "2N")])
+                else by_type[(valid, "1N")] + by_type[(valid, "2N")]
+                for valid in ("1N", "2N", "3N")
+            }
+        else:
+            by_type = {(valid, when): None for valid in ("1N", "2N", "3N") for when in ("1N", "2N")}
+            totals = {"1N": sum(p['votes'] for p in vote_distribution), "2N": None, "3N": None}
+
+        turnout = cubes['turnout'].value(Region=region) if 'turnout' in cubes else None
+        result = {
+            "year": year,
+            "election_type": self.election_type,
+            "unit_code": unit_code,
+            "unit_name": votes.label("Region", region),
+            "level_code": self.level_code(level),
+            "retrieved_on": date.today().isoformat(),
+            "last_updated": votes.dataset['updated'][:10],
+            "valid_votes_cast": totals["1N"],
+            "discarded_votes": totals["2N"],
+            "blank_votes": totals["3N"],
+            "turnout": turnout / 100 if turnout is not None else None,
+            "votes_by_type": {
+                "election_day_vote": {
+                    "valid": by_type[("1N", "1N")],
+                    "discarded": by_type[("2N", "1N")],
+                    "blank": by_type[("3N", "1N")]
+                },
+                "early_vote": {
+                    "valid": by_type[("1N", "2N")],
+                    "discarded": by_type[("2N", "2N")],
+                    "blank": by_type[("3N", "2N")]
+                }
+            },
+            "results": vote_distribution,
+        }
+        if 'seats' in cubes:
+            result['seat_distribution'] = self.parties(cubes['seats'], region, "seats", bool)
+        return result
+
+    def results(self, year, unit_codes, level) -> list:
+        """
+        Full results for many units of a level
+        :return: list of result dicts in the order of unit_codes
+        :raises FetchError: if a table can't be fetched
+        :raises ValueError: if a unit is missing from the returned tables
+        """
+        if not unit_codes:
+            return []
+        cubes = self.fetch(year, unit_codes, level)
+        return [self.decode_unit(cubes, year, unit_code, level) for unit_code in unit_codes]
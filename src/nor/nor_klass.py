@@ -0,0 +1,219 @@
+import threading
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import Future
+from datetime import date
+
+from src.utils.logging_manager import instrumentation
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict. Cached KLASS structures are shared between keymaps (1a/1b) and years instead of deep-copied,
+    so they must not be mutated in place. Serializes with json like a plain dict.
+    """
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("KLASS structures are shared and read-only; build a new dict instead")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __copy__(self):
+        return self
+
+
+def freeze(entries: list) -> tuple:
+    return tuple(FrozenDict(entry) for entry in entries)
+
+
+class KlassMappingService:
+    """
+    Deduplicating client for SSB's KLASS classification API.
+
+    Each distinct request - (source, target, date) for correspondences and (classification, from, to) for change
+    lists - is fetched at most once per service instance. Concurrent callers asking for the same key wait for the
+    single in-flight request instead of issuing their own. Results are returned as immutable structures (tuples
+    of FrozenDict) that callers share rather than copy.
+
+    Where KLASS offers a ranged endpoint, `prefetch_correspondences` loads the correspondence table for a whole
+    range of years in one request and slices it locally into per-date entries of the same cache.
+
+    Change lists can likewise be ingested in bulk: `change_history` pulls a classification's full change history in
+    one or a few ranged requests and keeps it sorted by change date, and `changes_for_year` splits it into the same
+    per-year buckets that `changes` returns for [{year-1}-04-01, {year}-04-01), using a bisect over the sorted dates.
+    """
+    HISTORY_START = "1944-04-01"  # start of the 1945 bucket
+    def __init__(self, fetcher, base_url="https://data.ssb.no/api/klass/v1/classifications"):
+        self.fetcher = fetcher
+        self.base_url = base_url
+        self.requests_made = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key, fetch):
+        with self._lock:
+            future = self._cache.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._cache[key] = future
+
+        if owner:
+            instrumentation.cache_miss("klass")
+        else:
+            instrumentation.cache_hit("klass")
+
+        if owner:
+            try:
+                future.set_result(fetch())
+            except Exception as e:
+                with self._lock:
+                    del self._cache[key]  # don't cache failures; let a later call retry
+                future.set_exception(e)
+
+        return future.result()
+
+    def _get(self, url):
+        with self._lock:
+            self.requests_made += 1
+        return self.fetcher.get_json(url)
+
+    def correspondence_units(self, source, target, at_date) -> tuple:
+        """
+        Source units valid at a date with their constituent target units, grouped as in StatNorMappings keymaps
+        :param source: source classification id (e.g. '104' counties, '543' electoral districts)
+        :param target: target classification id (e.g. '131' municipalities)
+        :param at_date: ISO date string
+        :return: tuple of FrozenDict unit mappings
+        """
+        def fetch():
+            url = f"{self.base_url}/{source}/correspondsAt?targetClassificationId={target}&date={at_date}"
+            return self.group_correspondence(self._get(url)['correspondenceItems'])
+
+        return self._cached(("correspondsAt", source, target, at_date), fetch)
+
+    def changes(self, classification, from_date, to_date) -> tuple:
+        """
+        Code changes in a classification between two dates
+        :return: tuple of FrozenDict changes with old/new unit code and name and change date
+        """
+        def fetch():
+            url = f"{self.base_url}/{classification}/changes?from={from_date}&to={to_date}"
+            return freeze(self.format_change(entry) for entry in self._get(url)['codeChanges'])
+
+        return self._cached(("changes", classification, from_date, to_date), fetch)
+
+    def prefetch_correspondences(self, source, target, start_year, end_year, month_day="04-01"):
+        """
+        Fetch the correspondence table for a range of years in one ranged request and populate the per-date cache
+        for each year's reference date
+        """
+        from_date = f"{start_year}-{month_day}"
+        to_date = f"{end_year}-{month_day}"
+        url = f"{self.base_url}/{source}/corresponds?targetClassificationId={target}&from={from_date}&to={to_date}"
+        items = self._get(url)['correspondenceItems']
+
+        for year in range(start_year, end_year + 1):
+            at_date = f"{year}-{month_day}"
+            valid = [
+                item for item in items
+                if (item.get('validFrom') or "0000-00-00") <= at_date < (item.get('validTo') or "9999-12-31")
+            ]
+            key = ("correspondsAt", source, target, at_date)
+            with self._lock:
+                if key not in self._cache:
+                    future = Future()
+                    future.set_result(self.group_correspondence(valid))
+                    self._cache[key] = future
+
+    def change_history(self, classification, start_date=HISTORY_START, end_date=None, span_years=25):
+        """
+        Full change history of a classification, fetched in ranged requests of up to `span_years` years each
+        :return: (sorted tuple of change dates, tuple of FrozenDict changes in the same order)
+        """
+        end_date = end_date or date.today().isoformat()
+
+        def fetch():
+            changes = []
+            seen = set()
+            chunk_start = start_date
+            while chunk_start < end_date:
+                chunk_end = min(f"{int(chunk_start[:4]) + span_years}{chunk_start[4:]}", end_date)
+                url = f"{self.base_url}/{classification}/changes?from={chunk_start}&to={chunk_end}"
+                for entry in self._get(url)['codeChanges']:
+                    change = self.format_change(entry)
+                    key = tuple(change.values())
+                    if key not in seen:  # chunk boundaries may repeat a change
+                        seen.add(key)
+                        changes.append(change)
+                chunk_start = chunk_end
+
+            # stable sort keeps the API's order for changes occurring on the same date
+            changes.sort(key=lambda change: change['unit_change_occurred'])
+            return tuple(c['unit_change_occurred'] for c in changes), freeze(changes)
+
+        return self._cached(("history", classification, start_date, end_date, span_years), fetch)
+
+    def changes_between(self, classification, from_date, to_date) -> tuple:
+        """
+        Changes occurring in [from_date, to_date), sliced from the bulk change history
+        """
+        dates, changes = self.change_history(classification)
+        return changes[bisect_left(dates, from_date):bisect_left(dates, to_date)]
+
+    def changes_for_year(self, classification, year) -> tuple:
+        """
+        Bulk-mode equivalent of changes(classification, '{year-1}-04-01', '{year}-04-01')
+        """
+        return self.changes_between(classification, f"{year - 1}-04-01", f"{year}-04-01")
+
+    def verify_bulk_changes(self, classification, years) -> list:
+        """
+        Compare bulk-split change lists against per-year requests. The lists are compared as multisets: the bulk
+        history is sorted by change date, while per-year responses keep the API's order.
+        :return: list of years where the two differ (empty if identical)
+        """
+        def counted(changes):
+            return Counter(tuple(change.items()) for change in changes)
+
+        return [
+            year for year in years
+            if counted(self.changes_for_year(classification, year)) != counted(self.changes(
+                classification, f"{year - 1}-04-01", f"{year}-04-01"
+            ))
+        ]
+
+    @staticmethod
+    def group_correspondence(items) -> tuple:
+        grouped_dict = {}
+        for entry in items:
+            source_code = entry['sourceCode']
+            if source_code not in grouped_dict:
+                grouped_dict[source_code] = {
+                    'source_unit_code': source_code,
+                    'source_unit_name': entry['sourceName'],
+                    'target_units': []
+                }
+            grouped_dict[source_code]['target_units'].append(FrozenDict({
+                'target_unit_code': entry['targetCode'],
+                'target_unit_name': entry['targetName'],
+            }))
+
+        return tuple(
+            FrozenDict({**unit, 'target_units': tuple(unit['target_units'])}) for unit in grouped_dict.values()
+        )
+
+    @staticmethod
+    def format_change(entry) -> dict:
+        return {
+            "old_unit_code": entry['oldCode'],
+            "old_unit_name": entry['oldName'],
+            "new_unit_code": entry['newCode'],
+            "new_unit_name": entry['newName'],
+            "unit_change_occurred": entry['changeOccurred']
+        }
@@ -0,0 +1,139 @@
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from src.utils.geometry_store import GeometryStore
+from src.utils.local_store import LocalStore
+from src.utils.logging_manager import instrumentation
+from src.utils.manifest import hash_inputs
+
+
+class NorLayouts:
+    """
+    Population-weighted Dorling cartograms and equal-area hex layouts of Norway per year and level.
+
+    Inputs (per year and level):
+        * boundaries, adjacency graph and label points from the GeometryStore (level 1 = counties, 2 = municipalities)
+        * estimated electorate per unit from the columnar results (NorResultsTable, levels 1a and 2)
+
+    Layouts are computed in a projected CRS (UTM 33N, EPSG:25833 - metres) and stored as:
+        layouts/country=nor/year={year}/level={level}/{dorling|hexgrid}.parquet   unit_code, x, y (+ radius | q, r)
+        layouts/country=nor/year={year}/level={level}/{dorling|hexgrid}.geojson   WGS84 view, pre-compressed
+        layouts/country=nor/year={year}/level={level}/state.json                  input fingerprint
+
+    A layout is only recomputed when the fingerprint of its inputs - the stored boundary file, the electorate
+    counts and the layout parameters - changes. Years are independent, so `build_years` spreads them over a
+    process pool (the force iterations are CPU bound).
+    """
+    CRS = "EPSG:25833"
+    LEVEL_CODES = {1: "1a", 2: "2"}
+    LAYOUTS = ("dorling", "hexgrid")
+    FILL = 0.5  # share of the land area covered by Dorling circles
+    VERSION = 1  # bump when the algorithms change to invalidate stored layouts
+
+    def __init__(self, store=None):
+        self.store = store or LocalStore()
+        self.geometry = GeometryStore(self.store)
+
+    @staticmethod
+    def key(year, level, name):
+        return f"layouts/country=nor/year={year}/level={level}/{name}"
+
+    def inputs(self, year, level):
+        """
+        :return: GeoDataFrame (projected) with unit_code, electorate, label_x, label_y, in adjacency graph order
+        """
+        import geopandas as gpd
+        from src.nor.nor_results_table import NorResultsTable
+
+        boundaries = self.geometry.read("nor", year, level)
+        labels = self.geometry.labels("nor", year, level)
+        points = gpd.GeoSeries(gpd.points_from_xy(labels["label_x"], labels["label_y"]), crs=boundaries.crs)
+        points = points.to_crs(self.CRS)
+        labels = labels.assign(label_x=points.x.to_numpy(), label_y=points.y.to_numpy())
+        boundaries = boundaries.to_crs(self.CRS)
+        units = NorResultsTable.from_store(self.store, year, self.LEVEL_CODES[level]).units
+        electorate = units.set_index("unit_code")["electorate"]
+
+        gdf = boundaries[["unit_code", "geometry"]].merge(labels[["unit_code", "label_x", "label_y"]], on="unit_code")
+        gdf["electorate"] = gdf["unit_code"].map(electorate)
+        missing = gdf["electorate"].isna()
+        if missing.any():
+            print(f"{missing.sum()} level {level} units without electorate in {year}, using the median")
+            gdf.loc[missing, "electorate"] = gdf["electorate"].median()
+        order = self.geometry.adjacency("nor", year, level).rows
+        return gdf.sort_values("unit_code", key=lambda codes: codes.map(order)).reset_index(drop=True)
+
+    def fingerprint(self, year, level, gdf) -> str:
+        boundaries = self.store.path(self.geometry.key("nor", year, level))
+        digest = hashlib.sha256(boundaries.read_bytes()).hexdigest()
+        return hash_inputs(
+            self.VERSION, self.FILL, digest, gdf[["unit_code", "electorate"]].values.tolist()
+        )
+
+    @instrumentation.timed("layouts")
+    def build(self, year, level, force=False) -> dict:
+        """
+        Compute (or reuse) the Dorling and hex layouts of one year and level
+        :param force: recompute even if the inputs are unchanged
+        :return: dict of layout name -> DataFrame
+        """
+        import geopandas as gpd
+        import numpy as np
+        import pandas as pd
+        import shapely
+        from src.utils.cartogram import dorling, hexgrid, hex_corners
+
+        gdf = self.inputs(year, level)
+        fingerprint = self.fingerprint(year, level, gdf)
+        state_key = self.key(year, level, "state.json")
+        unchanged = self.store.exists(state_key) and self.store.read_json(state_key)['fingerprint'] == fingerprint
+        if unchanged and not force:
+            print(f"Layouts for level {level} {year} unchanged")
+            return {name: self.store.read_parquet(self.key(year, level, f"{name}.parquet")) for name in self.LAYOUTS}
+
+        graph = self.geometry.adjacency("nor", year, level)
+        if len(graph) != len(gdf):
+            raise ValueError(f"Adjacency graph for level {level} {year} doesn't match the stored boundaries")
+
+        x, y = gdf["label_x"].to_numpy(), gdf["label_y"].to_numpy()
+        area = gdf.geometry.area.sum()
+        electorate = gdf["electorate"].to_numpy(dtype=float)
+
+        radii = np.sqrt(electorate / electorate.sum() * area * self.FILL / np.pi)
+        dx, dy = dorling(x, y, radii, graph.indptr, graph.indices)
+        layouts = {"dorling": pd.DataFrame({"unit_code": gdf["unit_code"], "x": dx, "y": dy, "radius": radii})}
+
+        size = np.sqrt(area / len(gdf) / (1.5 * np.sqrt(3)))  # hexagon with the mean unit area
+        q, r, hx, hy = hexgrid(x, y, size, graph.indptr, graph.indices)
+        layouts["hexgrid"] = pd.DataFrame({"unit_code": gdf["unit_code"], "q": q, "r": r, "x": hx, "y": hy})
+
+        views = {
+            "dorling": shapely.buffer(shapely.points(dx, dy), radii, quad_segs=16),
+            "hexgrid": shapely.polygons(hex_corners(hx, hy, size)),
+        }
+        for name, frame in layouts.items():
+            self.store.write_parquet(frame, self.key(year, level, f"{name}.parquet"))
+            view = gpd.GeoDataFrame(
+                frame[["unit_code"]].assign(electorate=electorate), geometry=views[name], crs=self.CRS
+            ).to_crs("EPSG:4326")
+            self.store.write_geojson(view, self.key(year, level, f"{name}.geojson"), precision=5, compressed=True)
+        self.store.write_json({"fingerprint": fingerprint}, state_key)
+        print(f"Built layouts for level {level} {year} ({len(gdf)} units)")
+        return layouts
+
+    def build_year(self, year, levels=(1, 2), force=False) -> int:
+        for level in levels:
+            self.build(year, level, force=force)
+        return year
+
+    def build_years(self, years, levels=(1, 2), workers=4, force=False) -> list:
+        """
+        Build layouts for many years in a process pool
+        :return: years built
+        """
+        years = list(years)
+        if workers <= 1 or len(years) == 1:
+            return [self.build_year(year, levels, force) for year in years]
+        with ProcessPoolExecutor(max_workers=min(workers, len(years))) as pool:
+            futures = [pool.submit(self.build_year, year, levels, force) for year in years]
+            return [future.result() for future in futures]
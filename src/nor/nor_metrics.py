@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+from src.nor.nor_results_table import NorResultsTable
+from src.nor.nor_parties import NorPartyLookup, OTHER_PARTY_ID
+
+
+class NorElectionMetrics:
+    """
+    Electoral analytics computed for every unit and election year in one vectorized pass.
+
+    Votes (and seats, where available) from a NorResultsTable spanning many years are scattered into dense
+    (unit x party x year) arrays. All metrics are then array expressions over those cubes:
+        * Party vote share and swing (percentage points vs the unit's previous election in the table)
+        * Effective number of parties (Laakso-Taagepera, by votes and by seats)
+        * Pedersen volatility (half the sum of absolute share changes vs the previous election)
+        * Gallagher least squares disproportionality (units with seat distributions only)
+        * Bloc totals (shares summed over bloc member parties)
+        * Unmapped share (vote share of lists without a canonical party in NorPartyLookup - joint lists and parties
+          outside PARTIES), i.e. how much of a unit's vote the party and bloc comparisons leave out
+
+    Outputs are cached in the columnar store, with choropleth class indices and breaks (see NorClassBreaks):
+        metrics/country=nor/level={level_code}/unit_metrics.parquet
+        metrics/country=nor/level={level_code}/party_swing.parquet
+        metrics/country=nor/level={level_code}/class_breaks.parquet
+    """
+    # Bloc membership by SSB party code, from the canonical party dimension
+    BLOCS = NorPartyLookup.blocs()
+
+    def __init__(self, table: NorResultsTable):
+        self.table = table
+        votes = table.votes
+
+        self.years, year_idx = self._factorize(votes["year"])
+        self.units, unit_idx = self._factorize(votes["unit_code"])
+        self.parties, party_idx = self._factorize(votes["party_code"])
+        self.index = (unit_idx, party_idx, year_idx)
+
+        self.votes = self._dense(votes["votes"].to_numpy(dtype=float), self.index)
+
+        if len(table.seats):
+            seats = table.seats
+            seat_index = (
+                self.units.get_indexer(seats["unit_code"]),
+                self.parties.get_indexer(seats["party_code"]),
+                self.years.get_indexer(seats["year"]),
+            )
+            valid = (seat_index[0] >= 0) & (seat_index[1] >= 0) & (seat_index[2] >= 0)
+            self.seats = self._dense(
+                seats["seats"].to_numpy(dtype=float)[valid], tuple(i[valid] for i in seat_index)
+            )
+        else:
+            self.seats = None
+
+    def _factorize(self, column: pd.Series):
+        codes, uniques = pd.factorize(column, sort=True)
+        return pd.Index(uniques), codes
+
+    def _dense(self, values, index):
+        cube = np.zeros((len(self.units), len(self.parties), len(self.years)))
+        np.add.at(cube, index, values)
+        return cube
+
+    @staticmethod
+    def _shares(cube):
+        totals = cube.sum(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(totals > 0, cube / totals, np.nan)
+
+    def vote_shares(self):
+        """(unit x party x year) vote shares in percent, NaN where the unit has no votes that year"""
+        return self._shares(self.votes) * 100
+
+    def swing(self):
+        """(unit x party x year) change in vote share vs the previous year in the table, in percentage points"""
+        shares = self.vote_shares()
+        swing = np.full_like(shares, np.nan)
+        swing[:, :, 1:] = shares[:, :, 1:] - shares[:, :, :-1]
+        return swing
+
+    def effective_number_of_parties(self, cube=None):
+        """(unit x year) Laakso-Taagepera effective number of parties"""
+        shares = self._shares(self.votes if cube is None else cube)
+        with np.errstate(divide="ignore"):
+            return 1 / np.sum(shares ** 2, axis=1)
+
+    def pedersen_volatility(self):
+        """(unit x year) Pedersen index vs the previous year in the table"""
+        return 0.5 * np.sum(np.abs(self.swing()), axis=1)
+
+    def gallagher_index(self):
+        """(unit x year) Gallagher least squares index, NaN where no seats are available"""
+        if self.seats is None:
+            return np.full((len(self.units), len(self.years)), np.nan)
+        diff = self.vote_shares() - self._shares(self.seats) * 100
+        return np.sqrt(0.5 * np.sum(diff ** 2, axis=1))
+
+    def bloc_shares(self, blocs: dict = None):
+        """
+        (unit x bloc x year) summed vote shares of each bloc's member parties
+        :param blocs: dict of bloc name -> list of party codes, defaults to BLOCS
+        :return: tuple of (bloc names, array)
+        """
+        blocs = blocs or self.BLOCS
+        membership = np.zeros((len(self.parties), len(blocs)))
+        for b, codes in enumerate(blocs.values()):
+            idx = self.parties.get_indexer(codes)
+            membership[idx[idx >= 0], b] = 1
+        shares = np.nan_to_num(self.vote_shares())
+        bloc = np.einsum("upy,pb->uby", shares, membership)
+        present = self.votes.sum(axis=1) > 0
+        return list(blocs), np.where(present[:, None, :], bloc, np.nan)
+
+    def unmapped_share(self):
+        """(unit x year) vote share in percent of the party codes that resolve to OTHER_PARTY_ID"""
+        lookup = NorPartyLookup()
+        unmapped = np.array([
+            [lookup.resolve(int(year), code) == OTHER_PARTY_ID for year in self.years]
+            for code in self.parties
+        ], dtype=float).reshape(len(self.parties), len(self.years))
+        shares = np.nan_to_num(self.vote_shares())
+        present = self.votes.sum(axis=1) > 0
+        return np.where(present, np.einsum("upy,py->uy", shares, unmapped), np.nan)
+
+    def unit_metrics(self) -> pd.DataFrame:
+        """
+        One row per unit and year with totals, effective number of parties, volatility, disproportionality, blocs,
+        unmapped share and turnout
+        """
+        totals = self.votes.sum(axis=1)
+        bloc_names, blocs = self.bloc_shares()
+        columns = {
+            "total_votes": totals,
+            "enp_votes": self.effective_number_of_parties(),
+            "enp_seats": self.effective_number_of_parties(self.seats) if self.seats is not None
+            else np.full_like(totals, np.nan),
+            "pedersen_volatility": self.pedersen_volatility(),
+            "gallagher_index": self.gallagher_index(),
+        }
+        for b, name in enumerate(bloc_names):
+            columns[f"bloc_{name}"] = blocs[:, b, :]
+        columns["unmapped_share"] = self.unmapped_share()
+
+        unit_idx, year_idx = np.nonzero(totals > 0)
+        frame = pd.DataFrame({
+            "year": self.years[year_idx],
+            "unit_code": self.units[unit_idx],
+        })
+        for name, values in columns.items():
+            frame[name] = values[unit_idx, year_idx]
+        turnout = self.table.units.drop_duplicates(["year", "unit_code"]).set_index(["year", "unit_code"])["turnout"]
+        frame["turnout"] = turnout.reindex(pd.MultiIndex.from_frame(frame[["year", "unit_code"]])).to_numpy()
+        return frame
+
+    def party_swing(self) -> pd.DataFrame:
+        """
+        One row per unit, party and year present in the results with vote share and swing
+        """
+        unit_idx, party_idx, year_idx = self.index
+        return pd.DataFrame({
+            "year": self.years[year_idx],
+            "unit_code": self.units[unit_idx],
+            "party_code": self.parties[party_idx],
+            "share": self.vote_shares()[self.index],
+            "swing": self.swing()[self.index],
+        })
+
+    @classmethod
+    def key(cls, level_code, name):
+        return f"metrics/country=nor/level={level_code}/{name}.parquet"
+
+    @classmethod
+    def compute_and_store(cls, store, table: NorResultsTable, level_code, classify=True):
+        """
+        Compute all metrics for a multi-year table at one level and cache them in the store
+        :param classify: add choropleth class columns and store the class breaks (NorClassBreaks)
+        :return: (unit_metrics, party_swing) DataFrames
+        """
+        from src.nor.nor_classes import NorClassBreaks
+
+        metrics = cls(table)
+        unit_metrics = metrics.unit_metrics()
+        party_swing = metrics.party_swing()
+        if classify:
+            unit_metrics, party_swing, breaks = NorClassBreaks.classify(unit_metrics, party_swing)
+            NorClassBreaks.to_store(store, breaks, level_code)
+        unit_metrics["level_code"] = level_code
+        party_swing["level_code"] = level_code
+        store.write_parquet(unit_metrics, cls.key(level_code, "unit_metrics"))
+        store.write_parquet(party_swing, cls.key(level_code, "party_swing"))
+        return unit_metrics, party_swing
+
+    @classmethod
+    def load(cls, store, level_code):
+        return (
+            store.read_parquet(cls.key(level_code, "unit_metrics")),
+            store.read_parquet(cls.key(level_code, "party_swing")),
+        )
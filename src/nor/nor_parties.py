@@ -0,0 +1,167 @@
+from bisect import bisect_right
+
+# Party codes ("PolitParti") selectable in SSB's parliamentary election tables (08092, 08219)
+SSB_PARTY_CODES = [
+    "01", "02", "03", "04", "08", "55", "05", "06", "07", "100", "130", "150", "75", "29", "71", "54", "122", "12",
+    "74", "46", "76", "56", "13", "16", "131", "25", "151", "125", "126", "24", "17", "15", "154", "132", "18", "26",
+    "152", "19", "48", "77", "44", "133", "20", "134", "135", "78", "09", "136", "57", "49", "58", "73", "123", "153",
+    "155", "10", "124", "156", "28", "11", "33", "21", "22", "60", "59", "72", "47", "70", "79", "14", "127", "83",
+    "27", "137", "61", "90", "90a", "90b", "90c", "90d", "90e", "90f", "90g", "90h", "91", "92"
+]
+
+# Canonical party dimension. party_id values are stable and used as compact keys by analytics and the frontend.
+PARTIES = [
+    {"party_id": 0, "abbreviation": "ANDRE", "name": "Andre", "bloc": None, "colour": "#9E9E9E"},
+    {"party_id": 1, "abbreviation": "A", "name": "Arbeiderpartiet", "bloc": "red_green", "colour": "#E4202C"},
+    {"party_id": 2, "abbreviation": "FRP", "name": "Fremskrittspartiet", "bloc": "non_socialist", "colour": "#024C93"},
+    {"party_id": 3, "abbreviation": "H", "name": "Høyre", "bloc": "non_socialist", "colour": "#0065F1"},
+    {"party_id": 4, "abbreviation": "KRF", "name": "Kristelig Folkeparti", "bloc": "non_socialist", "colour": "#F9B900"},
+    {"party_id": 5, "abbreviation": "SP", "name": "Senterpartiet", "bloc": "red_green", "colour": "#00843D"},
+    {"party_id": 6, "abbreviation": "SV", "name": "Sosialistisk Venstreparti", "bloc": "red_green", "colour": "#BC2149"},
+    {"party_id": 7, "abbreviation": "V", "name": "Venstre", "bloc": "non_socialist", "colour": "#00807B"},
+    {"party_id": 8, "abbreviation": "MDG", "name": "Miljøpartiet De Grønne", "bloc": "red_green", "colour": "#6A9325"},
+    {"party_id": 9, "abbreviation": "R", "name": "Rødt", "bloc": "red_green", "colour": "#8B0000"},
+]
+
+OTHER_PARTY_ID = 0
+
+# Raw SSB party codes -> canonical party, with the range of election years (inclusive) the code carries that meaning.
+# valid_from is the first election the party ran under the code. Every code listed here still means the same party,
+# so valid_to is open (9999); a code that is reassigned gets a closing valid_to and a second entry.
+PARTY_CODES = [
+    {"code": "01", "valid_from": 1945, "valid_to": 9999, "party_id": 1},
+    {"code": "02", "valid_from": 1973, "valid_to": 9999, "party_id": 2},
+    {"code": "03", "valid_from": 1945, "valid_to": 9999, "party_id": 3},
+    {"code": "04", "valid_from": 1945, "valid_to": 9999, "party_id": 4},
+    {"code": "05", "valid_from": 1945, "valid_to": 9999, "party_id": 5},
+    {"code": "06", "valid_from": 1961, "valid_to": 9999, "party_id": 6},
+    {"code": "07", "valid_from": 1945, "valid_to": 9999, "party_id": 7},
+    {"code": "08", "valid_from": 1989, "valid_to": 9999, "party_id": 8},
+    {"code": "55", "valid_from": 1973, "valid_to": 9999, "party_id": 9},
+]
+
+# Joint lists ("fellesliste") credited to their lead party for cross-year analysis, by raw code and year range, with
+# the member parties so that joint-list votes can be split or flagged by consumers. SSB reuses the generic codes
+# 90a-90h for different joint lists in every election (and per constituency), so they can't be given open-ended
+# meanings; none are curated yet and joint-list votes resolve to OTHER_PARTY_ID. Entries look like
+#     {"code": "90a", "valid_from": 1985, "valid_to": 1985, "party_id": 4, "members": [4, 5, 7]}
+JOINT_LISTS = []
+
+
+class NorPartyLookup:
+    """
+    Compiled lookup from raw SSB party codes to canonical party IDs.
+
+    SSB party codes can change meaning across decades, and joint lists appear under generic codes ("90a", "90b", ...)
+    with changing membership. The lookup compiles the code tables (PARTY_CODES and JOINT_LISTS unless others are
+    passed) into per-code sorted validity intervals, so that a raw (year, code) pair resolves with a dict lookup and
+    a bisect. Frames are encoded by resolving each distinct (year, code) pair once and broadcasting the result as a
+    compact integer column.
+
+    Scope: only the parties in PARTIES under the codes in PARTY_CODES are mapped. Joint lists and every other party
+    (including historic ones) are not curated, so cross-year comparisons of a party or bloc leave their votes out -
+    they resolve to OTHER_PARTY_ID. `unmapped` lists them and NorElectionMetrics reports their share per unit
+    (unmapped_share).
+    """
+    def __init__(self, party_codes: list = None, joint_lists: list = None):
+        entries = (PARTY_CODES if party_codes is None else party_codes) \
+            + (JOINT_LISTS if joint_lists is None else joint_lists)
+
+        intervals = {}
+        for entry in sorted(entries, key=lambda e: (e['code'], e['valid_from'])):
+            intervals.setdefault(entry['code'], []).append(entry)
+
+        self._starts = {}
+        self._entries = {}
+        for code, code_entries in intervals.items():
+            for previous, current in zip(code_entries, code_entries[1:]):
+                if current['valid_from'] <= previous['valid_to']:
+                    raise ValueError(f"Overlapping validity periods for party code {code}")
+            self._starts[code] = [e['valid_from'] for e in code_entries]
+            self._entries[code] = code_entries
+
+        self._cache = {}
+
+    def resolve(self, year, code) -> int:
+        """
+        Canonical party ID for a raw party code in a given election year
+        """
+        key = (year, code)
+        if key in self._cache:
+            return self._cache[key]
+
+        party_id = OTHER_PARTY_ID
+        starts = self._starts.get(code)
+        if starts:
+            i = bisect_right(starts, year) - 1
+            if i >= 0 and year <= self._entries[code][i]['valid_to']:
+                party_id = self._entries[code][i]['party_id']
+
+        self._cache[key] = party_id
+        return party_id
+
+    def members(self, year, code) -> list:
+        """
+        Canonical member party IDs of a raw code (a single ID unless the code is a joint list)
+        """
+        starts = self._starts.get(code)
+        if starts:
+            i = bisect_right(starts, year) - 1
+            if i >= 0 and year <= self._entries[code][i]['valid_to']:
+                entry = self._entries[code][i]
+                return list(entry.get('members', [entry['party_id']]))
+        return [OTHER_PARTY_ID]
+
+    def encode(self, frame: "pd.DataFrame", year_column="year", code_column="party_code") -> "pd.DataFrame":
+        """
+        Add an integer 'party_id' column to a frame with raw year and party code columns
+        :return: copy of the frame with a party_id column (int16)
+        """
+        # numpy/pandas are imported here rather than at module level: nor_results only needs SSB_PARTY_CODES
+        import numpy as np
+        import pandas as pd
+
+        pairs = pd.MultiIndex.from_frame(frame[[year_column, code_column]])
+        codes, uniques = pd.factorize(pairs)
+        resolved = np.fromiter(
+            (self.resolve(int(year), code) for year, code in uniques), dtype=np.int16, count=len(uniques)
+        )
+        encoded = frame.copy()
+        encoded["party_id"] = resolved[codes] if len(codes) else np.array([], dtype=np.int16)
+        return encoded
+
+    def unmapped(self, frame: "pd.DataFrame", year_column="year", code_column="party_code") -> "pd.DataFrame":
+        """
+        Distinct (year, code, name) combinations that resolve to OTHER_PARTY_ID - candidates for PARTY_CODES entries
+        """
+        encoded = self.encode(frame, year_column, code_column)
+        columns = [year_column, code_column] + (["party_name"] if "party_name" in frame else [])
+        return encoded.loc[encoded["party_id"] == OTHER_PARTY_ID, columns].drop_duplicates().reset_index(drop=True)
+
+    @staticmethod
+    def party_frame() -> "pd.DataFrame":
+        """
+        Canonical party dimension as a frame, indexed by party_id
+        """
+        import pandas as pd
+        return pd.DataFrame(PARTIES).set_index("party_id")
+
+    @staticmethod
+    def colour_scheme() -> dict:
+        """
+        party_id -> colour mapping for the frontend
+        """
+        return {p['party_id']: p['colour'] for p in PARTIES}
+
+    @staticmethod
+    def blocs() -> dict:
+        """
+        bloc name -> list of raw SSB party codes in that bloc
+        """
+        bloc_by_id = {p['party_id']: p['bloc'] for p in PARTIES if p['bloc']}
+        blocs = {}
+        for entry in PARTY_CODES:
+            bloc = bloc_by_id.get(entry['party_id'])
+            if bloc:
+                blocs.setdefault(bloc, []).append(entry['code'])
+        return blocs
@@ -0,0 +1,385 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from src.nor.nor_results_table import NorResultsTable
+from src.utils.fetch import FetchError, ResilientFetcher
+from src.utils.local_store import LocalStore
+from src.utils.logging_manager import instrumentation
+
+
+class NorPrecincts:
+    """
+    Level 3 (precinct - "valgkrets"/"stemmekrets") results and geometry for Norway.
+
+    Precincts multiply the unit count by an order of magnitude over municipalities, so ingestion never holds more
+    than one municipality (results) or one batch of features (geometry) in memory:
+
+    Results:
+        * SSB doesn't publish precinct results; they come from Valgdirektoratet's valgresultat.no API, one document
+          per municipality (listing its precincts) and one per precinct
+        * Municipalities are processed one at a time, their precincts fetched concurrently and parsed straight into
+          column rows, and written as one partition per municipality:
+              results/country=nor/year={year}/level=3/election={type}/municipality={code}/{units|votes}.parquet
+        * Incremental refresh: the municipality document's report timestamp (or content hash) is kept per
+          municipality in a state file; unchanged municipalities are skipped without fetching their precincts
+
+    Geometry:
+        * Kartverket's national precinct file only describes the current precincts, so it is used for the current
+          year alone; other years need the zip of an archived file of that year (`zip_url`). It is downloaded to
+          disk (not memory) and read as a stream of Arrow record batches through pyogrio; each batch is split by
+          municipality and appended as a part file:
+              geometry/country=nor/year={year}/level=3/municipality={code}/part-{batch}.parquet (GeoParquet)
+        * The download's hash is recorded, so an unchanged file isn't re-processed
+
+    Both steps also produce a level 2 -> level 3 keymap in the StatNorMappings format, kept apart because the two
+    sources needn't list the same precincts: mappings/3/{year}.json from the results and
+    mappings/3/geometry/{year}.json from the geometry. Precinct numbers are normalized by `precinct_code`, so the unit
+    codes of both line up.
+    Peak memory is bounded by the largest municipality (results) or `batch_size` features (geometry) rather than
+    the national total, which keeps a level 3 run within the footprint of a level 2 run.
+    """
+    VALGRESULTAT_API = "https://valgresultat.no/api"
+    # current precincts only - not valid for earlier elections, whose precincts were merged or redrawn since
+    GEOJSON_URL = "https://nedlasting.geonorge.no/geonorge/Basisdata/Stemmekretser/GEOJSON/" \
+                  "Basisdata_0000_Norge_4258_Stemmekretser_GEOJSON.zip"
+    ELECTION_CODES = {"parliamentary": "st", "municipal": "ko", "county": "fy"}
+    LEVEL_CODE = "3"
+    UNIT_COLUMNS = NorResultsTable.UNIT_COLUMNS + ["municipality_code"]
+    KEYMAP_SOURCES = {"results": "Valgdirektoratet", "geometry": "Kartverket"}
+    PRECINCT_DIGITS = 4
+
+    def __init__(self, year, election_type="parliamentary", store=None, fetcher=None, workers=8):
+        if election_type not in self.ELECTION_CODES:
+            raise ValueError(f"Election type must be one of {list(self.ELECTION_CODES)}")
+        self.year = year
+        self.election_type = election_type
+        self.store = store or LocalStore()
+        self.fetcher = fetcher or ResilientFetcher()
+        self.workers = workers
+
+    # Keys
+
+    def results_key(self, municipality_code, name):
+        return f"results/country=nor/year={self.year}/level={self.LEVEL_CODE}/election={self.election_type}/" \
+               f"municipality={municipality_code}/{name}.parquet"
+
+    def geometry_prefix(self, municipality_code=None):
+        prefix = f"geometry/country=nor/year={self.year}/level={self.LEVEL_CODE}/"
+        return prefix + (f"municipality={municipality_code}/" if municipality_code else "")
+
+    def state_key(self, name):
+        return f"state/country=nor/year={self.year}/level={self.LEVEL_CODE}/{name}.json"
+
+    def load_state(self, name) -> dict:
+        key = self.state_key(name)
+        return self.store.read_json(key) if self.store.exists(key) else {}
+
+    def save_state(self, name, state):
+        self.store.write_json(state, self.state_key(name))
+
+    @classmethod
+    def precinct_code(cls, municipality_code, precinct_number) -> str:
+        """
+        Unit code of a precinct. Valgresultat ("nr") and Kartverket ("valgkretsnummer"/"stemmekretsnummer") don't
+        agree on the type and padding of the number (1, "1", "0001"), so numeric parts are zero-padded
+        """
+        def normalize(value, digits):
+            value = str(value).strip().removesuffix(".0")  # integer columns read back as float
+            return value.zfill(digits) if value.isdigit() else value
+
+        return f"{normalize(municipality_code, 4)}-{normalize(precinct_number, cls.PRECINCT_DIGITS)}"
+
+    # Results
+
+    def url(self, municipality_code, precinct_number=None) -> str:
+        election = self.ELECTION_CODES[self.election_type]
+        url = f"{self.VALGRESULTAT_API}/{self.year}/{election}/{municipality_code[:2]}/{municipality_code}"
+        return f"{url}/{precinct_number}" if precinct_number else url
+
+    @staticmethod
+    def precinct_refs(document) -> list:
+        """
+        (number, name) of the precincts linked from a municipality document
+        """
+        related = document.get('_links', {}).get('related', [])
+        return [(link['nr'], link.get('navn', link['nr'])) for link in related if link.get('nivaa') == "stemmekrets"]
+
+    @staticmethod
+    def stamp(document) -> str:
+        """
+        Version of a results document: the report timestamp where given, otherwise a hash of its content
+        """
+        generated = document.get('tidspunkt', {}).get('rapportGenerert')
+        if generated:
+            return generated
+        return hashlib.sha256(json.dumps(document, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def parse(self, document, unit_code, unit_name, municipality_code):
+        """
+        One precinct document -> (unit row, vote rows) in the NorResultsTable column layout
+        """
+        key = {"year": self.year, "level_code": self.LEVEL_CODE, "unit_code": unit_code}
+        votes = []
+        early = 0
+        for party in document.get('partier', []):
+            counts = party.get('stemmer', {}).get('resultat', {}).get('antall', {})
+            if counts.get('total') is None:
+                continue
+            votes.append({
+                **key,
+                "party_code": party['id']['partikode'],
+                "party_name": party['id'].get('navn', party['id']['partikode']),
+                "votes": counts['total'],
+            })
+            early = None if early is None or counts.get('fhs') is None else early + counts['fhs']
+
+        valid = sum(v['votes'] for v in votes)
+        turnout = document.get('frammote', {}).get('prosent')
+        unit = {
+            **key,
+            "election_type": self.election_type,
+            "unit_name": unit_name,
+            "retrieved_on": date.today().isoformat(),
+            "last_updated": (document.get('tidspunkt', {}).get('rapportGenerert') or "")[:10] or None,
+            "valid_votes_cast": valid,
+            "discarded_votes": None,
+            "blank_votes": None,
+            "election_day_valid": valid - early if early is not None else None,
+            "election_day_discarded": None,
+            "election_day_blank": None,
+            "early_valid": early,
+            "early_discarded": None,
+            "early_blank": None,
+            "turnout": turnout / 100 if turnout is not None else None,
+            "municipality_code": municipality_code,
+        }
+        return unit, votes
+
+    def collect_municipality(self, municipality_code, document=None):
+        """
+        Fetch and parse all precincts of one municipality
+        :return: units frame, votes frame, [(precinct code, name)]
+        """
+        import pandas as pd
+
+        document = document or self.fetcher.get_json(self.url(municipality_code))
+        refs = self.precinct_refs(document)
+
+        def collect(ref):
+            number, name = ref
+            precinct = self.fetcher.get_json(self.url(municipality_code, number))
+            return self.parse(precinct, self.precinct_code(municipality_code, number), name, municipality_code)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            parsed = list(pool.map(collect, refs))
+
+        units = pd.DataFrame([unit for unit, _ in parsed], columns=[c for c in self.UNIT_COLUMNS if c != "electorate"])
+        votes = pd.DataFrame([v for _, rows in parsed for v in rows], columns=NorResultsTable.VOTE_COLUMNS)
+        units = NorResultsTable.with_electorate(units)[self.UNIT_COLUMNS]
+        precincts = [(self.precinct_code(municipality_code, number), name) for number, name in refs]
+        return units, votes, precincts
+
+    def ingest_results(self, municipality_codes, refresh=True):
+        """
+        Ingest precinct results municipality by municipality
+        :param municipality_codes: level 2 unit codes
+        :param refresh: skip municipalities whose results haven't changed since the last run
+        :return: dict with counts of updated, unchanged and failed municipalities
+        """
+        state_name = f"results_{self.election_type}"
+        state = self.load_state(state_name)
+        keymap = {}
+        summary = {"updated": 0, "unchanged": 0, "failed": 0}
+
+        for municipality_code in municipality_codes:
+            try:
+                document = self.fetcher.get_json(self.url(municipality_code))
+                stamp = self.stamp(document)
+                previous = state.get(municipality_code)
+                refs = self.precinct_refs(document)
+                precincts = [[self.precinct_code(municipality_code, number), name] for number, name in refs]
+                # partitions written under another precinct code format are re-ingested
+                if refresh and previous and previous['stamp'] == stamp and previous['precincts'] == precincts:
+                    keymap[municipality_code] = previous['precincts']
+                    summary['unchanged'] += 1
+                    continue
+
+                with instrumentation.stage("precincts"):
+                    units, votes, precincts = self.collect_municipality(municipality_code, document)
+                    self.store.write_parquet(units, self.results_key(municipality_code, "units"))
+                    self.store.write_parquet(votes, self.results_key(municipality_code, "votes"))
+            except (FetchError, KeyError, ValueError) as e:
+                print(f"Precincts for {municipality_code} ({self.year}) failed: {e}")
+                summary['failed'] += 1
+                continue
+
+            state[municipality_code] = {"stamp": stamp, "precincts": precincts}
+            keymap[municipality_code] = precincts
+            summary['updated'] += 1
+            self.save_state(state_name, state)
+
+        self.save_keymap(keymap, "results")
+        print(f"Precinct results {self.election_type} {self.year}: {summary}")
+        return summary
+
+    def load_results(self, municipality_codes=None) -> NorResultsTable:
+        """
+        Read precinct partitions back as a NorResultsTable (all municipalities if none are given)
+        """
+        if municipality_codes is None:
+            prefix = f"results/country=nor/year={self.year}/level={self.LEVEL_CODE}/election={self.election_type}/"
+            municipality_codes = sorted({
+                key.split("municipality=")[1].split("/")[0] for key in self.store.list_keys(prefix)
+            })
+        tables = [
+            NorResultsTable(
+                units=self.store.read_parquet(self.results_key(code, "units")),
+                votes=self.store.read_parquet(self.results_key(code, "votes")),
+            )
+            for code in municipality_codes if self.store.exists(self.results_key(code, "units"))
+        ]
+        return NorResultsTable.concat(tables)
+
+    def keymap_key(self, source="results") -> str:
+        if source not in self.KEYMAP_SOURCES:
+            raise ValueError(f"Keymap source must be one of {list(self.KEYMAP_SOURCES)}")
+        return f"raw/nor/mappings/3/{'geometry/' if source == 'geometry' else ''}{self.year}.json"
+
+    def save_keymap(self, keymap: dict, source="results"):
+        """
+        Merge precincts per municipality into the level 2 -> level 3 keymap of a source (see keymap_key)
+        :param source: 'results' or 'geometry'
+        """
+        key = self.keymap_key(source)
+        existing = self.store.read_json(key) if self.store.exists(key) else {"unit_mappings": []}
+        units = {unit['source_unit_code']: unit for unit in existing['unit_mappings']}
+        for municipality_code, precincts in keymap.items():
+            units[municipality_code] = {
+                "source_unit_code": municipality_code,
+                "source_unit_name": units.get(municipality_code, {}).get('source_unit_name', ""),
+                "target_units": [
+                    {"target_unit_code": code, "target_unit_name": name} for code, name in precincts
+                ],
+            }
+        self.store.write_json({
+            "level_1_type_code": "3",
+            "level_1_type_name": "Valgkretser",
+            "metadata": {"source": self.KEYMAP_SOURCES[source], "retrieved_on": date.today().isoformat(),
+                         "year": self.year},
+            "unit_mappings": [units[code] for code in sorted(units)],
+            "unit_changes": {"level_1_changes": [], "level_2_changes": []},
+        }, key)
+
+    # Geometry
+
+    def download(self, url, path):
+        """
+        Stream a download to disk in chunks
+        :return: sha256 of the file
+        """
+        import requests
+
+        digest = hashlib.sha256()
+        with requests.get(url, stream=True, timeout=self.fetcher.timeout) as response:
+            response.raise_for_status()
+            with open(path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def current_geometry(year) -> bool:
+        """
+        GEOJSON_URL holds the precincts of the year
+        """
+        return year == date.today().year
+
+    @instrumentation.timed("geometry")
+    def ingest_geometry(self, zip_url=None, batch_size=2000, refresh=True):
+        """
+        Ingest precinct polygons as per-municipality GeoParquet partitions
+        :param zip_url: Kartverket zip of the year's precincts (defaults to the current national precinct GeoJSON,
+            for the current year only)
+        :param batch_size: features per Arrow batch - bounds peak memory
+        :return: number of features written (0 if the file is unchanged)
+        :raises ValueError: without a zip_url for a year other than the current one
+        """
+        if zip_url is None and not self.current_geometry(self.year):
+            raise ValueError(
+                f"The national precinct file describes {date.today().year}'s precincts, not {self.year}'s: "
+                f"pass the zip_url of a {self.year} file"
+            )
+        import tempfile
+        import zipfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            zip_path = Path(tmpdir) / "precincts.zip"
+            digest = self.download(zip_url or self.GEOJSON_URL, zip_path)
+            state = self.load_state("geometry")
+            if refresh and state.get('sha256') == digest:
+                print(f"Precinct geometry {self.year} unchanged")
+                return 0
+
+            with zipfile.ZipFile(zip_path) as zf:
+                name = [n for n in zf.namelist() if n.lower().endswith('.geojson')][0]
+            # read straight out of the archive through GDAL's zip driver, batch by batch
+            written, keymap = self.write_geometry_batches(f"/vsizip/{zip_path}/{name}", batch_size)
+
+        self.save_state("geometry", {"sha256": digest, "features": written})
+        self.save_keymap(keymap, "geometry")
+        print(f"Precinct geometry {self.year}: {written} features in {len(keymap)} municipalities")
+        return written
+
+    def write_geometry_batches(self, path, batch_size):
+        import geopandas as gpd
+        import shapely
+        from pyogrio.raw import open_arrow
+
+        for key in self.store.list_keys(self.geometry_prefix()):
+            self.store.path(key).unlink()
+
+        written = 0
+        keymap = {}
+        with open_arrow(path, batch_size=batch_size, use_pyarrow=True) as (meta, reader):
+            geometry_column = meta.get('geometry_name') or "wkb_geometry"
+            for batch_number, batch in enumerate(reader):
+                frame = batch.to_pandas()
+                gdf = gpd.GeoDataFrame(
+                    frame.drop(columns=[geometry_column]),
+                    geometry=shapely.from_wkb(frame[geometry_column].to_numpy()),
+                    crs=meta.get('crs'),
+                ).rename(columns={
+                    "kommunenummer": "municipality_code",
+                    "valgkretsnummer": "precinct_number",
+                    "stemmekretsnummer": "precinct_number",
+                    "valgkretsnavn": "precinct_name",
+                    "stemmekretsnavn": "precinct_name",
+                })
+                gdf['unit_code'] = [
+                    self.precinct_code(m, p) for m, p in zip(gdf['municipality_code'], gdf['precinct_number'])
+                ]
+                for municipality_code, part in gdf.groupby("municipality_code", sort=False):
+                    file_path = self.store.path(
+                        f"{self.geometry_prefix(municipality_code)}part-{batch_number:05d}.parquet"
+                    )
+                    file_path.parent.mkdir(parents=True, exist_ok=True)
+                    part.to_parquet(file_path, index=False)
+                    keymap.setdefault(municipality_code, {}).update(
+                        zip(part['unit_code'], part.get('precinct_name', part['unit_code']))
+                    )
+                written += len(gdf)
+        return written, {code: sorted(precincts.items()) for code, precincts in keymap.items()}
+
+    def load_geometry(self, municipality_code):
+        """
+        Precinct polygons of one municipality
+        """
+        import geopandas as gpd
+        import pandas as pd
+
+        keys = self.store.list_keys(self.geometry_prefix(municipality_code))
+        return gpd.GeoDataFrame(pd.concat([gpd.read_parquet(self.store.path(key)) for key in keys], ignore_index=True))
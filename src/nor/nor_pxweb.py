@@ -0,0 +1,278 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from fnmatch import fnmatch
+from itertools import product
+from math import ceil, prod
+
+from src.utils.logging_manager import instrumentation
+
+
+class PxWebQueryPlanner:
+    """
+    Cell-limit aware client for SSB's PxWeb (v0) table API.
+
+    SSB rejects json-stat2 queries that select more than `cell_limit` cells (regions x parties x years x ...).
+    The planner estimates the cell count of a query body from the table's metadata, splits the selection into the
+    fewest chunks that stay under the limit, runs the chunks concurrently and stitches the returned cubes back into
+    a single json-stat2 dataset - so callers build one logical query regardless of its size.
+
+    Planning:
+        * Selected dimensions count their listed values; "all" (wildcard) and "top" selections are counted against
+          the metadata. Omitted dimensions count 1 if eliminable, otherwise all of their values.
+        * Chunks are contiguous slices of the selected values; the number of slices per dimension is searched for
+          the fewest chunks whose cell counts fit.
+        * Table metadata is fetched once per table and cached.
+    """
+    CELL_LIMIT = 800_000
+
+    def __init__(self, fetcher, base_url="https://data.ssb.no/api/v0/no/table", cell_limit=CELL_LIMIT, workers=4):
+        self.fetcher = fetcher
+        self.base_url = base_url
+        self.cell_limit = cell_limit
+        self.workers = workers
+        self._metadata = {}
+        self._lock = threading.Lock()
+
+    def url(self, table: str) -> str:
+        return f"{self.base_url}/{table}/"
+
+    def metadata(self, table: str) -> dict:
+        """
+        Table variables keyed by code: {code: {"values": [...], "elimination": bool, "time": bool}}
+        """
+        with self._lock:
+            if table in self._metadata:
+                return self._metadata[table]
+        response = self.fetcher.get_json(self.url(table))
+        variables = {
+            variable['code']: {
+                "values": variable['values'],
+                "elimination": variable.get('elimination', False),
+                "time": variable.get('time', False),
+            }
+            for variable in response['variables']
+        }
+        with self._lock:
+            self._metadata[table] = variables
+        return variables
+
+    @staticmethod
+    def selected_values(selection: dict, variable: dict) -> list:
+        """
+        Explicit value list a selection resolves to ("item" and value set filters are returned as given)
+        """
+        values = selection['values']
+        if selection['filter'] == "all":
+            return [v for v in variable['values'] if any(fnmatch(v, pattern) for pattern in values)]
+        if selection['filter'] == "top":
+            return variable['values'][-int(values[0]):]
+        return list(values)
+
+    def dimensions(self, table: str, query: dict) -> list:
+        """
+        [(code, selection, values)] for every dimension in the result; omitted non-eliminable dimensions are
+        returned with an explicit "item" selection of all their values
+        """
+        metadata = self.metadata(table)
+        selected = {q['code']: q['selection'] for q in query['query']}
+        dimensions = []
+        for code, variable in metadata.items():
+            if code in selected:
+                dimensions.append((code, selected[code], self.selected_values(selected[code], variable)))
+            elif not variable['elimination']:
+                dimensions.append((code, {"filter": "item", "values": variable['values']}, variable['values']))
+        return dimensions
+
+    def cells(self, table: str, query: dict) -> int:
+        return prod(len(values) for _, _, values in self.dimensions(table, query))
+
+    def slices(self, sizes: dict) -> dict:
+        """
+        Number of slices per dimension that minimises the number of chunks while keeping each chunk within the
+        cell limit. Depth-first search over the distinct chunk widths of each dimension (ceil(n / k)), pruned by the
+        best chunk count found so far.
+        """
+        codes = sorted(sizes, key=sizes.get, reverse=True)
+        best = {"chunks": prod(sizes.values()) + 1, "slices": {code: sizes[code] for code in codes}}
+
+        def search(i, cells, chunks, chosen):
+            if chunks >= best['chunks']:
+                return
+            if i == len(codes):
+                if cells <= self.cell_limit:
+                    best['chunks'], best['slices'] = chunks, dict(chosen)
+                return
+            n = sizes[codes[i]]
+            remaining = prod(sizes[code] for code in codes[i + 1:])
+            for width in sorted({ceil(n / k) for k in range(1, n + 1)}, reverse=True):
+                if cells * width > self.cell_limit:
+                    continue
+                chosen[codes[i]] = ceil(n / width)
+                search(i + 1, cells * width, chunks * chosen[codes[i]], chosen)
+                if cells * width * remaining <= self.cell_limit:
+                    break  # everything after fits unsplit; narrower widths only add chunks
+            chosen.pop(codes[i], None)
+
+        search(0, 1, 1, {})
+        return best['slices']
+
+    def plan(self, table: str, query: dict) -> list:
+        """
+        Split a query body into the fewest query bodies whose cell counts are within the limit
+        :return: list of query bodies (the original body if it already fits)
+        :raises ValueError: if a selection resolves to no values (the result would be empty)
+        """
+        dimensions = self.dimensions(table, query)
+        empty = [code for code, _, values in dimensions if not values]
+        if empty:
+            raise ValueError(f"Query on table {table} selects no values for {empty}")
+        sizes = {code: len(values) for code, _, values in dimensions}
+        total = prod(sizes.values())
+        if total <= self.cell_limit:
+            return [query]
+
+        slices = self.slices(sizes)
+        parts = []
+        for code, selection, values in dimensions:
+            n = slices[code]
+            if n == 1:
+                parts.append([(code, selection)])
+                continue
+            size = ceil(len(values) / n)
+            filter = "item" if selection['filter'] in ("all", "top") else selection['filter']
+            parts.append([
+                (code, {"filter": filter, "values": values[i:i + size]}) for i in range(0, len(values), size)
+            ])
+
+        chunks = []
+        for combination in product(*parts):
+            chunk = deepcopy(query)
+            chunk['query'] = [{"code": code, "selection": selection} for code, selection in combination]
+            chunks.append(chunk)
+        return chunks
+
+    def query(self, table: str, query: dict) -> dict:
+        """
+        Run a (possibly oversized) json-stat2 query, chunked and executed concurrently
+        :return: json-stat2 dataset covering the full selection
+        """
+        chunks = self.plan(table, query)
+        if len(chunks) == 1:
+            return self.fetcher.post_json(self.url(table), chunks[0])
+
+        with instrumentation.stage("pxweb"):
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks))) as pool:
+                cubes = list(pool.map(lambda chunk: self.fetcher.post_json(self.url(table), chunk), chunks))
+        return self.stitch(cubes)
+
+    @staticmethod
+    def stitch(cubes: list) -> dict:
+        """
+        Merge json-stat2 datasets that share dimension ids but cover different category subsets into one dataset.
+        Categories keep their order of first appearance; cells absent from every cube are None.
+        """
+        if len(cubes) == 1:
+            return cubes[0]
+
+        ids = cubes[0]['id']
+        categories = {dim: {} for dim in ids}
+        labels = {dim: {} for dim in ids}
+        for cube in cubes:
+            for dim in ids:
+                category = cube['dimension'][dim]['category']
+                for code in sorted(category['index'], key=category['index'].get):
+                    categories[dim].setdefault(code, len(categories[dim]))
+                labels[dim].update(category.get('label', {}))
+
+        size = [len(categories[dim]) for dim in ids]
+        strides = [prod(size[i + 1:]) for i in range(len(ids))]
+        values = [None] * prod(size)
+        status = {}
+
+        for cube in cubes:
+            positions = []
+            for dim in ids:
+                index = cube['dimension'][dim]['category']['index']
+                positions.append([categories[dim][code] for code in sorted(index, key=index.get)])
+            last = positions[-1]
+            contiguous = last == list(range(last[0], last[0] + len(last)))
+            cube_values = cube['value']
+            cube_status = cube.get('status') or {}
+            source = 0
+            for outer in product(*positions[:-1]):
+                offset = sum(p * s for p, s in zip(outer, strides))
+                if contiguous:
+                    values[offset + last[0]:offset + last[0] + len(last)] = cube_values[source:source + len(last)]
+                else:
+                    for j, p in enumerate(last):
+                        values[offset + p] = cube_values[source + j]
+                for j, p in enumerate(last):
+                    if str(source + j) in cube_status:
+                        status[str(offset + p)] = cube_status[str(source + j)]
+                source += len(last)
+
+        stitched = dict(cubes[0])
+        stitched['updated'] = max(cube.get('updated', "") for cube in cubes)
+        stitched['size'] = size
+        stitched['dimension'] = {
+            dim: {
+                **cubes[0]['dimension'][dim],
+                "category": {"index": dict(categories[dim]), "label": labels[dim]},
+            }
+            for dim in ids
+        }
+        stitched['value'] = values
+        if status:
+            stitched['status'] = status
+        else:
+            stitched.pop('status', None)
+        return stitched
+
+
+class JsonStatCube:
+    """
+    Keyed access to a json-stat2 dataset: cube.value(Region="0301", PolitParti="01", Tid="2021")
+    Dimensions left out must have a single category.
+    """
+    def __init__(self, dataset: dict):
+        self.dataset = dataset
+        self.ids = dataset['id']
+        self.size = dataset['size']
+        self.strides = [prod(self.size[i + 1:]) for i in range(len(self.ids))]
+        self.index = {dim: dataset['dimension'][dim]['category']['index'] for dim in self.ids}
+        self.required = {dim for dim, size in zip(self.ids, self.size) if size > 1}
+
+    def categories(self, dim: str) -> list:
+        return sorted(self.index[dim], key=self.index[dim].get)
+
+    def label(self, dim: str, code: str) -> str:
+        return self.dataset['dimension'][dim]['category']['label'][code]
+
+    def to_frame(self) -> "pd.DataFrame":
+        """
+        Long DataFrame with one categorical column per dimension and a float `value` column (NaN for missing cells)
+        """
+        import numpy as np
+        import pandas as pd
+
+        positions = np.unravel_index(np.arange(len(self.dataset['value'])), self.size)
+        frame = pd.DataFrame({
+            dim: pd.Categorical.from_codes(position, self.categories(dim))
+            for dim, position in zip(self.ids, positions)
+        })
+        frame["value"] = np.array(self.dataset['value'], dtype=float)
+        return frame
+
+    def value(self, **coords):
+        """
+        :raises ValueError: if a dimension with more than one category is left out (the value would be ambiguous)
+        """
+        if not self.required.issubset(coords):
+            missing = sorted(self.required.difference(coords))
+            raise ValueError(f"Coordinates {coords} leave out dimensions with several categories: {missing}")
+        position = 0
+        for dim, stride in zip(self.ids, self.strides):
+            if dim in coords:
+                position += self.index[dim][coords[dim]] * stride
+        return self.dataset['value'][position]
@@ -1,78 +1,47 @@
-import requests
-from copy import deepcopy
 import json
-import zipfile
-import io
-import geopandas as gpd
-import pandas as pd
 #from src.utils.s3manager import S3Manager
 from datetime import date, datetime as dt
-import tempfile
-import os
-import json
 import os
 from pathlib import Path
+from src.nor.nor_parties import SSB_PARTY_CODES
+from src.nor.nor_pxweb import PxWebQueryPlanner
+from src.nor.nor_engine import NorResultsEngine
+from src.utils.fetch import ResilientFetcher, FetchReport, FetchError
+from src.utils import serialization
 
 class NorResultsParliament:
     L1_FILTER = "vs:ValgdistrikterMedBergen"
     L2_FILTER = "vs:KommunValg"
+    SSB_API = "https://data.ssb.no/api/v0/no/table"
+    fetcher = ResilientFetcher()
+    pxweb = PxWebQueryPlanner(fetcher, SSB_API)
+    engine = NorResultsEngine("parliamentary", pxweb)
 
     def __init__(self):
         pass
     #u
     #ut
-    #implement retry logic; if the response is good from the api
     @classmethod
     def get_result(cls, year, unit_code, level):
+        """
+        Collects the full result for a single unit.
+        :raises FetchError: if any of the SSB requests fail after retries
+        :raises ValueError: if the unit is missing from the responses
+        """
+        return cls.get_results(year, [unit_code], level)[0]
 
-        #try except / raise for status
-        votes_cast = cls.get_sum_votes(year, unit_code=unit_code, level=level)
-        # try except / raise for status
-        vote_dist = cls.get_dist_votes(year, unit_code=unit_code, level=level)
-        # try except / raise for status
-        turnout = cls.get_turnout(year, unit_code=unit_code, level=level)
-
-        if level == 1:
-            unit_level = "1b"
-        elif level == 2:
-            unit_level = "2"
-        else:
+    @classmethod
+    def get_results(cls, year, unit_codes, level):
+        """
+        Collects full results for many units of a level with one logical query per table.
+        Queries are chunked by the PxWeb planner where they exceed SSB's cell limit, so a whole level is pulled in as
+        few requests as SSB allows instead of three or four requests per unit.
+        :return: list of result dicts in the get_result shape, in the order of unit_codes
+        :raises ValueError: if a unit is missing from the returned tables
+        """
+        if level not in (1, 2):
             raise ValueError("Level must be 1 or 2")
-
-        if vote_dist['unit_code'] == votes_cast['unit_code']:
-
-            full_result = {
-                "year": year,
-                "election_type":"parliamentary",
-                "unit_code": unit_code,
-                "unit_name": vote_dist['unit_name'],
-                "level_code": unit_level,
-                "retrieved_on": vote_dist['retrieved'],
-                "last_updated": vote_dist['last_updated'],
-                "valid_votes_cast": votes_cast['total']['valid'],
-                "discarded_votes": votes_cast['total']['discarded'],
-                "blank_votes": votes_cast['total']['blank'],
-                "turnout": turnout,
-                "votes_by_type": {
-                    "election_day_vote": {
-                        "valid": votes_cast['election_day_vote']['valid'],
-                        "discarded": votes_cast['election_day_vote']['discarded'],
-                        "blank": votes_cast['election_day_vote']['blank']
-                    },
-                    "early_vote": {
-                        "valid": votes_cast['early_vote']['valid'],
-                        "discarded": votes_cast['early_vote']['discarded'],
-                        "blank": votes_cast['early_vote']['blank']
-                    }
-                },
-                "results": vote_dist['vote_distribution']
-            }
-
-            if level == 1:
-                seat_dist = cls.get_seats(year=year, unit_code=unit_code)
-                full_result['seat_distribution'] = seat_dist['seat_distribution']
-
-            return full_result
+        return cls.engine.results(year, unit_codes, level)
 
     @classmethod
     def get_sum_votes(cls, year, unit_code, level):
@@ -86,7 +55,6 @@ class NorResultsParliament:
         else:
             raise ValueError("Unit code must be 1 or 2")
 
-        vote_count_url = "https://data.ssb.no/api/v0/no/table/11691/"
         vote_count_post = { "query": [
                     {
                       "code": "Region",
@@ -133,8 +101,7 @@ class NorResultsParliament:
                   }
                 }
 
-        r = requests.post(vote_count_url, json=vote_count_post)
-        r_votes = json.loads(r.content)
+        r_votes = cls.pxweb.query("11691", vote_count_post)
 
         values = r_votes['value']
 
@@ -163,25 +130,23 @@ class NorResultsParliament:
         return result
     @classmethod
     def get_dist_votes(cls, year, unit_code, level):
-#introduce try except logic here -- account for "u" and "ut" suffixes on unit codes -----
-#introduce raise-for-status on API calls and try-except
+#account for "u" and "ut" suffixes on unit codes -----
         if level == 1:
             filter = cls.L1_FILTER
-            unit_code = (f"v{unit_code}" if year < 2020 else unit_code)
+            code = (f"v{unit_code}" if year < 2020 else unit_code)
         elif level == 2:
             filter = cls.L2_FILTER
+            code = unit_code
         else:
             raise ValueError("Unit code must be 1 or 2")
 
-        url = "https://data.ssb.no/api/v0/no/table/08092/"
-
         post = {"query":
                 [
                     {
                         "code": "Region",
                         "selection": {
                             "filter": filter,
-                            "values": [unit_code]
+                            "values": [code]
                         }
                     },
                     {
@@ -203,10 +168,9 @@ class NorResultsParliament:
                     "format": "json-stat2"
                 }
         }
-        r = requests.post(url, json=post)
-        r_votes = json.loads(r.content)
+        r_votes = cls.pxweb.query("08092", post)
 
-        unit_name = r_votes['dimension']['Region']['category']['label'][unit_code]
+        unit_name = r_votes['dimension']['Region']['category']['label'][code]
 
         party_categories = r_votes['dimension']['PolitParti']['category']
         party_labels = party_categories['label']
@@ -274,9 +238,7 @@ class NorResultsParliament:
           }
         }
 
-        url = "https://data.ssb.no/api/v0/no/table/08243/"
-        r = requests.post(url, json=post)
-        r_turnout = json.loads(r.content)
+        r_turnout = cls.pxweb.query("08243", post)
         result = r_turnout['value'][0]/100
 
         return result
@@ -284,7 +246,7 @@ class NorResultsParliament:
     @classmethod
     def get_seats(cls, year, unit_code):
 
-        unit_code = (f"v{unit_code}" if year < 2020 else unit_code)
+        code = (f"v{unit_code}" if year < 2020 else unit_code)
 
         post = {
           "query": [
@@ -293,7 +255,7 @@ class NorResultsParliament:
               "selection": {
                 "filter": cls.L1_FILTER,
                 "values": [
-                  unit_code
+                  code
                 ]
               }
             },
@@ -301,13 +263,7 @@ class NorResultsParliament:
               "code": "PolitParti",
               "selection": {
                 "filter": "item",
-                "values": [
-                  "01","02","03","04","08","55","05","06","07","100","130","150","75","29","71","54","122","12","74","46","76",
-                  "56","13","16","131","25","151","125","126","24","17","15","154","132","18","26","152","19","48","77","44",
-                  "133","20","134","135","78","09","136","57","49","58","73","123","153","155","10","124","156","28","11","33",
-                  "21","22","60","59","72","47","70","79","14","127","83","27","137","61","90","90a","90b","90c","90d","90e",
-                  "90f","90g","90h","91","92"
-                ]
+                "values": SSB_PARTY_CODES
               }
             },
             {
@@ -324,9 +280,7 @@ class NorResultsParliament:
             "format": "json-stat2"
           }
         }
-        url = "https://data.ssb.no/api/v0/no/table/08219/"
-        r = requests.post(url, json=post)
-        r_seats= json.loads(r.content)
+        r_seats = cls.pxweb.query("08219", post)
 
         unit_name = r_seats['dimension']['Region']['category']['label'][code]
 
@@ -341,7 +295,7 @@ class NorResultsParliament:
         for party_code, party_name in party_labels.items():
             index_pos = party_index[party_code]
             seats = values[index_pos]
-            if seats > 0:
+            if seats:
                 seat_distribution.append({
                     "party_code": party_code,
                     "party_name": party_name,
@@ -364,7 +318,7 @@ class NorResultsParliament:
         base_path = Path("/Users/holden-data/Desktop/democracy-atlas/data/raw/nor")
 
         # Structure: data/raw/nor/results/{level}/{year}/{unit_code}.json
-        level_dir = data['unit_level']
+        level_dir = data['level_code']
         year = data.get('year', 2021)
         save_path = base_path / "results" / level_dir / str(year)
         filename = f"{data['unit_code']}.json"
@@ -372,39 +326,201 @@ class NorResultsParliament:
 
         file_path = save_path / filename
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        serialization.write_json(data, file_path)
 
-        print(f"Saved {data['']} to: {file_path}")
+        print(f"Saved {data['unit_code']} to: {file_path}")
         return file_path
 
 
     @classmethod
-    def run_results(cls, year, to_cloud=False):
-        pass
+    def run_results(cls, year, unit_codes, level, to_cloud=False, report=None):
+        """
+        Collects and saves results for many units in one batch, continuing past units that fail. If the batch fails,
+        units are retried one by one so that failures are isolated and recorded per unit in the run report, and can be
+        re-queued with `run_results(year, report.failed_units(), level)`.
+
+        :param year: election year
+        :param unit_codes: list of unit codes at the given level
+        :param level: 1 or 2
+        :param to_cloud: bool specifying whether to store locally or persist to cloud
+        :param report: FetchReport to record into (a new one is created if None)
+        :return: list of results, FetchReport
+        """
+        report = report or FetchReport(name=f"nor-parliament-{year}-level-{level}")
+
+        try:
+            batches = [(unit_codes, cls.get_results(year, unit_codes, level))]
+        except (FetchError, ValueError, KeyError) as e:
+            print(f"Batch for parliament {year} failed ({e}), collecting unit by unit")
+            batches = [([unit_code], None) for unit_code in unit_codes]
+
+        results = []
+        for codes, batch in batches:
+            task = {"year": year, "unit_code": codes[0], "level": level}
+            if batch is None:
+                try:
+                    batch = cls.get_results(year, codes, level)
+                except (FetchError, ValueError, KeyError) as e:
+                    report.record_failure(task, e)
+                    continue
+
+            for unit_code, result in zip(codes, batch):
+                if to_cloud:
+                    print("GCP connection not implemented yet")
+                else:
+                    cls.save_locally(result)
+                results.append(result)
+                report.record_success({**task, "unit_code": unit_code})
+
+        base_path = Path("/Users/holden-data/Desktop/democracy-atlas/data/raw/nor")
+        report.save(base_path / "reports" / f"{report.name}.json")
+        print(f"Collected {report.succeeded} units for {year}, {len(report.failures)} failed")
+
+        return results, report
 
 
 class NorResultsLocal:
+    """
+    Results for local elections - municipal council (kommunestyrevalg, level 2) and county council
+    (fylkestingsvalg, levels 1a and 2) - collected through the same table-driven engine as parliamentary results.
+
+    Results have the NorResultsParliament.get_result shape with election_type "municipal" or "county". SSB doesn't
+    publish ballot counts for local elections, so valid votes are the sum of the list votes and discarded/blank
+    votes are None.
+    """
+    ELECTION_TYPES = ("municipal", "county")
+    pxweb = NorResultsParliament.pxweb
+    engines = {"municipal": NorResultsEngine("municipal", pxweb), "county": NorResultsEngine("county", pxweb)}
+
     def __init__(self):
         pass
 
+    @classmethod
+    def engine(cls, election_type):
+        if election_type not in cls.engines:
+            raise ValueError(f"Election type must be one of {cls.ELECTION_TYPES}")
+        return cls.engines[election_type]
+
     @classmethod
     def get_result(cls, year, unit_code, level, election_type):
-        pass
+        """
+        Collects the full result for a single unit.
+        :raises FetchError: if any of the SSB requests fail after retries
+        :raises ValueError: if the unit is missing from the responses
+        """
+        return cls.get_results(year, [unit_code], level, election_type)[0]
+
+    @classmethod
+    def get_results(cls, year, unit_codes, level, election_type):
+        """
+        Collects full results for many units with one logical query per table
+        :return: list of result dicts in the order of unit_codes
+        """
+        return cls.engine(election_type).results(year, unit_codes, level)
+
+    @classmethod
+    def get_unit(cls, year, unit_code, level, election_type, tables):
+        """
+        Decodes one unit from a subset of the election type's tables. Cubes come from the engine's cache, so the
+        per-unit accessors below share one fetch per table instead of each pulling the full result.
+        :param tables: table names beside 'votes', which every unit is decoded from
+        """
+        engine = cls.engine(election_type)
+        cubes = engine.fetch(year, [unit_code], level, names=["votes", *tables])
+        return engine.decode_unit(cubes, year, unit_code, level)
 
-   @classmethod
+    @classmethod
     def get_sum_votes(cls, year, unit_code, level, election_type):
-        pass
+        result = cls.get_unit(year, unit_code, level, election_type, ["counts"])
+        return {
+            "unit_code": unit_code,
+            "unit_name": result['unit_name'],
+            "retrieved": result['retrieved_on'],
+            "last_updated": result['last_updated'],
+            "total": {
+                "valid": result['valid_votes_cast'],
+                "discarded": result['discarded_votes'],
+                "blank": result['blank_votes']
+            },
+            **result['votes_by_type'],
+        }
 
     @classmethod
     def get_dist_votes(cls, year, unit_code, level, election_type):
-        pass
+        result = cls.get_unit(year, unit_code, level, election_type, [])
+        return {
+            'unit_code': unit_code,
+            'unit_name': result['unit_name'],
+            'retrieved': result['retrieved_on'],
+            'last_updated': result['last_updated'],
+            'vote_distribution': result['results']
+        }
 
     @classmethod
-    def get_turnout(cls, year, unit_code, level):
-        pass
+    def get_turnout(cls, year, unit_code, level, election_type="municipal"):
+        return cls.get_unit(year, unit_code, level, election_type, ["turnout"])['turnout']
 
     @classmethod
-    def get_seats(cls, year, unit_code):
-        pass
+    def get_seats(cls, year, unit_code, level=2, election_type="municipal"):
+        result = cls.get_unit(year, unit_code, level, election_type, ["seats"])
+        return {
+            'unit_code': unit_code,
+            'unit_name': result['unit_name'],
+            'retrieved': result['retrieved_on'],
+            'last_updated': result['last_updated'],
+            'seat_distribution': result.get('seat_distribution', [])
+        }
+
+    @classmethod
+    def save_locally(cls, data):
+
+        base_path = Path("/Users/holden-data/Desktop/democracy-atlas/data/raw/nor")
+
+        # Structure: data/raw/nor/results/{election_type}/{level}/{year}/{unit_code}.json
+        save_path = base_path / "results" / data['election_type'] / data['level_code'] / str(data['year'])
+        save_path.mkdir(parents=True, exist_ok=True)
+
+        file_path = save_path / f"{data['unit_code']}.json"
+
+        serialization.write_json(data, file_path)
+
+        return file_path
+
+    @classmethod
+    def run_results(cls, year, unit_codes, level, election_type, to_cloud=False, report=None):
+        """
+        Collects and saves results for many units in one batch. If the batch fails, units are retried one by one so
+        that failures are isolated and recorded per unit in the run report.
+        :return: list of results, FetchReport
+        """
+        report = report or FetchReport(name=f"nor-{election_type}-{year}-level-{level}")
+
+        try:
+            batches = [(unit_codes, cls.get_results(year, unit_codes, level, election_type))]
+        except (FetchError, ValueError, KeyError) as e:
+            print(f"Batch for {election_type} {year} failed ({e}), collecting unit by unit")
+            batches = [([unit_code], None) for unit_code in unit_codes]
+
+        results = []
+        for codes, batch in batches:
+            task = {"year": year, "unit_code": codes[0], "level": level, "election_type": election_type}
+            if batch is None:
+                try:
+                    batch = cls.get_results(year, codes, level, election_type)
+                except (FetchError, ValueError, KeyError) as e:
+                    report.record_failure(task, e)
+                    continue
+
+            for unit_code, result in zip(codes, batch):
+                if to_cloud:
+                    print("GCP connection not implemented yet")
+                else:
+                    cls.save_locally(result)
+                results.append(result)
+                report.record_success({**task, "unit_code": unit_code})
+
+        base_path = Path("/Users/holden-data/Desktop/democracy-atlas/data/raw/nor")
+        report.save(base_path / "reports" / f"{report.name}.json")
+        print(f"Collected {report.succeeded} {election_type} units for {year}, {len(report.failures)} failed")
 
+        return results, report
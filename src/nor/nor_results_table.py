@@ -0,0 +1,215 @@
+import pandas as pd
+
+from src.utils.logging_manager import instrumentation
+
+
+def count(value):
+    """
+    Ballot count as int, None where the source has no count (e.g. discarded/blank votes in local elections)
+    """
+    return None if pd.isna(value) else int(value)
+
+
+def unit_ids(codes) -> pd.Series:
+    """
+    Integer keys for unit codes ("0301" -> 301) shared by the results and context stores; codes within a level have a
+    fixed width, so ids are unique per level. Non-numeric codes (e.g. precincts) get no id.
+    """
+    codes = pd.Series(codes)
+    return pd.to_numeric(codes.str.lstrip("v"), errors="coerce").astype("Int32")
+
+
+class NorResultsTable:
+    """
+    Columnar representation of election results for one or more units.
+
+    Flattens the nested unit dictionaries produced by NorResultsParliament.get_result into three frames:
+        * units - one row per unit with vote totals, turnout and the early/election-day split
+        * votes - one row per unit and party with the party's valid votes
+        * seats - one row per unit and party with seats won (level 1 units only)
+
+    Rows are keyed by (year, level_code, unit_code) so that aggregation, validation and analytics can run as
+    vectorized operations over a whole year instead of looping over per-unit JSON files.
+
+    Storage layout:
+        results/country=nor/year={year}/level={level_code}/{units|votes|seats}.parquet
+
+    Stored frames also carry an integer `unit_id` (see unit_ids) for joins with the context store.
+    """
+    KEY_COLUMNS = ["year", "level_code", "unit_code"]
+
+    COUNT_COLUMNS = [
+        "valid_votes_cast", "discarded_votes", "blank_votes",
+        "election_day_valid", "election_day_discarded", "election_day_blank",
+        "early_valid", "early_discarded", "early_blank",
+    ]
+
+    UNIT_COLUMNS = KEY_COLUMNS + ["election_type", "unit_name", "retrieved_on", "last_updated"] \
+        + COUNT_COLUMNS + ["turnout", "electorate"]
+
+    VOTE_COLUMNS = KEY_COLUMNS + ["party_code", "party_name", "votes"]
+
+    SEAT_COLUMNS = KEY_COLUMNS + ["party_code", "party_name", "seats"]
+
+    def __init__(self, units: pd.DataFrame, votes: pd.DataFrame, seats: pd.DataFrame = None):
+        self.units = units
+        self.votes = votes
+        self.seats = seats if seats is not None else pd.DataFrame(columns=self.SEAT_COLUMNS)
+
+    def __len__(self):
+        return len(self.units)
+
+    @classmethod
+    @instrumentation.timed("parse")
+    def from_results(cls, results: list):
+        """
+        Build a table from unit result dictionaries as returned by NorResultsParliament.get_result
+        :param results: iterable of unit result dicts (None entries are skipped)
+        :return: NorResultsTable
+        """
+        unit_rows = []
+        vote_rows = []
+        seat_rows = []
+
+        for result in results:
+            if result is None:
+                continue
+
+            key = {
+                "year": result['year'],
+                "level_code": result['level_code'],
+                "unit_code": result['unit_code'],
+            }
+            election_day = result['votes_by_type']['election_day_vote']
+            early = result['votes_by_type']['early_vote']
+
+            unit_rows.append({
+                **key,
+                "election_type": result['election_type'],
+                "unit_name": result['unit_name'],
+                "retrieved_on": result['retrieved_on'],
+                "last_updated": result['last_updated'],
+                "valid_votes_cast": result['valid_votes_cast'],
+                "discarded_votes": result['discarded_votes'],
+                "blank_votes": result['blank_votes'],
+                "election_day_valid": election_day['valid'],
+                "election_day_discarded": election_day['discarded'],
+                "election_day_blank": election_day['blank'],
+                "early_valid": early['valid'],
+                "early_discarded": early['discarded'],
+                "early_blank": early['blank'],
+                "turnout": result['turnout'],
+            })
+
+            for party in result['results']:
+                vote_rows.append({**key, **party})
+
+            for party in result.get('seat_distribution', []):
+                seat_rows.append({**key, **party})
+
+        units = pd.DataFrame(unit_rows, columns=[c for c in cls.UNIT_COLUMNS if c != "electorate"])
+        units = cls.with_electorate(units)
+
+        return cls(
+            units=units,
+            votes=pd.DataFrame(vote_rows, columns=cls.VOTE_COLUMNS),
+            seats=pd.DataFrame(seat_rows, columns=cls.SEAT_COLUMNS),
+        )
+
+    @classmethod
+    def with_electorate(cls, units: pd.DataFrame) -> pd.DataFrame:
+        """
+        Derive the (estimated) electorate of each unit from ballots cast and turnout.
+        SSB publishes turnout as a share of the electorate but not the electorate itself; the estimate is what allows
+        turnout to be weighted correctly when units are rolled up. Local elections have no discarded/blank counts;
+        their cast ballots are the valid votes.
+        """
+        units = units.copy()
+        cast = units[["valid_votes_cast", "discarded_votes", "blank_votes"]].astype(float).sum(axis=1, min_count=1)
+        turnout = units["turnout"].where(units["turnout"] > 0)
+        units["electorate"] = (cast / turnout).round()
+        return units
+
+    def to_results(self) -> list:
+        """
+        Convert the table back to the unit result dictionary shape of NorResultsParliament.get_result
+        :return: list of dicts
+        """
+        votes = self.votes.groupby(self.KEY_COLUMNS, sort=False)
+        seats = self.seats.groupby(self.KEY_COLUMNS, sort=False) if len(self.seats) else None
+        seat_keys = set(seats.groups) if seats is not None else set()
+
+        results = []
+        for row in self.units.itertuples(index=False):
+            key = (row.year, row.level_code, row.unit_code)
+            result = {
+                "year": row.year,
+                "election_type": row.election_type,
+                "unit_code": row.unit_code,
+                "unit_name": row.unit_name,
+                "level_code": row.level_code,
+                "retrieved_on": row.retrieved_on,
+                "last_updated": row.last_updated,
+                "valid_votes_cast": count(row.valid_votes_cast),
+                "discarded_votes": count(row.discarded_votes),
+                "blank_votes": count(row.blank_votes),
+                "turnout": None if pd.isna(row.turnout) else float(row.turnout),
+                "votes_by_type": {
+                    "election_day_vote": {
+                        "valid": count(row.election_day_valid),
+                        "discarded": count(row.election_day_discarded),
+                        "blank": count(row.election_day_blank),
+                    },
+                    "early_vote": {
+                        "valid": count(row.early_valid),
+                        "discarded": count(row.early_discarded),
+                        "blank": count(row.early_blank),
+                    },
+                },
+                "results": [
+                    {"party_code": p.party_code, "party_name": p.party_name, "votes": int(p.votes)}
+                    for p in votes.get_group(key).itertuples(index=False)
+                ] if key in votes.groups else [],
+            }
+            if key in seat_keys:
+                result['seat_distribution'] = [
+                    {"party_code": p.party_code, "party_name": p.party_name, "seats": int(p.seats)}
+                    for p in seats.get_group(key).itertuples(index=False)
+                ]
+            results.append(result)
+
+        return results
+
+    @classmethod
+    def key(cls, year, level_code, name, country="nor"):
+        return f"results/country={country}/year={year}/level={level_code}/{name}.parquet"
+
+    def to_store(self, store, year, level_code, country="nor"):
+        """
+        Persist the table's frames for a single year and level
+        :param store: LocalStore (or any store exposing write_parquet)
+        :param country: country partition (the table layout is shared by every ResultsPipeline adapter)
+        """
+        for name, frame in (("units", self.units), ("votes", self.votes), ("seats", self.seats)):
+            if name == "seats" and not len(frame):
+                continue
+            frame = frame.assign(unit_id=unit_ids(frame["unit_code"]).to_numpy())
+            store.write_parquet(frame, self.key(year, level_code, name, country))
+
+    @classmethod
+    def from_store(cls, store, year, level_code, country="nor"):
+        seats_key = cls.key(year, level_code, "seats", country)
+        return cls(
+            units=store.read_parquet(cls.key(year, level_code, "units", country)),
+            votes=store.read_parquet(cls.key(year, level_code, "votes", country)),
+            seats=store.read_parquet(seats_key) if store.exists(seats_key) else None,
+        )
+
+    @classmethod
+    def concat(cls, tables: list):
+        tables = [t for t in tables if t is not None]
+        return cls(
+            units=pd.concat([t.units for t in tables], ignore_index=True),
+            votes=pd.concat([t.votes for t in tables], ignore_index=True),
+            seats=pd.concat([t.seats for t in tables], ignore_index=True),
+        )
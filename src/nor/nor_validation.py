@@ -0,0 +1,217 @@
+import numpy as np
+import pandas as pd
+
+from src.nor.nor_results_table import NorResultsTable
+
+
+class NorResultsValidator:
+    """
+    Integrity checks over a year of columnar results (NorResultsTable), run as grouped/vectorized pandas operations
+    over the whole year rather than per unit.
+
+    Checks:
+        * party_sum       - party votes sum to valid votes
+        * vote_timing     - early + election day ballots equal the totals (valid, discarded, blank)
+        * negative        - no negative counts
+        * turnout         - turnout within (0, 1]
+        * seats           - seats per unit match the district magnitude (DISTRICT_SEATS, for elections that have
+                            an entry) and, for full levels, the seats of the Storting in the election year
+        * coverage        - every keymap unit has results; no results for units outside the keymap
+        * geometry        - every keymap unit has a stored boundary (levels 1a and 2)
+
+    Failures are collected into one frame (check, year, level_code, unit_code, expected, actual) - a failing check
+    never raises, so bulk runs continue and the report lists everything that needs a look.
+    """
+    CHECKS = ("party_sum", "vote_timing", "negative", "turnout", "seats", "coverage", "geometry")
+    FAILURE_COLUMNS = ["check", "year", "level_code", "unit_code", "expected", "actual"]
+    # seats of the Storting by first election year with that size
+    STORTING_SEATS = {1921: 150, 1973: 155, 1985: 157, 1989: 165, 2005: 169}
+    # seats per electoral district (levelling seat included) by election year, keyed by district name as in the
+    # year's 1b keymap; elections without an entry skip the district check
+    DISTRICT_SEATS = {
+        2021: {
+            "Østfold": 9, "Akershus": 19, "Oslo": 20, "Hedmark": 7, "Oppland": 6, "Buskerud": 8, "Vestfold": 7,
+            "Telemark": 6, "Aust-Agder": 4, "Vest-Agder": 6, "Rogaland": 14, "Hordaland": 16, "Sogn og Fjordane": 4,
+            "Møre og Romsdal": 8, "Sør-Trøndelag": 10, "Nord-Trøndelag": 5, "Nordland": 9, "Troms": 6,
+            "Finnmark": 5,
+        },
+    }
+    GEOMETRY_LEVELS = {"1a": 1, "2": 2}
+    TOLERANCE = 0.5
+
+    @classmethod
+    def failures(cls, check, frame, expected, actual) -> pd.DataFrame:
+        """
+        Failure rows for a check from a frame keyed by KEY_COLUMNS
+        :param expected, actual: scalars or values aligned with the frame's rows
+        """
+        frame = frame.reset_index()
+
+        def column(values):
+            values = np.broadcast_to(np.asarray(values, dtype=object), len(frame))
+            return pd.Series(values, index=frame.index).astype("string")
+
+        return pd.DataFrame({
+            "check": check,
+            **{key: frame[key] for key in NorResultsTable.KEY_COLUMNS},
+            "expected": column(expected),
+            "actual": column(actual),
+        }, columns=cls.FAILURE_COLUMNS)
+
+    @classmethod
+    def check_party_sum(cls, table: NorResultsTable) -> pd.DataFrame:
+        units = table.units.set_index(NorResultsTable.KEY_COLUMNS)
+        party_sum = table.votes.groupby(NorResultsTable.KEY_COLUMNS)["votes"].sum().reindex(units.index)
+        difference = (party_sum.fillna(0) - units["valid_votes_cast"]).abs()
+        bad = units["valid_votes_cast"].notna() & (difference > cls.TOLERANCE)
+        return cls.failures("party_sum", units[bad], units.loc[bad, "valid_votes_cast"], party_sum[bad])
+
+    @classmethod
+    def check_vote_timing(cls, table: NorResultsTable) -> pd.DataFrame:
+        units = table.units.set_index(NorResultsTable.KEY_COLUMNS)
+        frames = []
+        for total, kind in (("valid_votes_cast", "valid"), ("discarded_votes", "discarded"), ("blank_votes", "blank")):
+            parts = units[f"election_day_{kind}"] + units[f"early_{kind}"]
+            bad = parts.notna() & units[total].notna() & ((parts - units[total]).abs() > cls.TOLERANCE)
+            frames.append(cls.failures("vote_timing", units[bad], units.loc[bad, total], parts[bad]))
+        return pd.concat(frames, ignore_index=True)
+
+    @classmethod
+    def check_negative(cls, table: NorResultsTable) -> pd.DataFrame:
+        units = table.units.set_index(NorResultsTable.KEY_COLUMNS)
+        counts = units[NorResultsTable.COUNT_COLUMNS]
+        bad = (counts < 0).any(axis=1)
+        votes = table.votes[table.votes["votes"] < 0].set_index(NorResultsTable.KEY_COLUMNS)
+        return pd.concat([
+            cls.failures("negative", units[bad], ">= 0", counts[bad].min(axis=1)),
+            cls.failures("negative", votes, ">= 0", votes["votes"]),
+        ], ignore_index=True)
+
+    @classmethod
+    def check_turnout(cls, table: NorResultsTable) -> pd.DataFrame:
+        units = table.units.set_index(NorResultsTable.KEY_COLUMNS)
+        turnout = units["turnout"]
+        bad = turnout.notna() & ((turnout <= 0) | (turnout > 1))
+        return cls.failures("turnout", units[bad], "(0, 1]", turnout[bad])
+
+    @classmethod
+    def storting_seats(cls, year) -> int:
+        return cls.STORTING_SEATS[max(y for y in cls.STORTING_SEATS if y <= year)]
+
+    @classmethod
+    def magnitudes(cls, year, keymap: dict):
+        """
+        District magnitudes of an election by the unit codes of its 1b keymap
+        :return: unit_code -> seats, or None if DISTRICT_SEATS has no entry for the year
+        """
+        seats = cls.DISTRICT_SEATS.get(year)
+        if seats is None:
+            print(f"No district magnitudes for {year} in DISTRICT_SEATS, skipping the district seat check")
+            return None
+        magnitudes = {}
+        for unit in keymap['unit_mappings']:
+            name = unit['source_unit_name'].removesuffix(" valgdistrikt")
+            if name in seats:
+                magnitudes[unit['source_unit_code']] = seats[name]
+            else:
+                print(f"No district magnitude for {unit['source_unit_code']} {unit['source_unit_name']} ({year})")
+        return magnitudes
+
+    @classmethod
+    def check_seats(cls, table: NorResultsTable, magnitudes: dict = None, complete=False) -> pd.DataFrame:
+        """
+        :param magnitudes: unit_code -> seats (district magnitude)
+        :param complete: the table holds every district of the level, so seats must add up to the Storting
+        """
+        if table.seats is None or table.seats.empty:
+            return pd.DataFrame(columns=cls.FAILURE_COLUMNS)
+        seats = table.seats.groupby(NorResultsTable.KEY_COLUMNS)["seats"].sum()
+        frames = []
+        if magnitudes:
+            expected = seats.index.get_level_values("unit_code").map(magnitudes).to_numpy(dtype=float)
+            bad = pd.notna(expected) & (seats.to_numpy() != expected)
+            frames.append(cls.failures("seats", seats[bad], expected[bad], seats[bad]))
+        if complete:
+            totals = seats.groupby(["year", "level_code"]).sum()
+            expected = totals.index.get_level_values("year").map(cls.storting_seats).to_numpy()
+            bad = totals.to_numpy() != expected
+            frames.append(cls.failures(
+                "seats", totals[bad].to_frame().assign(unit_code="*"), expected[bad], totals[bad]
+            ))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=cls.FAILURE_COLUMNS)
+
+    @classmethod
+    def keymap_codes(cls, keymap: dict, level_code) -> set:
+        if level_code == "2":
+            return {t['target_unit_code'] for unit in keymap['unit_mappings'] for t in unit['target_units']}
+        return {unit['source_unit_code'] for unit in keymap['unit_mappings']}
+
+    @classmethod
+    def check_coverage(cls, check, year, level_code, expected: set, present: set, unexpected=True) -> pd.DataFrame:
+        """
+        Units expected by the keymap but not present ("missing") and, optionally, present but not expected
+        ("unexpected")
+        """
+        rows = [(check, year, level_code, code, "present", "missing") for code in sorted(expected - present)]
+        if unexpected:
+            rows += [(check, year, level_code, code, "absent", "unexpected") for code in sorted(present - expected)]
+        return pd.DataFrame(rows, columns=cls.FAILURE_COLUMNS)
+
+    @classmethod
+    def validate(cls, table: NorResultsTable, year, level_code, keymap: dict = None, geometry_codes=None,
+                 magnitudes: dict = None) -> pd.DataFrame:
+        """
+        Run every applicable check on one year and level
+        :param keymap: keymap of the year (1a for levels 1a/2, 1b for 1b) for the coverage check
+        :param geometry_codes: unit codes with stored boundaries, for the geometry check
+        :param magnitudes: district magnitudes for the seat check
+        :return: failures frame (empty if everything passed)
+        """
+        frames = [
+            cls.check_party_sum(table),
+            cls.check_vote_timing(table),
+            cls.check_negative(table),
+            cls.check_turnout(table),
+            cls.check_seats(table, magnitudes, complete=keymap is not None and level_code == "1b"),
+        ]
+        if keymap is not None:
+            expected = cls.keymap_codes(keymap, level_code)
+            frames.append(cls.check_coverage("coverage", year, level_code, expected, set(table.units["unit_code"])))
+            if geometry_codes is not None:
+                frames.append(cls.check_coverage(
+                    "geometry", year, level_code, expected, set(geometry_codes), unexpected=False
+                ))
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=cls.FAILURE_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    @classmethod
+    def report(cls, failures: pd.DataFrame, examples=5) -> dict:
+        """
+        Compact summary: failure count per check with a few example units
+        """
+        report = {"failures": len(failures), "checks": {}}
+        for check in cls.CHECKS:
+            rows = failures[failures["check"] == check]
+            sample = rows.head(examples).drop(columns="check").astype(object)
+            report["checks"][check] = {
+                "failed": len(rows),
+                "examples": sample.where(sample.notna(), None).to_dict(orient="records"),
+            }
+        return report
+
+    @classmethod
+    def key(cls, year, level_code, name):
+        return f"validation/country=nor/year={year}/level={level_code}/{name}"
+
+    @classmethod
+    def to_store(cls, store, failures: pd.DataFrame, year, level_code) -> dict:
+        """
+        Persist the failures (parquet) and the compact report (JSON)
+        :return: report
+        """
+        report = cls.report(failures)
+        store.write_parquet(failures.astype("string"), cls.key(year, level_code, "failures.parquet"))
+        store.write_json(report, cls.key(year, level_code, "report.json"))
+        return report
@@ -1,15 +1,362 @@
+import json
+from pathlib import Path
+
 from src.nor.nor_div_mapping import StatNorMappings
+from src.nor.nor_results import NorResultsParliament, NorResultsLocal
+from src.utils.local_store import LocalStore
+from src.utils.manifest import RunManifest, hash_inputs
+from src.utils.orchestration import Stage, TaskGraph, DagExecutor
+from src.utils.logging_manager import instrumentation
 
 # implement full data collection for norway here
 
 class NorwayCollector:
-    def __init__(self):
-        pass
+    """
+    Drives collection runs for Norway.
+
+    Runs are checkpointed in a RunManifest stored next to the outputs, so an interrupted run resumes where it
+    stopped and completed tasks are skipped. Runs can be split across worker processes or machines by passing
+    `shard` / `shards`; each worker takes a contiguous range of the run's tasks.
+
+    Full pipeline runs (`run_pipeline`) are expressed as a task DAG per year:
+        mappings -> geodata ----------------> layouts, validation
+        mappings -> results -> aggregates -> layouts, validation
+                                aggregates -> views (all years)
+        mappings -> context (all years)
+    and executed by a DagExecutor with a worker pool per stage. Years before GEOMETRY_START_YEAR have no boundary
+    files the geodata stage can read, so they get no geodata or layouts tasks and are validated without geometry.
+    """
+    GEOMETRY_START_YEAR = 2019  # NorGeoProcessor.GEOJSON_START_AT_SOURCE, without importing geopandas
+
+    def __init__(self, base_path="/Users/holden-data/Desktop/democracy-atlas/data/raw/nor", store=None):
+        self.base_path = Path(base_path)
+        self.store = store or LocalStore()
+
+    def manifest_path(self, name):
+        return self.base_path / "manifests" / f"{name}.json"
 
-    def process_mappings(self, start_year, end_year):
+    @staticmethod
+    def raw_key(*parts) -> str:
+        """
+        Store key (relative to the LocalStore root) of a file the collectors' save_locally writes under data/raw/nor
+        """
+        return "/".join(["raw", "nor", *map(str, parts)])
+
+    def process_mappings(self, start_year, end_year, shard=0, shards=1):
+        """
+        Collect keymaps for every year in the range (one task per year, producing levels 1a and 1b)
+        :return: RunManifest
+        """
+        manifest = RunManifest.load(self.manifest_path(f"mappings_{start_year}_{end_year}"), shard, shards)
         for year in range(start_year, end_year+1):
-            StatNorMappings.get_mappings(year, to_cloud=False)
+            manifest.add(RunManifest.task_id(year=year), {"year": year})
+
+        for task_id, params in manifest.pending():
+            try:
+                lvl_1a, lvl_1b = StatNorMappings.get_mappings(params['year'], to_cloud=False)
+            except Exception as e:
+                manifest.mark_failed(task_id, e)
+                print(f"Mappings for {params['year']} failed: {e}")
+                continue
+            output_keys = [
+                self.raw_key("mappings", mappings['level_1_type_code'], f"{params['year']}.json")
+                for mappings in (lvl_1a, lvl_1b)
+            ]
+            manifest.mark_done(task_id, output_keys)
+
+        manifest.close()
+        print(f"Mappings run {manifest.path.stem} (shard {shard + 1}/{shards}): {manifest.summary()}")
+        return manifest
+
+    @staticmethod
+    def level_units(year, level, election_type="parliamentary"):
+        """
+        Unit codes of a level from the year's keymap (1b for parliamentary, 1a for local elections)
+        :return: keymap, list of unit codes
+        """
+        keymap = StatNorMappings.load_locally("1a" if election_type != "parliamentary" else "1b", year)
+        if level == 1:
+            unit_codes = [unit['source_unit_code'] for unit in keymap['unit_mappings']]
+        else:
+            unit_codes = [t['target_unit_code'] for unit in keymap['unit_mappings'] for t in unit['target_units']]
+        return keymap, unit_codes
+
+    def process_results(self, year, level=2, to_cloud=False, shard=0, shards=1, election_type="parliamentary"):
+        """
+        Collect results for every unit of a level in a year (one task per unit).
+        Unit codes are taken from the year's keymap (1b for parliamentary, 1a for local elections), whose hash is
+        part of each task's inputs. The pending units are fetched together (see NorResultsParliament.get_results) and
+        marked done or failed one by one.
+        :param election_type: "parliamentary", "municipal" or "county"
+        :return: RunManifest
+        """
+        local = election_type != "parliamentary"
+        keymap, unit_codes = self.level_units(year, level, election_type)
+        keymap_hash = hash_inputs(keymap['unit_mappings'])
+
+        name = f"results_{year}_level_{level}" if not local else f"results_{election_type}_{year}_level_{level}"
+        manifest = RunManifest.load(self.manifest_path(name), shard, shards)
+        for unit_code in unit_codes:
+            params = {"year": year, "level": level, "unit_code": unit_code}
+            manifest.add(
+                RunManifest.task_id(year=year, level=level, unit=unit_code), params, hash_inputs(params, keymap_hash)
+            )
+
+        collector = NorResultsLocal if local else NorResultsParliament
+        engine = NorResultsLocal.engine(election_type) if local else NorResultsParliament.engine
+        pending = manifest.pending()
+        if pending:
+            # one logical query per table for every pending unit (chunked by the PxWeb planner), decoded per unit
+            try:
+                cubes = engine.fetch(year, [params['unit_code'] for _, params in pending], level)
+            except Exception as e:
+                for task_id, _ in pending:
+                    manifest.mark_failed(task_id, e)
+                pending = []
+                print(f"Results for {year} level {level} failed: {e}")
+
+        for task_id, params in pending:
+            try:
+                result = engine.decode_unit(cubes, params['year'], params['unit_code'], params['level'])
+            except Exception as e:
+                manifest.mark_failed(task_id, e)
+                continue
+            if to_cloud:
+                print("GCP connection not implemented yet")
+                output_keys = []
+            else:
+                collector.save_locally(result)
+                output_keys = [self.raw_key(
+                    "results", result['election_type'], result['level_code'], result['year'],
+                    f"{result['unit_code']}.json",
+                )]
+            manifest.mark_done(task_id, output_keys)
+
+        manifest.close()
+        print(f"Results run {manifest.path.stem} (shard {shard + 1}/{shards}): {manifest.summary()}")
+        return manifest
+
+    def poll_results(self, year, level=2, election_type="parliamentary", interval=60, rounds=None):
+        """
+        Poll a level's results on election night and record every changed state in a SnapshotStore
+        :param interval: seconds between the starts of two polls
+        :param rounds: number of polls (None polls until interrupted)
+        :return: SnapshotStore
+        """
+        import time
+        from src.utils.snapshot_store import SnapshotStore
+
+        if election_type == "parliamentary":
+            engine = NorResultsParliament.engine
+        else:
+            engine = NorResultsLocal.engine(election_type)
+        _, unit_codes = self.level_units(year, level, election_type)
+        snapshots = SnapshotStore(f"country=nor/election={election_type}/year={year}/level={level}", store=self.store)
+
+        polled = 0
+        while rounds is None or polled < rounds:
+            started = time.monotonic()
+            engine.clear()  # bypass the engine's TTL cache, every poll must see SSB's current counts
+            try:
+                summary = snapshots.put(engine.results(year, unit_codes, level))
+                print(f"{summary['timestamp']}: {summary['changed']} units changed, "
+                      f"{summary['new_objects']} new objects")
+            except Exception as e:
+                print(f"Poll failed: {e}")
+            polled += 1
+            if rounds is None or polled < rounds:
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        return snapshots
+
+    def process_precincts(self, year, election_type="parliamentary", geometry=False, refresh=True,
+                          geometry_url=None):
+        """
+        Ingest level 3 (precinct) results - and optionally geometry - for every municipality in the year's keymap.
+        With refresh, municipalities whose results are unchanged since the last run are skipped.
+        :param geometry_url: Kartverket precinct zip of the year; needed for geometry of any year but the current one
+        """
+        from src.nor.nor_precincts import NorPrecincts
+
+        keymap = StatNorMappings.load_locally("1a", year)
+        municipality_codes = [t['target_unit_code'] for unit in keymap['unit_mappings'] for t in unit['target_units']]
+        precincts = NorPrecincts(year, election_type=election_type, store=self.store)
+        summary = precincts.ingest_results(municipality_codes, refresh=refresh)
+        if geometry:
+            if geometry_url is None and not NorPrecincts.current_geometry(year):
+                print(f"Skipping precinct geometry for {year}: the national file only holds current precincts")
+                summary['features'] = None
+            else:
+                summary['features'] = precincts.ingest_geometry(zip_url=geometry_url, refresh=refresh)
+        return summary
+
+    def process_geodata(self, year):
+        from src.nor.nor_div_geofiles import NorGeoProcessor  # geopandas/GDAL only loaded for geometry work
+        return NorGeoProcessor(year, store=self.store).get_geodata(year=year)
+
+    def process_topology(self, year):
+        """
+        Adjacency graphs and label points for a year's stored level 1 and 2 boundaries
+        """
+        from src.nor.nor_div_geofiles import NorGeoProcessor
+        return NorGeoProcessor(year, store=self.store).build_topology(year=year)
+
+    def process_layouts(self, years, workers=4, force=False):
+        """
+        Dorling and hex layouts for each year's level 1 and 2 units; needs the year's geodata and aggregates
+        """
+        from src.nor.nor_layouts import NorLayouts
+        return NorLayouts(self.store).build_years(years, workers=workers, force=force)
+
+    def aggregate_results(self, year):
+        """
+        Build the columnar level 2 table for a year from saved unit results, derive 1a, 1b and national
+        results from it and persist all of them to the columnar store
+        """
+        from src.nor.nor_results_table import NorResultsTable
+        from src.nor.nor_aggregation import NorResultsAggregator
+
+        results = []
+        for file_path in sorted((self.base_path / "results" / "2" / str(year)).glob("*.json")):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                results.append(json.load(f))
+
+        table = NorResultsTable.from_results(results)
+        table.to_store(self.store, year, "2")
+        for level_code in ("1a", "1b"):
+            keymap = StatNorMappings.load_locally(level_code, year)
+            NorResultsAggregator.aggregate(table, keymap).to_store(self.store, year, level_code)
+        NorResultsAggregator.national(table).to_store(self.store, year, NorResultsAggregator.NATIONAL_LEVEL)
+        return len(table)
+
+    def validate_results(self, year, level_codes=("2", "1a", "1b")):
+        """
+        Validate a year's columnar results (see NorResultsValidator) and store a failures table and compact report
+        per level. For 1b, SSB's own level 1 results are validated when they were collected (they carry seats),
+        otherwise the aggregated table.
+        :return: dict of level_code -> report
+        """
+        from src.nor.nor_results_table import NorResultsTable
+        from src.nor.nor_validation import NorResultsValidator
+        from src.utils.geometry_store import GeometryStore
+
+        geometry = GeometryStore(self.store)
+        reports = {}
+        for level_code in level_codes:
+            level_1 = sorted((self.base_path / "results" / level_code / str(year)).glob("*.json"))
+            if level_code == "1b" and level_1:
+                table = NorResultsTable.from_results([json.loads(path.read_bytes()) for path in level_1])
+            else:
+                table = NorResultsTable.from_store(self.store, year, level_code)
+            keymap = StatNorMappings.load_locally("1b" if level_code == "1b" else "1a", year)
+            geometry_level = NorResultsValidator.GEOMETRY_LEVELS.get(level_code)
+            has_geometry = geometry_level and year >= self.GEOMETRY_START_YEAR
+            geometry_codes = geometry.codes("nor", year, geometry_level) if has_geometry else None
+
+            magnitudes = NorResultsValidator.magnitudes(year, keymap) if level_code == "1b" else None
+            failures = NorResultsValidator.validate(table, year, level_code, keymap, geometry_codes, magnitudes)
+            reports[level_code] = NorResultsValidator.to_store(self.store, failures, year, level_code)
+            failed = {check: r['failed'] for check, r in reports[level_code]['checks'].items() if r['failed']}
+            print(f"Validated {len(table)} level {level_code} units for {year}: {failed or 'all checks passed'}")
+        return reports
+
+    def build_views(self, years, level_code="2", election_type="parliamentary"):
+        """
+        Metrics across years with choropleth class breaks; level 3 reads the precinct partitions of an election type
+        :return: number of unit-years
+        """
+        from src.nor.nor_results_table import NorResultsTable
+        from src.nor.nor_metrics import NorElectionMetrics
+        from src.nor.nor_precincts import NorPrecincts
+
+        if level_code == NorPrecincts.LEVEL_CODE:
+            tables = [
+                NorPrecincts(year, election_type=election_type, store=self.store).load_results() for year in years
+            ]
+        else:
+            tables = [NorResultsTable.from_store(self.store, year, level_code) for year in years]
+        unit_metrics, _ = NorElectionMetrics.compute_and_store(self.store, NorResultsTable.concat(tables), level_code)
+        return len(unit_metrics)
+
+    def process_context(self, years, names=None):
+        """
+        Demographic and economic context tables for the given election years (see NorContext); needs the years'
+        keymaps
+        :return: dict of table name -> rows written
+        """
+        from src.nor.nor_context import NorContext
+        return NorContext(self.store).ingest(years, names=names)
+
+    def build_graph(self, years) -> TaskGraph:
+        """
+        Task DAG for a full collection of the given years
+        """
+        graph = TaskGraph()
+        aggregates = []
+        keymaps = []
+        for year in years:
+            mappings = graph.add(f"mappings/year={year}", "mappings", {"start_year": year, "end_year": year})
+            keymaps.append(mappings)
+            geodata = None
+            if year >= self.GEOMETRY_START_YEAR:
+                geodata = graph.add(f"geodata/year={year}", "geodata", {"year": year}, depends_on=[mappings])
+            results = graph.add(f"results/year={year}", "results", {"year": year}, depends_on=[mappings])
+            aggregates.append(
+                graph.add(f"aggregates/year={year}", "aggregates", {"year": year}, depends_on=[results])
+            )
+            if geodata:
+                graph.add(
+                    f"layouts/year={year}", "layouts", {"years": [year], "workers": 1},
+                    depends_on=[geodata, aggregates[-1]]
+                )
+            graph.add(
+                f"validation/year={year}", "validation", {"year": year}, depends_on=[geodata, aggregates[-1]]
+            )
+        graph.add("views", "views", {"years": list(years)}, depends_on=aggregates)
+        graph.add("context", "context", {"years": list(years)}, depends_on=keymaps)
+        return graph
+
+    @staticmethod
+    def checked(process):
+        """
+        Wrap a manifest-based stage so that a run with failed tasks fails its pipeline task (and skips dependents)
+        """
+        def run(**params):
+            manifest = process(**params)
+            manifest.raise_for_failures()
+            return manifest.summary()
+        return run
 
-    def process_results(self, year, to_cloud=False):
-        pass
+    def run_pipeline(self, years, workers=None, queue_factory=None):
+        """
+        Run mappings, geodata, results, aggregates, layouts, validation, views and context for the given years on
+        per-stage worker pools
+        :param years: iterable of election years
+        :param workers: dict of stage name -> worker count (defaults favour the network-bound stages)
+        :param queue_factory: callable (name, maxsize) -> queue, e.g. a SQLiteQueue factory
+        :return: dict of task_id -> outcome
+        """
+        workers = {
+            "mappings": 2, "geodata": 2, "results": 4, "aggregates": 2, "layouts": 2, "validation": 2, "views": 1,
+            "context": 1,
+            **(workers or {})
+        }
+        stages = [
+            Stage("mappings", self.checked(self.process_mappings), workers=workers["mappings"]),
+            Stage("geodata", self.process_geodata, workers=workers["geodata"]),
+            Stage("results", self.checked(self.process_results), workers=workers["results"]),
+            Stage("aggregates", self.aggregate_results, workers=workers["aggregates"]),
+            Stage("layouts", self.process_layouts, workers=workers["layouts"]),
+            Stage("validation", self.validate_results, workers=workers["validation"]),
+            Stage("views", self.build_views, workers=workers["views"]),
+            Stage("context", self.process_context, workers=workers["context"]),
+        ]
+        years = list(years)
+        outcomes = DagExecutor(stages, queue_factory=queue_factory).run(self.build_graph(years))
+        failed = {task_id: o['error'] for task_id, o in outcomes.items() if o['status'] != "done"}
+        print(f"Pipeline finished: {len(outcomes) - len(failed)} tasks done, {len(failed)} failed or skipped")
 
+        run_name = f"pipeline_{min(years)}_{max(years)}"
+        instrumentation.save_summary(self.base_path / "reports" / f"{run_name}.metrics.json")
+        with open(self.base_path / "reports" / f"{run_name}.prom", 'w', encoding='utf-8') as f:
+            f.write(instrumentation.to_prometheus())
+        return outcomes
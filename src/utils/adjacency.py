@@ -0,0 +1,115 @@
+import numpy as np
+
+from src.utils.logging_manager import instrumentation
+
+
+class AdjacencyGraph:
+    """
+    Contiguity graph of a boundary set in compressed sparse row (CSR) form.
+
+    Units i and j are neighbours if their boundaries share a line segment (rook contiguity) - corner-only contacts are
+    dropped unless `queen` is set. Candidate pairs come from one STRtree pass, so building the graph is
+    O(n log n) rather than a pairwise comparison of every unit.
+
+    Arrays:
+        * codes    - unit codes, row order
+        * indptr   - neighbours of row i are indices[indptr[i]:indptr[i + 1]]
+        * indices  - neighbour rows, sorted within each row
+        * weights  - length of the shared boundary (CRS units), aligned with indices
+
+    Stored as one compressed .npz per country, year and level (see GeometryStore.key).
+    """
+    def __init__(self, codes, indptr, indices, weights):
+        self.codes = np.asarray(codes).astype(str)
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.rows = {code: i for i, code in enumerate(self.codes)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def edges(self) -> int:
+        return len(self.indices) // 2
+
+    @classmethod
+    @instrumentation.timed("topology")
+    def from_geometries(cls, codes, geometries, queen=False):
+        """
+        :param codes: unit codes
+        :param geometries: polygons/multipolygons aligned with codes
+        :param queen: also count units that only meet at a point
+        :return: AdjacencyGraph
+        """
+        import shapely
+
+        geometries = np.asarray(geometries)
+        tree = shapely.STRtree(geometries)
+        left, right = tree.query(geometries, predicate="intersects")
+        keep = left < right
+        left, right = left[keep], right[keep]
+
+        boundaries = shapely.boundary(geometries)
+        shared = shapely.length(shapely.intersection(boundaries[left], boundaries[right]))
+        if not queen:
+            keep = shared > 0
+            left, right, shared = left[keep], right[keep], shared[keep]
+
+        # symmetric edge list -> CSR
+        rows = np.concatenate([left, right])
+        cols = np.concatenate([right, left])
+        weights = np.concatenate([shared, shared])
+        order = np.lexsort((cols, rows))
+        rows, cols, weights = rows[order], cols[order], weights[order]
+        indptr = np.zeros(len(geometries) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=len(geometries)), out=indptr[1:])
+        return cls(codes, indptr, cols, weights)
+
+    def neighbours(self, code) -> list:
+        row = self.rows[code]
+        return self.codes[self.indices[self.indptr[row]:self.indptr[row + 1]]].tolist()
+
+    def shared_lengths(self, code) -> dict:
+        row = self.rows[code]
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return dict(zip(self.codes[self.indices[start:end]].tolist(), self.weights[start:end].tolist()))
+
+    def degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def save(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, codes=self.codes, indptr=self.indptr, indices=self.indices, weights=self.weights)
+        instrumentation.record_bytes("topology", bytes_out=path.stat().st_size)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(arrays['codes'], arrays['indptr'], arrays['indices'], arrays['weights'])
+
+
+@instrumentation.timed("topology")
+def label_points(geometries, precision=0.005):
+    """
+    Pole of inaccessibility of each geometry - the interior point farthest from the boundary, which stays inside
+    concave and multi-part units where centroids drift out (fjords, island municipalities)
+    :param precision: search tolerance as a fraction of sqrt(area)
+    :return: array of shapely Points
+    """
+    import shapely
+
+    geometries = np.asarray(geometries)
+    tolerance = np.maximum(np.sqrt(shapely.area(geometries)) * precision, 1e-9)
+    if hasattr(shapely, "maximum_inscribed_circle"):  # shapely >= 2.1, vectorized
+        return shapely.get_point(shapely.maximum_inscribed_circle(geometries, tolerance), 0)
+
+    from shapely.ops import polylabel
+
+    def largest(geometry):
+        parts = shapely.get_parts(geometry)
+        return parts[np.argmax(shapely.area(parts))]
+
+    return np.array([polylabel(largest(g), t) for g, t in zip(geometries, tolerance)], dtype=object)
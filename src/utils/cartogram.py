@@ -0,0 +1,120 @@
+import numpy as np
+
+SQRT3 = np.sqrt(3)
+DAMPING = 0.5  # fraction of an overlap resolved per step; full steps overshoot when a circle has many neighbours
+
+
+def edge_rows(indptr) -> np.ndarray:
+    """
+    Row index of every entry of a CSR indices array
+    """
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def dorling(x, y, radii, indptr=None, indices=None, iterations=300, attraction=0.05, cohesion=0.1, tolerance=0.01):
+    """
+    Dorling cartogram: one circle per unit, sized by weight, pushed apart until circles no longer overlap while held
+    near their original positions and (optionally) next to their geographic neighbours.
+
+    Every iteration computes all pairwise overlaps at once (n x n arrays), so a step costs a handful of numpy
+    operations rather than a Python loop over pairs; n is a few hundred units per level.
+
+    :param x, y: starting positions (projected coordinates)
+    :param radii: circle radii, same units as x/y
+    :param indptr, indices: CSR adjacency (AdjacencyGraph arrays); neighbours that drift apart are pulled together
+    :param attraction: pull towards the original position per iteration (fraction of the offset)
+    :param cohesion: pull between separated neighbours per iteration (fraction of the gap)
+    :param tolerance: stop once the largest overlap is below this fraction of the mean radius
+    :return: x, y arrays of circle centres
+    """
+    x0, y0 = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    x, y, r = x0.copy(), y0.copy(), np.asarray(radii, dtype=float)
+    n = len(x)
+    mass = r ** 2
+    # larger circles move less: i takes the share of a separation proportional to j's mass
+    share = mass[None, :] / (mass[:, None] + mass[None, :])
+    reach = r[:, None] + r[None, :]
+    if indptr is not None:
+        rows, cols = edge_rows(indptr), np.asarray(indices)
+    # deterministic jitter separates coincident centres
+    jitter = np.random.default_rng(0).normal(scale=1e-6, size=(2, n)) * r.mean()
+    x, y = x + jitter[0], y + jitter[1]
+
+    for i in range(iterations):
+        # position and neighbour pulls fade out, so the last fifth of the steps only separates circles
+        cooling = max(0.0, 1 - i / (0.8 * iterations))
+        dx = x[:, None] - x[None, :]
+        dy = y[:, None] - y[None, :]
+        distance = np.hypot(dx, dy)
+        np.fill_diagonal(distance, np.inf)
+        overlap = np.clip(reach - distance, 0, None)
+        if overlap.max() < tolerance * r.mean():
+            break
+
+        push = DAMPING * overlap * share / distance
+        move_x = (push * dx).sum(axis=1) + cooling * attraction * (x0 - x)
+        move_y = (push * dy).sum(axis=1) + cooling * attraction * (y0 - y)
+
+        if indptr is not None and len(rows):
+            ex, ey = x[cols] - x[rows], y[cols] - y[rows]
+            gap = np.hypot(ex, ey)
+            pull = cooling * cohesion * np.clip(gap - r[rows] - r[cols], 0, None) / np.maximum(gap, 1e-12) / 2
+            move_x += np.bincount(rows, weights=pull * ex, minlength=n)
+            move_y += np.bincount(rows, weights=pull * ey, minlength=n)
+
+        x, y = x + move_x, y + move_y
+    return x, y
+
+
+def hex_center(q, r, size):
+    """
+    Centre of axial hex (q, r) for pointy-top hexagons of circumradius `size`
+    """
+    return size * SQRT3 * (q + r / 2), size * 1.5 * r
+
+
+def hex_corners(x, y, size) -> np.ndarray:
+    """
+    :return: (n, 7, 2) closed rings of pointy-top hexagons
+    """
+    angles = np.deg2rad(np.arange(7) * 60 - 30)
+    return np.stack([x[:, None] + size * np.cos(angles), y[:, None] + size * np.sin(angles)], axis=-1)
+
+
+def hexgrid(x, y, size, indptr=None, indices=None, iterations=300):
+    """
+    Equal-area hex layout: every unit gets one hexagon of the same size.
+    Positions are first relaxed as equal circles (dorling) so dense regions spread out, then each unit is snapped to
+    a free grid cell - pairs of (unit, cell) are taken in order of distance, which keeps units close to their
+    relaxed positions.
+
+    :param size: hexagon circumradius
+    :return: q, r (axial cell coordinates), x, y (cell centres)
+    """
+    n = len(x)
+    inradius = size * SQRT3 / 2
+    x, y = dorling(x, y, np.full(n, inradius), indptr, indices, iterations=iterations)
+
+    # candidate cells covering the relaxed layout with a margin
+    rs = np.arange(np.floor(y.min() / (1.5 * size)) - 2, np.ceil(y.max() / (1.5 * size)) + 3)
+    q_min = np.floor(x.min() / (SQRT3 * size) - rs.max() / 2) - 2
+    q_max = np.ceil(x.max() / (SQRT3 * size) - rs.min() / 2) + 2
+    qs = np.arange(q_min, q_max + 1)
+    cell_q, cell_r = (a.ravel() for a in np.meshgrid(qs, rs))
+    cell_x, cell_y = hex_center(cell_q, cell_r, size)
+    inside = (cell_x > x.min() - 2 * size) & (cell_x < x.max() + 2 * size)
+    cell_q, cell_r, cell_x, cell_y = cell_q[inside], cell_r[inside], cell_x[inside], cell_y[inside]
+
+    distance = np.hypot(x[:, None] - cell_x[None, :], y[:, None] - cell_y[None, :])
+    unit_of, cell_of = np.unravel_index(np.argsort(distance, axis=None), distance.shape)
+    cell = np.full(n, -1)
+    taken = np.zeros(len(cell_x), dtype=bool)
+    placed = 0
+    for unit, candidate in zip(unit_of, cell_of):
+        if cell[unit] >= 0 or taken[candidate]:
+            continue
+        cell[unit], taken[candidate] = candidate, True
+        placed += 1
+        if placed == n:
+            break
+    return cell_q[cell].astype(int), cell_r[cell].astype(int), cell_x[cell], cell_y[cell]
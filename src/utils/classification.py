@@ -0,0 +1,98 @@
+"""
+Class breaks for choropleth maps.
+
+    quantile_breaks     equal-count classes
+    jenks_breaks        Fisher-Jenks natural breaks (minimum within-class sum of squares), exact up to JENKS_BINS
+                        distinct values and approximate above
+    classify            class index of every value for a set of breaks
+
+Breaks are returned as k + 1 edges [min, upper_1, ..., upper_k]; class i holds the values in (edge_i, edge_i+1],
+with the minimum in class 0. Values that are NaN get class -1.
+"""
+import numpy as np
+
+JENKS_BINS = 1024
+# vote share bins in percent, shared by every party map so colours mean the same thing across parties and years
+PARTY_SHARE_BREAKS = np.array([0, 2.5, 5, 10, 15, 20, 25, 30, 40, 50, 100], dtype=float)
+
+
+def finite(values) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    return values[np.isfinite(values)]
+
+
+def quantile_breaks(values, k=5) -> np.ndarray:
+    """
+    :return: edges at the k-quantiles (fewer classes if values repeat)
+    """
+    values = finite(values)
+    if not len(values):
+        return np.array([])
+    return np.unique(np.quantile(values, np.linspace(0, 1, k + 1)))
+
+
+def jenks_breaks(values, k=5, max_bins=JENKS_BINS) -> np.ndarray:
+    """
+    Fisher-Jenks natural breaks by dynamic programming over sorted values.
+
+    Values are first grouped: by distinct value when there are at most `max_bins`, otherwise into `max_bins`
+    equal-count bins of the sorted values (the approximation for large level 3 sets - breaks can only fall between
+    bins). Within-class sums of squares of any run of groups come from cumulative count/sum/square sums, so each of
+    the k - 1 DP steps is one vectorized min over a (bins x bins) matrix instead of a Python double loop.
+
+    :param k: number of classes (fewer if there are fewer distinct values)
+    :return: k + 1 edges
+    """
+    values = np.sort(finite(values))
+    if not len(values):
+        return np.array([])
+    uniques, counts = np.unique(values, return_counts=True)
+    if len(uniques) <= k:
+        return np.concatenate([[values[0]], uniques])
+
+    center = values.mean()  # sums of squares about the mean keep the cumulative sums well conditioned
+    if len(uniques) <= max_bins:
+        counts = counts.astype(float)
+        sums, squares, upper = (uniques - center) * counts, (uniques - center) ** 2 * counts, uniques
+    else:
+        group = np.arange(len(values)) * max_bins // len(values)
+        counts = np.bincount(group).astype(float)
+        sums = np.bincount(group, weights=values - center)
+        squares = np.bincount(group, weights=(values - center) ** 2)
+        upper = values[np.r_[np.flatnonzero(np.diff(group)), len(values) - 1]]
+
+    m = len(counts)
+    c0, c1, c2 = (np.concatenate([[0.0], np.cumsum(a)]) for a in (counts, sums, squares))
+    start, end = np.arange(m + 1)[:, None], np.arange(m + 1)[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # ssd[i, j]: sum of squared deviations of groups i..j-1 as one class
+        ssd = c2[end] - c2[start] - (c1[end] - c1[start]) ** 2 / (c0[end] - c0[start])
+    ssd[end <= start] = np.inf
+
+    cost = ssd[0]
+    splits = []
+    columns = np.arange(m + 1)
+    for _ in range(k - 1):
+        total = cost[:, None] + ssd
+        best = np.argmin(total, axis=0)
+        cost = total[best, columns]
+        splits.append(best)
+
+    ends = [m]
+    for best in reversed(splits):
+        ends.append(best[ends[-1]])
+    ends = np.sort(ends)
+    return np.concatenate([[values[0]], upper[ends - 1]])
+
+
+def classify(values, breaks) -> np.ndarray:
+    """
+    :return: int8 class index per value (-1 for NaN or without breaks)
+    """
+    values = np.asarray(values, dtype=float)
+    classes = np.full(len(values), -1, dtype=np.int8)
+    if len(breaks) < 2:
+        return classes
+    present = np.isfinite(values)
+    classes[present] = np.clip(np.searchsorted(breaks[1:-1], values[present], side="left"), 0, len(breaks) - 2)
+    return classes
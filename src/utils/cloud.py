@@ -1,8 +1,3 @@
-from google.cloud import storage
-from jedi import settings
-
-from google.cloud import storage
-from google.cloud.exceptions import NotFound
 import json
 from pathlib import Path
 from typing import Dict, List, Optional, Union
@@ -14,6 +9,8 @@ class AtlasCloudManager:
     def __init__(self, project_id: str = "democracy-atlas", bucket_name: str = "democracy-atlas"):
         self.project_id = project_id
         self.bucket_name = bucket_name
+        # google-cloud-storage is only imported when a cloud manager is actually created
+        from google.cloud import storage
         self.client = storage.Client(project=project_id)
         self.bucket = self.client.bucket(bucket_name)
 
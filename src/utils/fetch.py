@@ -0,0 +1,244 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime as dt
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from src.utils.logging_manager import instrumentation
+
+
+class FetchError(Exception):
+    """
+    Raised when a request fails after all retries (or is rejected by an open circuit)
+    """
+    def __init__(self, message, url=None, status=None, attempts=0):
+        super().__init__(message)
+        self.url = url
+        self.status = status
+        self.attempts = attempts
+
+
+class CircuitOpenError(FetchError):
+    """
+    Raised without calling the endpoint while its circuit breaker is open
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+
+    States:
+        * closed - requests pass through; consecutive failures are counted
+        * open - requests are rejected immediately until `reset_timeout` seconds have passed
+        * half_open - a single trial request is let through; success closes the circuit, failure re-opens it
+
+    Every request let through should end in record_success, record_failure or record_response. A trial that never
+    reports (the request was interrupted) is given up after `reset_timeout` seconds and another trial is let through.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.state = "closed"
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            # while half open, only the trial request is let through
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = "closed"
+            self.opened_at = None
+
+    def record_response(self):
+        """
+        The endpoint answered with a non-retryable error: it doesn't count as a failure, but it does end a trial
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.failures = 0
+                self.state = "closed"
+                self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class FetchReport:
+    """
+    Run report of fetched and failed tasks.
+    Failed tasks keep the parameters needed to re-queue them, so a rerun only fetches what failed.
+    """
+    def __init__(self, name="run"):
+        self.name = name
+        self.started_at = dt.now().isoformat(timespec="seconds")
+        self.succeeded = 0
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def record_success(self, task: dict = None):
+        with self._lock:
+            self.succeeded += 1
+
+    def record_failure(self, task: dict, error: Exception):
+        with self._lock:
+            self.failures.append({
+                "task": task,
+                "error": f"{type(error).__name__}: {error}",
+                "url": getattr(error, "url", None),
+                "status": getattr(error, "status", None),
+                "attempts": getattr(error, "attempts", None),
+            })
+
+    def failed_tasks(self) -> list:
+        return [failure['task'] for failure in self.failures]
+
+    def failed_units(self) -> list:
+        return [failure['task']['unit_code'] for failure in self.failures if 'unit_code' in failure['task']]
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "finished_at": dt.now().isoformat(timespec="seconds"),
+            "succeeded": self.succeeded,
+            "failed": len(self.failures),
+            "failures": self.failures,
+        }
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        return path
+
+
+class ResilientFetcher:
+    """
+    HTTP fetch layer shared by the SSB, KLASS and Kartverket collectors.
+
+        * Checks response status and raises FetchError instead of parsing error pages
+        * Retries transient failures (connection errors, timeouts, 429 and 5xx) with jittered exponential backoff,
+          honouring Retry-After where the server sends it
+        * Keeps one circuit breaker per endpoint (host + path), so a failing table or classification stops being
+          hammered while other endpoints continue
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_retries=4, backoff_base=0.5, backoff_max=30.0, timeout=30.0,
+                 failure_threshold=5, reset_timeout=60.0, session: "requests.Session" = None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._session = session
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # requests is imported on first use so that module-level fetchers don't slow down CLI startup
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    @staticmethod
+    def endpoint(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.netloc}{parts.path}"
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        key = self.endpoint(url)
+        with self._lock:
+            if key not in self.breakers:
+                self.breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.breakers[key]
+
+    def backoff(self, attempt: int, retry_after=None) -> float:
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        # "full jitter": uniform between 0 and the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @instrumentation.timed("fetch")
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        """
+        Perform a request with retries and circuit breaking
+        :return: successful (2xx) response
+        :raises FetchError: when retries are exhausted or the status is not retryable
+        :raises CircuitOpenError: when the endpoint's circuit is open
+        """
+        import requests
+
+        breaker = self.breaker(url)
+        kwargs.setdefault("timeout", self.timeout)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {self.endpoint(url)}", url=url, attempts=attempt)
+
+            retry_after = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = FetchError(str(e), url=url, attempts=attempt + 1)
+            except Exception:
+                breaker.record_failure()
+                raise
+            else:
+                if response.ok:
+                    breaker.record_success()
+                    instrumentation.record_bytes("fetch", bytes_in=len(response.content))
+                    return response
+
+                last_error = FetchError(
+                    f"{method} {url} returned {response.status_code}",
+                    url=url, status=response.status_code, attempts=attempt + 1
+                )
+                if response.status_code not in self.RETRY_STATUSES:
+                    # client errors are not transient: don't retry and don't count against the endpoint
+                    breaker.record_response()
+                    raise last_error
+                retry_after = response.headers.get("Retry-After")
+
+            breaker.record_failure()
+            if attempt < self.max_retries:
+                time.sleep(self.backoff(attempt, retry_after))
+
+        raise last_error
+
+    def get_json(self, url: str, **kwargs):
+        return json.loads(self.request("GET", url, **kwargs).content)
+
+    def post_json(self, url: str, body: dict, **kwargs):
+        return json.loads(self.request("POST", url, json=body, **kwargs).content)
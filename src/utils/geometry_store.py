@@ -0,0 +1,132 @@
+from src.utils.local_store import LocalStore
+from src.utils.logging_manager import instrumentation
+
+
+class GeometryStore:
+    """
+    Boundary storage per country, year and level, written once per level instead of one GeoJSON object per unit.
+
+    Formats:
+        * GeoParquet (boundaries.parquet) - rows sorted along a Hilbert curve and written in small row groups with a
+          GeoParquet 1.1 bbox covering column, so readers filtering on a bbox or unit codes only fetch the row groups
+          whose statistics match
+        * FlatGeobuf (boundaries.fgb) - with a packed R-tree spatial index, so bbox reads - including over HTTP via
+          GDAL's /vsicurl/ - only fetch the index and the matching features' byte ranges
+
+    Derived per level (write_topology):
+        * adjacency.npz - contiguity graph in CSR form (AdjacencyGraph)
+        * labels.parquet - centroid and label point (pole of inaccessibility) per unit
+
+    Storage layout:
+        geometry/country={country}/year={year}/level={level}/boundaries.{parquet|fgb}
+        geometry/country={country}/year={year}/level={level}/{adjacency.npz|labels.parquet}
+
+    Level 3 (precincts) is partitioned by municipality instead; see NorPrecincts.
+    """
+    FORMATS = ("parquet", "fgb")
+    ROW_GROUP_SIZE = 64
+
+    def __init__(self, store=None, formats=FORMATS):
+        self.store = store or LocalStore()
+        self.formats = formats
+
+    @staticmethod
+    def key(country, year, level, fmt="parquet", name="boundaries"):
+        return f"geometry/country={country}/year={year}/level={level}/{name}.{fmt}"
+
+    @instrumentation.timed("geometry")
+    def write(self, gdf, country, year, level):
+        """
+        Persist a level's boundaries in every configured format
+        :param gdf: GeoDataFrame with one row per unit
+        :return: list of written paths
+        """
+        gdf = gdf.iloc[gdf.geometry.hilbert_distance().argsort()].reset_index(drop=True)
+        paths = []
+        for fmt in self.formats:
+            path = self.store.path(self.key(country, year, level, fmt))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if fmt == "parquet":
+                gdf.to_parquet(
+                    path, index=False, write_covering_bbox=True, row_group_size=self.ROW_GROUP_SIZE,
+                    schema_version="1.1.0",
+                )
+            elif fmt == "fgb":
+                gdf.to_file(path, driver="FlatGeobuf", engine="pyogrio", SPATIAL_INDEX="YES")
+            else:
+                raise ValueError(f"Unknown geometry format {fmt}")
+            instrumentation.record_bytes("geometry", bytes_out=path.stat().st_size)
+            paths.append(path)
+        print(f"Stored {len(gdf)} level {level} boundaries for {country} {year} ({', '.join(self.formats)})")
+        return paths
+
+    def read(self, country, year, level, bbox=None, codes=None, code_column="unit_code", fmt="parquet"):
+        """
+        Partial read of a level's boundaries
+        :param bbox: (xmin, ymin, xmax, ymax) in the stored CRS - only intersecting units are read
+        :param codes: unit codes to read
+        :param fmt: "parquet" or "fgb"
+        :return: GeoDataFrame
+        """
+        import geopandas as gpd
+
+        path = self.store.path(self.key(country, year, level, fmt))
+        if fmt == "parquet":
+            filters = [(code_column, "in", list(codes))] if codes is not None else None
+            gdf = gpd.read_parquet(path, bbox=bbox, filters=filters)
+            return gdf.drop(columns=["bbox"], errors="ignore")
+
+        where = None
+        if codes is not None:
+            quoted = ", ".join("'" + str(code).replace("'", "''") + "'" for code in codes)
+            where = f"{code_column} IN ({quoted})"
+        return gpd.read_file(path, bbox=bbox, where=where, engine="pyogrio")
+
+    def codes(self, country, year, level, code_column="unit_code") -> list:
+        """
+        Unit codes with stored boundaries (reads only the code column), empty if the level isn't stored
+        """
+        import pandas as pd
+
+        path = self.store.path(self.key(country, year, level))
+        return pd.read_parquet(path, columns=[code_column])[code_column].tolist() if path.exists() else []
+
+    @staticmethod
+    def remote(url, bbox=None, where=None):
+        """
+        Read a FlatGeobuf over HTTP with range requests - only the index and matching features are transferred
+        """
+        import geopandas as gpd
+
+        return gpd.read_file(f"/vsicurl/{url}", bbox=bbox, where=where, engine="pyogrio")
+
+    @instrumentation.timed("topology")
+    def write_topology(self, gdf, country, year, level, code_column="unit_code"):
+        """
+        Derive and persist a level's adjacency graph and label points
+        :return: AdjacencyGraph
+        """
+        import pandas as pd
+        import shapely
+        from src.utils.adjacency import AdjacencyGraph, label_points
+
+        geometries = gdf.geometry.values
+        graph = AdjacencyGraph.from_geometries(gdf[code_column], geometries)
+        graph.save(self.store.path(self.key(country, year, level, "npz", name="adjacency")))
+
+        centroids = shapely.centroid(geometries)
+        labels = label_points(geometries)
+        self.store.write_parquet(pd.DataFrame({
+            code_column: gdf[code_column].to_numpy(),
+            "centroid_x": shapely.get_x(centroids), "centroid_y": shapely.get_y(centroids),
+            "label_x": shapely.get_x(labels), "label_y": shapely.get_y(labels),
+        }), self.key(country, year, level, "parquet", name="labels"))
+        print(f"Level {level} {country} {year}: {len(graph)} units, {graph.edges} adjacencies")
+        return graph
+
+    def adjacency(self, country, year, level):
+        from src.utils.adjacency import AdjacencyGraph
+        return AdjacencyGraph.load(self.store.path(self.key(country, year, level, "npz", name="adjacency")))
+
+    def labels(self, country, year, level):
+        return self.store.read_parquet(self.key(country, year, level, "parquet", name="labels"))
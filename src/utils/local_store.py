@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from src.utils import serialization
+from src.utils.logging_manager import instrumentation
+
+
+class LocalStore:
+    """
+    Key-based file store on the local filesystem.
+
+    Mirrors the S3Manager interface used by the pipelines (write_json, read_json, read_parquet, list_keys) so that
+    processed outputs can be written locally during development and moved to cloud storage without changing callers.
+
+    Keys follow the same hive-style layout as the cloud bucket, e.g.:
+        results/country=nor/year=2021/level=2/units.parquet
+    """
+    def __init__(self, root="/Users/holden-data/Desktop/democracy-atlas/data"):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    @instrumentation.timed("store")
+    def write_json(self, data, key: str, indent=None, compressed=False):
+        file_path = serialization.write_json(data, self.path(key), indent=bool(indent), compressed=compressed)
+        instrumentation.record_bytes("store", bytes_out=file_path.stat().st_size)
+        return file_path
+
+    @instrumentation.timed("store")
+    def write_geojson(self, gdf, key: str, precision=serialization.PRECISION, compressed=False):
+        """
+        Stream a GeoDataFrame to a GeoJSON FeatureCollection with rounded coordinates
+        """
+        file_path = serialization.write_feature_collection(gdf, self.path(key), precision=precision, compressed=compressed)
+        instrumentation.record_bytes("store", bytes_out=file_path.stat().st_size)
+        return file_path
+
+    def read_json(self, key: str):
+        return serialization.loads(self.path(key).read_bytes())
+
+    @instrumentation.timed("store")
+    def write_parquet(self, df: "pd.DataFrame", key: str):
+        file_path = self.path(key)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(file_path, index=False)
+        instrumentation.record_bytes("store", bytes_out=file_path.stat().st_size)
+        return file_path
+
+    def read_parquet(self, key: str) -> "pd.DataFrame":
+        import pandas as pd  # only paid by callers that actually read columnar data
+        return pd.read_parquet(self.path(key))
+
+    def list_keys(self, prefix: str) -> list:
+        base = self.path(prefix)
+        if not base.exists():
+            return []
+        if base.is_file():
+            return [prefix]
+        return sorted(
+            p.relative_to(self.root).as_posix() for p in base.rglob("*") if p.is_file()
+        )
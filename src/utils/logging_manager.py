@@ -1,8 +1,269 @@
-# src/utils/atlas_logging.py
+# src/utils/logging_manager.py
 import logging
 import os
+import json
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
 from datetime import datetime
+from functools import wraps
 from pathlib import Path
 from typing import Optional, Dict, Any
 
-# implement
\ No newline at end of file
+
+def get_logger(name: str, level: Optional[str] = None, log_dir: Optional[Path] = None) -> logging.Logger:
+    """
+    Configured logger for pipeline modules. Level defaults to $ATLAS_LOG_LEVEL (INFO).
+    :param log_dir: optional directory for a per-day log file in addition to stderr
+    """
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
+
+    logger.setLevel(level or os.environ.get("ATLAS_LOG_LEVEL", "INFO"))
+    formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+    if log_dir:
+        log_dir = Path(log_dir)
+        log_dir.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.FileHandler(log_dir / f"{datetime.now():%Y-%m-%d}.log", encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+
+    return logger
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed upper bounds (seconds), in the Prometheus bucket convention
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bucket bound below which at least a fraction q of observations fall
+        """
+        if not self.count:
+            return 0.0
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound if bound != float("inf") else self.max
+        return self.max
+
+
+class StageStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.peak_memory_bytes = 0
+        self.rss_growth_bytes = 0
+
+    @property
+    def cache_hit_ratio(self):
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.latency.count,
+            "errors": self.errors,
+            "total_seconds": round(self.latency.sum, 4),
+            "p50_seconds": self.latency.quantile(0.5),
+            "p95_seconds": self.latency.quantile(0.95),
+            "max_seconds": round(self.latency.max, 4),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_ratio": self.cache_hit_ratio,
+            "peak_memory_bytes": self.peak_memory_bytes,
+            "rss_growth_bytes": self.rss_growth_bytes,
+        }
+
+
+class Instrumentation:
+    """
+    Lightweight per-stage instrumentation for pipeline runs.
+
+    Stages (e.g. 'fetch', 'parse', 'geometry', 'store') record:
+        * latency histograms (via the `stage` context manager or the `timed` decorator)
+        * bytes transferred in and out
+        * cache hits and misses
+        * memory - how far a call raised the process's peak RSS (rss_growth_bytes, the largest increase over any
+          call; stages running concurrently share the increase), and with track_allocations=True the traced
+          allocation peak of a call (peak_memory_bytes - more precise, but slows allocation-heavy code)
+
+    The process's own peak RSS is reported once, as a process metric (max_rss_bytes), not per stage.
+
+    Results export as Prometheus text (`to_prometheus`) and as a JSON run summary (`summary` / `save_summary`),
+    which is enough to tell whether a refresh is network-bound (fetch time and bytes) or CPU-bound (parse/geometry).
+    """
+    def __init__(self, track_allocations: bool = False):
+        self.track_allocations = track_allocations
+        self.started_at = datetime.now()
+        self.stages: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def stats(self, name: str) -> StageStats:
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = StageStats()
+            return self.stages[name]
+
+    @staticmethod
+    def _max_rss_bytes() -> int:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a block of work as one call of the named stage
+        """
+        stats = self.stats(name)
+        tracing = self.track_allocations and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        rss_before = self._max_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield stats
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = 0
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            growth = self._max_rss_bytes() - rss_before
+            with self._lock:
+                stats.latency.observe(elapsed)
+                stats.peak_memory_bytes = max(stats.peak_memory_bytes, peak)
+                stats.rss_growth_bytes = max(stats.rss_growth_bytes, growth)
+
+    def timed(self, name: str):
+        """
+        Decorator form of `stage`
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record_bytes(self, name: str, bytes_in: int = 0, bytes_out: int = 0):
+        stats = self.stats(name)
+        with self._lock:
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+
+    def cache_hit(self, name: str):
+        stats = self.stats(name)
+        with self._lock:
+            stats.cache_hits += 1
+
+    def cache_miss(self, name: str):
+        stats = self.stats(name)
+        with self._lock:
+            stats.cache_misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.started_at = datetime.now()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "max_rss_bytes": self._max_rss_bytes(),
+                "stages": {name: stats.to_dict() for name, stats in sorted(self.stages.items())},
+            }
+
+    def save_summary(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+    def to_prometheus(self, prefix: str = "atlas") -> str:
+        """
+        Metrics in the Prometheus text exposition format
+        """
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Time spent per pipeline stage call",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            stages = sorted(self.stages.items())
+            for name, stats in stages:
+                for bound, total in stats.latency.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {total}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {stats.latency.sum}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {stats.latency.count}')
+
+            counters = [
+                ("stage_errors_total", "counter", "Failed stage calls", lambda s: s.errors),
+                ("stage_bytes_in_total", "counter", "Bytes received per stage", lambda s: s.bytes_in),
+                ("stage_bytes_out_total", "counter", "Bytes sent or written per stage", lambda s: s.bytes_out),
+                ("stage_cache_hits_total", "counter", "Cache hits per stage", lambda s: s.cache_hits),
+                ("stage_cache_misses_total", "counter", "Cache misses per stage", lambda s: s.cache_misses),
+                ("stage_peak_memory_bytes", "gauge", "Traced allocation peak per stage (track_allocations only)",
+                 lambda s: s.peak_memory_bytes),
+                ("stage_rss_growth_bytes", "gauge", "Largest increase of the process peak RSS during a stage call",
+                 lambda s: s.rss_growth_bytes),
+            ]
+            for metric, metric_type, description, value in counters:
+                lines.append(f"# HELP {prefix}_{metric} {description}")
+                lines.append(f"# TYPE {prefix}_{metric} {metric_type}")
+                for name, stats in stages:
+                    lines.append(f'{prefix}_{metric}{{stage="{name}"}} {value(stats)}')
+
+            lines.append(f"# HELP {prefix}_process_max_rss_bytes Peak resident set size of the process")
+            lines.append(f"# TYPE {prefix}_process_max_rss_bytes gauge")
+            lines.append(f"{prefix}_process_max_rss_bytes {self._max_rss_bytes()}")
+
+        return "\n".join(lines) + "\n"
+
+
+# shared instance used by the fetch, parsing, geometry and storage layers
+instrumentation = Instrumentation()
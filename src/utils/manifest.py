@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+from datetime import datetime as dt
+from pathlib import Path
+
+
+def hash_inputs(*inputs) -> str:
+    """
+    Stable hash of JSON-serializable task inputs (parameters, keymaps, upstream payloads)
+    """
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class RunManifest:
+    """
+    Persistent record of a collection run's tasks, used to resume and shard runs.
+
+    Each task is identified by a path-like id built from its parameters (e.g. "year=1998/level=1a/unit=0301") and
+    stores its status, the hash of its inputs and the keys of the outputs it wrote. A task is skipped on resume when
+    it is 'done' and its input hash is unchanged; changing inputs re-queues it.
+
+    Sharding: the ordered task list is split into contiguous ranges, one per shard. Each shard writes its own file
+    (`{name}.shard-{i}-of-{n}.json`) so that workers on separate processes or machines never write the same file;
+    `load` merges all shard files of a run.
+
+    Writes: every status change is appended as one JSON line to the shard's journal (`{shard file}.log`), so
+    checkpointing a task costs one small append rather than rewriting the whole manifest. `close` compacts the
+    journal into the shard file; `load` replays any journal a crashed run left behind.
+
+    Status values: pending, done, failed
+    """
+    def __init__(self, path, shard: int = 0, shards: int = 1):
+        self.path = Path(path)
+        self.shard = shard
+        self.shards = shards
+        self.tasks = {}
+
+    @staticmethod
+    def task_id(**params) -> str:
+        return "/".join(f"{k}={v}" for k, v in params.items())
+
+    @property
+    def shard_path(self) -> Path:
+        if self.shards == 1:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}.shard-{self.shard}-of-{self.shards}{self.path.suffix}")
+
+    @staticmethod
+    def journal_path(path) -> Path:
+        path = Path(path)
+        return path.with_name(f"{path.name}.log")
+
+    @classmethod
+    def load(cls, path, shard: int = 0, shards: int = 1):
+        """
+        Load a run manifest, merging the base file and any shard files found next to it, with their journals
+        """
+        manifest = cls(path, shard=shard, shards=shards)
+        base = Path(path)
+        files = {base} | set(base.parent.glob(f"{base.stem}.shard-*{base.suffix}"))
+        files |= {
+            journal.with_name(journal.name[:-len(".log")])
+            for journal in base.parent.glob(f"{base.stem}.shard-*{base.suffix}.log")
+        }
+        for file_path in sorted(files):
+            if file_path.exists():
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    manifest.merge(json.load(f)['tasks'])
+            journal = cls.journal_path(file_path)
+            if journal.exists():
+                with open(journal, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            break  # a line cut off by a crash; everything before it is intact
+                        manifest.merge({entry.pop('task_id'): entry})
+        return manifest
+
+    def merge(self, tasks: dict):
+        for task_id, task in tasks.items():
+            current = self.tasks.get(task_id)
+            if current is None or task['updated_at'] > current['updated_at']:
+                self.tasks[task_id] = task
+
+    def add(self, task_id: str, params: dict, input_hash: str = None):
+        """
+        Register a task. Completed tasks are kept unless their input hash changed.
+        """
+        input_hash = input_hash or hash_inputs(params)
+        task = self.tasks.get(task_id)
+        if task is not None and task['input_hash'] == input_hash:
+            return task
+
+        self.tasks[task_id] = {
+            "params": params,
+            "status": "pending",
+            "input_hash": input_hash,
+            "output_keys": [],
+            "attempts": 0 if task is None else task['attempts'],
+            "error": None,
+            "updated_at": dt.now().isoformat(),
+        }
+        return self.tasks[task_id]
+
+    def shard_tasks(self) -> list:
+        """
+        Task ids in this manifest's shard (a contiguous range of the sorted task ids)
+        """
+        task_ids = sorted(self.tasks)
+        size, remainder = divmod(len(task_ids), self.shards)
+        start = self.shard * size + min(self.shard, remainder)
+        end = start + size + (1 if self.shard < remainder else 0)
+        return task_ids[start:end]
+
+    def pending(self) -> list:
+        """
+        (task_id, params) for tasks in this shard that still need to run
+        """
+        return [
+            (task_id, self.tasks[task_id]['params'])
+            for task_id in self.shard_tasks()
+            if self.tasks[task_id]['status'] != "done"
+        ]
+
+    def mark_done(self, task_id: str, output_keys: list = None):
+        """
+        :param output_keys: store keys of the task's outputs, relative to the LocalStore root (not file paths)
+        """
+        task = self.tasks[task_id]
+        task.update({
+            "status": "done",
+            "output_keys": [str(key) for key in output_keys or []],
+            "attempts": task['attempts'] + 1,
+            "error": None,
+            "updated_at": dt.now().isoformat(),
+        })
+        self.append(task_id)
+
+    def mark_failed(self, task_id: str, error: Exception):
+        task = self.tasks[task_id]
+        task.update({
+            "status": "failed",
+            "attempts": task['attempts'] + 1,
+            "error": f"{type(error).__name__}: {error}",
+            "updated_at": dt.now().isoformat(),
+        })
+        self.append(task_id)
+
+    def summary(self) -> dict:
+        counts = {}
+        for task in self.tasks.values():
+            counts[task['status']] = counts.get(task['status'], 0) + 1
+        return counts
+
+    def raise_for_failures(self):
+        """
+        :raises RuntimeError: if any task of the run failed
+        """
+        failed = {task_id: task['error'] for task_id, task in self.tasks.items() if task['status'] == "failed"}
+        if failed:
+            first = next(iter(failed))
+            raise RuntimeError(
+                f"{len(failed)} of {len(self.tasks)} tasks failed in {self.path.stem}, e.g. {first}: {failed[first]}"
+            )
+
+    def append(self, task_id: str):
+        """
+        Journal one task's current state
+        """
+        journal = self.journal_path(self.shard_path)
+        journal.parent.mkdir(parents=True, exist_ok=True)
+        with open(journal, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"task_id": task_id, **self.tasks[task_id]}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        """
+        Compact the journal into the shard file
+        """
+        self.save()
+        self.journal_path(self.shard_path).unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def save(self):
+        """
+        Atomically write this shard's tasks (write to a temporary file, then rename)
+        """
+        path = self.shard_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tasks = {task_id: self.tasks[task_id] for task_id in self.shard_tasks()}
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"shard": self.shard, "shards": self.shards, "tasks": tasks}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
@@ -0,0 +1,316 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime as dt
+
+
+class InMemoryQueue:
+    """
+    Bounded in-process task queue. `put` blocks while the queue is full, which applies backpressure to the scheduler.
+    """
+    def __init__(self, name, maxsize=100):
+        self.name = name
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item: dict):
+        self._queue.put(item)
+
+    def get(self, timeout=0.5):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def ack(self, item: dict):
+        self._queue.task_done()
+
+    def __len__(self):
+        return self._queue.qsize()
+
+
+class SQLiteQueue:
+    """
+    Bounded task queue persisted in a local SQLite file - a stand-in for a Redis/cloud broker.
+
+    Queued items survive a crashed run, and several runs can share one database file. Every item is tagged with the
+    queue's `run_id`, and a queue only sees the items of its own run: rows left behind by other (possibly crashed)
+    runs are never claimed or counted. Items are claimed atomically (status 'queued' -> 'claimed') and removed on
+    `ack`. `put` blocks while the queue holds `maxsize` unclaimed items.
+
+    Opening a queue for an existing run id resumes it: items claimed by workers that died before acknowledging them
+    are queued again.
+
+    The queue only carries dispatched tasks. DagExecutor collects completions in process, so its workers are threads
+    of the executing process: the file buys crash recovery, not workers in other processes. There is no standalone
+    worker entry point for that reason - it would need completions persisted alongside the tasks.
+    """
+    def __init__(self, name, path="atlas_queue.db", maxsize=100, poll_interval=0.1, run_id=None):
+        self.name = name
+        self.path = str(path)
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self.run_id = run_id or uuid.uuid4().hex
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, queue TEXT, payload TEXT, status TEXT, enqueued_at TEXT, "
+            "run_id TEXT)"
+        )
+        if "run_id" not in {column[1] for column in conn.execute("PRAGMA table_info(tasks)")}:
+            conn.execute("ALTER TABLE tasks ADD COLUMN run_id TEXT")  # files created before items were tagged
+        conn.execute("DROP INDEX IF EXISTS tasks_queue_status")
+        conn.execute("CREATE INDEX IF NOT EXISTS tasks_queue_run_status ON tasks (queue, run_id, status)")
+        self.requeue_claimed()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, item: dict):
+        while len(self) >= self.maxsize:
+            time.sleep(self.poll_interval)
+        self._connect().execute(
+            "INSERT INTO tasks (queue, payload, status, enqueued_at, run_id) VALUES (?, ?, 'queued', ?, ?)",
+            (self.name, json.dumps(item), dt.now().isoformat(), self.run_id),
+        )
+
+    def get(self, timeout=0.5):
+        deadline = time.monotonic() + timeout
+        conn = self._connect()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, payload FROM tasks WHERE queue = ? AND run_id = ? AND status = 'queued' "
+                "ORDER BY id LIMIT 1",
+                (self.name, self.run_id),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE tasks SET status = 'claimed' WHERE id = ?", (row[0],))
+            conn.execute("COMMIT")
+
+            if row is not None:
+                item = json.loads(row[1])
+                item['_queue_id'] = row[0]
+                return item
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def ack(self, item: dict):
+        self._connect().execute("DELETE FROM tasks WHERE id = ?", (item['_queue_id'],))
+
+    def requeue_claimed(self):
+        """
+        Return this run's items claimed by workers that died before acknowledging them to the queue
+        """
+        self._connect().execute(
+            "UPDATE tasks SET status = 'queued' WHERE queue = ? AND run_id = ? AND status = 'claimed'",
+            (self.name, self.run_id),
+        )
+
+    def purge_other_runs(self):
+        """
+        Delete the items other runs left in this queue (only safe when no other run is using the file)
+        :return: number of items deleted
+        """
+        return self._connect().execute(
+            "DELETE FROM tasks WHERE queue = ? AND (run_id IS NULL OR run_id != ?)", (self.name, self.run_id)
+        ).rowcount
+
+    def __len__(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM tasks WHERE queue = ? AND run_id = ? AND status = 'queued'", (self.name, self.run_id)
+        ).fetchone()[0]
+
+
+class Stage:
+    """
+    A pipeline stage: a callable applied to task parameters, run by its own pool of workers.
+    :param name: stage name (e.g. 'mappings', 'results')
+    :param func: callable taking the task's params as keyword arguments
+    :param workers: number of concurrent workers for the stage
+    :param queue_size: maximum queued tasks before the scheduler blocks (backpressure)
+    """
+    def __init__(self, name, func, workers=1, queue_size=100):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class TaskGraph:
+    """
+    Directed acyclic graph of tasks. Each task belongs to a stage and may depend on any other tasks.
+    """
+    def __init__(self):
+        self.tasks = {}
+        self.dependents = {}
+
+    def add(self, task_id: str, stage: str, params: dict = None, depends_on: list = None):
+        depends_on = [d for d in depends_on or [] if d is not None]
+        self.tasks[task_id] = {
+            "task_id": task_id,
+            "stage": stage,
+            "params": params or {},
+            "depends_on": depends_on,
+        }
+        self.dependents.setdefault(task_id, [])
+        for dependency in depends_on:
+            self.dependents.setdefault(dependency, []).append(task_id)
+        return task_id
+
+    def validate(self):
+        """
+        Check that every dependency exists and that the graph has no cycles (Kahn's algorithm)
+        :return: task ids in a topological order
+        """
+        for task in self.tasks.values():
+            missing = [d for d in task['depends_on'] if d not in self.tasks]
+            if missing:
+                raise ValueError(f"Task {task['task_id']} depends on unknown tasks: {missing}")
+
+        remaining = {task_id: len(task['depends_on']) for task_id, task in self.tasks.items()}
+        ready = [task_id for task_id, count in remaining.items() if count == 0]
+        order = []
+        while ready:
+            task_id = ready.pop()
+            order.append(task_id)
+            for dependent in self.dependents[task_id]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+
+        if len(order) != len(self.tasks):
+            raise ValueError("Task graph contains a cycle")
+        return order
+
+
+class DagExecutor:
+    """
+    Executes a TaskGraph by dispatching ready tasks to per-stage queues consumed by per-stage worker pools.
+
+        * A task is enqueued once all of its dependencies have succeeded
+        * Stages run concurrently with each other; each stage's parallelism is its number of workers
+        * Bounded stage queues apply backpressure: the scheduler blocks instead of buffering unbounded work
+        * A failed task marks its transitive dependents as skipped; the rest of the graph keeps running
+        * An interrupt raised by a task (KeyboardInterrupt, SystemExit) fails that task and stops the run: nothing
+          more is dispatched, tasks that didn't finish are reported as skipped and the interrupt is re-raised by `run`
+          once the workers have stopped
+
+    Workers are threads of the calling process (see SQLiteQueue for what persistent queues do and don't provide).
+
+    :param stages: list of Stage
+    :param queue_factory: callable (name, maxsize) -> queue; defaults to InMemoryQueue. It is called once per stage
+        and run, so persistent queues should start a new run id per call (SQLiteQueue does by default).
+    """
+    def __init__(self, stages: list, queue_factory=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.queue_factory = queue_factory or (lambda name, maxsize: InMemoryQueue(name, maxsize=maxsize))
+
+    def run(self, graph: TaskGraph) -> dict:
+        """
+        Run all tasks in the graph
+        :return: dict of task_id -> {'status': 'done'|'failed'|'skipped', 'result' | 'error'}
+        """
+        graph.validate()
+        unknown = {task['stage'] for task in graph.tasks.values()} - set(self.stages)
+        if unknown:
+            raise ValueError(f"No stage registered for: {sorted(unknown)}")
+
+        queues = {name: self.queue_factory(name, stage.queue_size) for name, stage in self.stages.items()}
+        completions = queue.Queue()
+        stop = threading.Event()
+
+        workers = []
+        for name, stage in self.stages.items():
+            for i in range(stage.workers):
+                worker = threading.Thread(
+                    target=self._work, args=(stage, queues[name], completions, stop),
+                    name=f"{name}-{i}", daemon=True,
+                )
+                worker.start()
+                workers.append(worker)
+
+        outcomes = {}
+        waiting = {task_id: len(task['depends_on']) for task_id, task in graph.tasks.items()}
+        in_flight = 0
+        dispatched = set()
+
+        def dispatch(task_id):
+            task = graph.tasks[task_id]
+            dispatched.add(task_id)
+            queues[task['stage']].put({"task_id": task_id, "params": task['params']})
+
+        def skip(task_id):
+            for dependent in graph.dependents[task_id]:
+                if dependent not in outcomes:
+                    outcomes[dependent] = {"status": "skipped", "error": f"upstream task {task_id} failed"}
+                    skip(dependent)
+
+        try:
+            for task_id in [t for t, count in waiting.items() if count == 0]:
+                dispatch(task_id)
+                in_flight += 1
+
+            while in_flight:
+                task_id, outcome = completions.get()
+                if task_id not in dispatched or task_id in outcomes:
+                    continue  # left in a persistent queue by an earlier attempt of the run
+                in_flight -= 1
+                outcomes[task_id] = outcome
+
+                if stop.is_set():
+                    break  # a worker was interrupted
+                if outcome['status'] != "done":
+                    skip(task_id)
+                    continue
+
+                for dependent in graph.dependents[task_id]:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0 and dependent not in outcomes:
+                        dispatch(dependent)
+                        in_flight += 1
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+        while not completions.empty():  # tasks that finished while an interrupted run was stopping
+            task_id, outcome = completions.get_nowait()
+            if task_id in dispatched and task_id not in outcomes:
+                outcomes[task_id] = outcome
+        interrupts = [outcome.pop('interrupt') for outcome in outcomes.values() if 'interrupt' in outcome]
+        for task_id in graph.tasks:
+            if task_id not in outcomes:
+                outcomes[task_id] = {"status": "skipped", "error": "run interrupted"}
+        if interrupts:
+            raise interrupts[0]
+
+        return outcomes
+
+    @staticmethod
+    def _work(stage: Stage, task_queue, completions: queue.Queue, stop: threading.Event):
+        while not stop.is_set():
+            item = task_queue.get(timeout=0.2)
+            if item is None:
+                continue
+            try:
+                result = stage.func(**item['params'])
+                outcome = {"status": "done", "result": result}
+            except Exception as e:
+                outcome = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+            except BaseException as e:
+                # left unacknowledged, so a persistent queue hands the task out again when the run is resumed
+                completions.put((item['task_id'], {"status": "failed", "error": type(e).__name__, "interrupt": e}))
+                stop.set()
+                raise
+            task_queue.ack(item)
+            completions.put((item['task_id'], outcome))
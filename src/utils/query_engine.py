@@ -0,0 +1,246 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+from src.nor.nor_parties import OTHER_PARTY_ID
+from src.utils import serialization
+from src.utils.local_store import LocalStore
+from src.utils.logging_manager import instrumentation
+
+# Views over the partitioned parquet stores: name -> [(glob relative to the store root, columns dropped)]. Partition
+# columns (country, year, level) are read from the paths, so filters on them prune files before any parquet is opened;
+# `level` is exposed as level_code, replacing the stored column of the same name. Precinct partitions also drop their
+# election/municipality path columns (election_type and municipality_code are stored).
+PRECINCTS = ("level_code", "election", "municipality")
+SOURCES = {
+    "units": [
+        ("results/country=*/year=*/level=*/units.parquet", ("level_code",)),
+        ("results/country=*/year=*/level=*/election=*/municipality=*/units.parquet", PRECINCTS),
+    ],
+    "votes": [
+        ("results/country=*/year=*/level=*/votes.parquet", ("level_code",)),
+        ("results/country=*/year=*/level=*/election=*/municipality=*/votes.parquet", PRECINCTS),
+    ],
+    "seats": [
+        ("results/country=*/year=*/level=*/seats.parquet", ("level_code",)),
+    ],
+    "unit_metrics": [
+        ("metrics/country=*/level=*/unit_metrics.parquet", ()),
+    ],
+    "party_swing": [
+        ("metrics/country=*/level=*/party_swing.parquet", ()),
+    ],
+    "class_breaks": [
+        ("metrics/country=*/level=*/class_breaks.parquet", ()),
+    ],
+    "context_population": [
+        ("context/country=*/year=*/level=*/population.parquet", ("level_code",)),
+    ],
+    "context_income": [
+        ("context/country=*/year=*/level=*/income.parquet", ("level_code",)),
+    ],
+    "context_education": [
+        ("context/country=*/year=*/level=*/education.parquet", ("level_code",)),
+    ],
+    "labels": [
+        ("geometry/country=*/year=*/level=*/labels.parquet", ()),
+    ],
+}
+
+# Vote shares with the canonical party dimension attached. Norwegian codes without a mapping for the year resolve to
+# the "other" party, as in NorPartyLookup.resolve - this includes every joint list and historic party, which are not
+# curated; other countries' votes have no canonical party.
+PARTY_VOTES = f"""
+    CREATE OR REPLACE VIEW party_votes AS
+    SELECT v.country, v.year, v.level_code, v.unit_code, u.unit_name, v.party_code, v.party_name,
+           p.party_id, p.abbreviation, p.bloc, v.votes, v.votes / u.valid_votes_cast AS share
+    FROM votes v
+    JOIN units u USING (country, year, level_code, unit_code)
+    LEFT JOIN party_codes c
+        ON v.country = 'nor' AND c.code = v.party_code AND v.year BETWEEN c.valid_from AND c.valid_to
+    LEFT JOIN parties p
+        ON p.party_id = CASE WHEN v.country = 'nor' THEN COALESCE(c.party_id, {OTHER_PARTY_ID}) END
+"""
+
+
+class AtlasQueryEngine:
+    """
+    Embedded DuckDB query layer over the results, metrics and geometry stores.
+
+    The partitioned parquet files are registered as views (see SOURCES) - nothing is loaded up front, DuckDB scans
+    only the files whose partition values match a query's filters on country, year and level_code and only the
+    columns it needs. Results and context views share the integer unit_id key. The party dimension (nor_parties) is
+    registered as `parties` / `party_codes`, and `party_votes` joins votes to units and parties with vote shares.
+
+        engine = AtlasQueryEngine()
+        engine.sql("SELECT year, sum(votes) FROM votes WHERE level_code = '2' GROUP BY year")
+        engine.swing("SP", 2017, 2021, min_change=5)
+
+    `serve` exposes read-only SQL over HTTP (GET /sql?q=...) for researchers' notebooks and the frontend.
+    Views are registered when the engine is created; call `refresh` after new partition types appear.
+    """
+    MAX_ROWS = 10_000
+
+    def __init__(self, store=None, threads=None):
+        import duckdb
+
+        self.store = store or LocalStore()
+        self.connection = duckdb.connect(database=":memory:")
+        if threads:
+            self.connection.execute(f"SET threads = {int(threads)}")
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def scan(self, pattern: str, dropped) -> str:
+        path = (self.store.root / pattern).as_posix()
+        types = {"year": "INTEGER", "level": "VARCHAR"}
+        types = ", ".join(f"'{column}': '{t}'" for column, t in types.items() if f"{column}=*" in pattern)
+        return (
+            f"SELECT * EXCLUDE ({', '.join(['level', *dropped])}), level AS level_code FROM read_parquet('{path}', "
+            f"hive_partitioning = true, union_by_name = true, hive_types = {{{types}}})"
+        )
+
+    def refresh(self) -> list:
+        """
+        (Re-)register a view for every source with files in the store
+        :return: registered view names
+        """
+        from src.nor.nor_parties import NorPartyLookup, PARTY_CODES, JOINT_LISTS
+        import pandas as pd
+
+        registered = []
+        with self._lock:
+            for name, sources in SOURCES.items():
+                scans = [
+                    self.scan(pattern, dropped) for pattern, dropped in sources
+                    if next(self.store.root.glob(pattern), None) is not None
+                ]
+                if not scans:
+                    continue
+                self.connection.execute(f"CREATE OR REPLACE VIEW {name} AS {' UNION ALL BY NAME '.join(scans)}")
+                registered.append(name)
+
+            # dimensions are materialized: registered DataFrames are only visible to this connection, not its cursors
+            dimensions = {
+                "parties": NorPartyLookup.party_frame().reset_index(),
+                "party_codes": pd.DataFrame(
+                    PARTY_CODES + JOINT_LISTS, columns=["code", "valid_from", "valid_to", "party_id"]
+                ),
+            }
+            for name, frame in dimensions.items():
+                self.connection.register("frame", frame)
+                self.connection.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM frame")
+                self.connection.unregister("frame")
+                registered.append(name)
+            if {"units", "votes"} <= set(registered):
+                self.connection.execute(PARTY_VOTES)
+                registered.append("party_votes")
+        self.views = registered
+        return registered
+
+    @instrumentation.timed("query")
+    def sql(self, query: str, params=None) -> "pd.DataFrame":
+        """
+        Run a query and return the result as a DataFrame
+        :param params: positional (?) or named ($name) parameters
+        """
+        with self._lock:
+            cursor = self.connection.cursor()
+        return cursor.execute(query, params).df()
+
+    def swing(self, party: str, from_year: int, to_year: int, level_code="2", min_change=None) -> "pd.DataFrame":
+        """
+        Change in a party's vote share (percentage points) per unit between two elections.
+        Units are matched on unit code, so units merged or renumbered in between drop out.
+
+        :param party: party abbreviation (see nor_parties.PARTIES)
+        :param min_change: only units where the share rose by at least this many points
+        :return: DataFrame of unit_code, unit_name, share_from, share_to, change_points (largest gains first)
+        """
+        query = """
+            WITH shares AS (
+                SELECT year, unit_code, unit_name, share FROM party_votes
+                WHERE level_code = $level_code AND abbreviation = $party AND year IN ($from_year, $to_year)
+            )
+            SELECT b.unit_code, b.unit_name, a.share AS share_from, b.share AS share_to,
+                   round((b.share - a.share) * 100, 2) AS change_points
+            FROM shares a JOIN shares b USING (unit_code)
+            WHERE a.year = $from_year AND b.year = $to_year
+              AND ($min_change IS NULL OR (b.share - a.share) * 100 >= $min_change)
+            ORDER BY change_points DESC
+        """
+        return self.sql(query, {
+            "party": party, "from_year": from_year, "to_year": to_year, "level_code": level_code,
+            "min_change": min_change,
+        })
+
+    def read_only(self, query: str) -> dict:
+        """
+        Run a single SELECT statement for the HTTP endpoint
+        :return: {"columns": [...], "rows": [...], "truncated": bool}
+        :raises ValueError: for anything but one SELECT statement
+        """
+        import duckdb
+
+        statements = duckdb.extract_statements(query)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only a single SELECT statement is allowed")
+        with self._lock:
+            cursor = self.connection.cursor()
+        with instrumentation.stage("query"):
+            result = cursor.execute(query)
+            rows = result.fetchmany(self.MAX_ROWS + 1)
+        return {
+            "columns": [column[0] for column in result.description],
+            "rows": rows[:self.MAX_ROWS],
+            "truncated": len(rows) > self.MAX_ROWS,
+        }
+
+    def lock_down(self):
+        """
+        Restrict file access to the store (irreversible for this connection) - SELECTs can still call table functions
+        such as read_csv on arbitrary paths otherwise
+        """
+        root = self.store.root.as_posix().replace("'", "''")
+        self.connection.execute(f"SET allowed_directories = ['{root}']")
+        self.connection.execute("SET enable_external_access = false")
+
+    def serve(self, host="127.0.0.1", port=8765):
+        """
+        Serve GET /sql?q=<SELECT ...> as JSON until interrupted
+        """
+        engine = self
+        self.lock_down()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path != "/sql":
+                    return self.reply(404, {"error": "not found"})
+                query = dict(parse_qsl(parts.query)).get("q")
+                if not query:
+                    return self.reply(400, {"error": "missing q"})
+                try:
+                    self.reply(200, engine.read_only(query))
+                except Exception as e:
+                    self.reply(400, {"error": f"{type(e).__name__}: {e}"})
+
+            def reply(self, status, payload):
+                body = serialization.dumps(payload)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        print(f"Serving SQL on http://{host}:{server.server_address[1]}/sql ({', '.join(self.views)})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,171 @@
+"""
+Compact JSON and GeoJSON output for published artifacts.
+
+    dumps / loads                   compact JSON bytes (orjson when installed, stdlib otherwise); NaN and infinity
+                                    are written as null by both
+    write_json                      compact JSON file, optionally pre-compressed
+    write_feature_collection        GeoDataFrame -> GeoJSON FeatureCollection, streamed feature by feature with
+                                    coordinates rounded to a fixed number of decimals
+    compress                        .gz and .br siblings of a file for static serving
+
+Six decimals of longitude/latitude is ~0.1 m, far below the resolution of the boundary sources, and is what most web
+maps publish; pass a lower precision for display-only views.
+"""
+import gzip
+import json
+import math
+from pathlib import Path
+
+from src.utils.logging_manager import instrumentation
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback - same output, slower
+    orjson = None
+
+PRECISION = 6
+COMPRESSIONS = ("gz", "br")
+
+
+def default(value):
+    """
+    Encoder fallback for numpy scalars/arrays and pandas timestamps
+    """
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def finite(value):
+    """
+    Copy of a decoded structure with NaN and infinite floats replaced by None - what orjson writes for them, so the
+    stdlib path gives the same output instead of raising
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite(item) for item in value]
+    return value
+
+
+def dumps(data, indent=False, sort_keys=False) -> bytes:
+    """
+    :param indent: pretty-print with two spaces (for files meant to be read by people)
+    :param sort_keys: canonical key order, for hashing
+    :return: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=default, option=option)
+    return json.dumps(
+        finite(data), default=lambda value: finite(default(value)), ensure_ascii=False, allow_nan=False,
+        sort_keys=sort_keys,
+        indent=2 if indent else None, separators=None if indent else (",", ":"),
+    ).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def compress(path, formats=COMPRESSIONS) -> list:
+    """
+    Write pre-compressed copies of a file next to it (file.json.gz, file.json.br) for servers/CDNs that serve them
+    with Content-Encoding. Brotli is skipped if the brotli package isn't installed.
+    :return: list of written paths
+    """
+    path = Path(path)
+    raw = path.read_bytes()
+    written = []
+    for fmt in formats:
+        if fmt == "gz":
+            payload = gzip.compress(raw, compresslevel=9, mtime=0)
+        elif fmt == "br":
+            try:
+                import brotli
+            except ImportError:
+                print(f"brotli not installed, skipping {path.name}.br")
+                continue
+            payload = brotli.compress(raw, quality=11)
+        else:
+            raise ValueError(f"Unknown compression {fmt}")
+        target = path.with_name(f"{path.name}.{fmt}")
+        target.write_bytes(payload)
+        written.append(target)
+    return written
+
+
+@instrumentation.timed("serialize")
+def write_json(data, path, indent=False, compressed=False) -> Path:
+    """
+    Write compact JSON
+    :param compressed: also write .gz/.br copies
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(dumps(data, indent=indent))
+    instrumentation.record_bytes("serialize", bytes_out=path.stat().st_size)
+    if compressed:
+        compress(path)
+    return path
+
+
+def round_coordinates(geometries, precision=PRECISION):
+    """
+    Round every coordinate of a GeoSeries/array of shapely geometries (vectorized; topology isn't re-validated, so
+    keep the precision well above the size of the smallest features)
+    """
+    import numpy as np
+    import shapely
+
+    return shapely.transform(np.asarray(geometries), lambda coords: np.round(coords, precision))
+
+
+def features(gdf, precision=PRECISION):
+    """
+    Yield GeoJSON features of a GeoDataFrame as encoded bytes, one at a time
+    """
+    import shapely
+
+    geometries = round_coordinates(gdf.geometry.values, precision)
+    properties = gdf.drop(columns=gdf.geometry.name)
+    properties = properties.astype(object).where(properties.notna(), None)
+    columns = list(properties.columns)
+    for row, geometry in zip(properties.itertuples(index=False, name=None), geometries):
+        yield dumps({
+            "type": "Feature",
+            "properties": dict(zip(columns, row)),
+            "geometry": shapely.geometry.mapping(geometry) if geometry is not None else None,
+        })
+
+
+@instrumentation.timed("serialize")
+def write_feature_collection(gdf, path, precision=PRECISION, compressed=False) -> Path:
+    """
+    Stream a GeoDataFrame to a GeoJSON FeatureCollection without building the whole document in memory
+    :param precision: decimals kept per coordinate
+    :param compressed: also write .gz/.br copies
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b'{"type":"FeatureCollection","features":[')
+        for i, feature in enumerate(features(gdf, precision)):
+            if i:
+                f.write(b",")
+            f.write(feature)
+        f.write(b"]}")
+    instrumentation.record_bytes("serialize", bytes_out=path.stat().st_size)
+    if compressed:
+        compress(path)
+    return path
@@ -0,0 +1,192 @@
+import gzip
+import hashlib
+import os
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from src.utils import serialization
+from src.utils.local_store import LocalStore
+from src.utils.logging_manager import instrumentation
+
+
+def timestamp_of(value) -> str:
+    """
+    Normalise a datetime or ISO string to a UTC ISO timestamp (naive datetimes are taken as local time)
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+class SnapshotStore:
+    """
+    Content-addressed history of polled unit results (NorResultsParliament.get_result payloads) for one series -
+    an election, year and level - so every state seen on election night can be replayed or audited.
+
+    Storage layout (under snapshots/{series}/):
+        objects/{hh}/{hash}.json.gz     one unit payload, keyed by the sha256 of its canonical JSON
+        manifests/{hash}.json           {unit_code: object hash} for one state of the whole series
+        timeline.jsonl                  one line per state change: {"timestamp": ..., "manifest": ...}
+
+    A poll only writes the payloads that changed and, if anything changed, one manifest and one timeline line;
+    polls that see no change write nothing. Storage therefore grows with the number of changes, not with the
+    polling frequency. Fields that change on every fetch without the results changing (VOLATILE) are left out of
+    the stored payload and restored from the snapshot timestamp when reading.
+
+    "Results as of 21:35" is a bisect over the timeline, one manifest read and one object read per unit.
+    """
+    VOLATILE = ("retrieved_on",)
+
+    def __init__(self, series: str, store=None, workers=8):
+        """
+        :param series: e.g. "country=nor/election=parliamentary/year=2025/level=2"
+        """
+        self.series = series
+        self.store = store or LocalStore()
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._timeline = None
+        self._current = None
+
+    def key(self, *parts) -> str:
+        return "/".join(["snapshots", self.series, *parts])
+
+    def object_key(self, digest: str) -> str:
+        return self.key("objects", digest[:2], f"{digest}.json.gz")
+
+    @classmethod
+    def canonical(cls, result: dict) -> bytes:
+        return serialization.dumps({k: v for k, v in result.items() if k not in cls.VOLATILE}, sort_keys=True)
+
+    def write_object(self, payload: bytes) -> tuple:
+        """
+        :return: (hash, whether the object was new)
+        """
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self.store.path(self.object_key(digest))
+        if path.exists():
+            return digest, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(gzip.compress(payload, mtime=0))
+        os.replace(tmp, path)  # atomic: readers never see a partial object
+        instrumentation.record_bytes("snapshots", bytes_out=path.stat().st_size)
+        return digest, True
+
+    def read_object(self, digest: str) -> dict:
+        return serialization.loads(gzip.decompress(self.store.path(self.object_key(digest)).read_bytes()))
+
+    def timeline(self) -> list:
+        """
+        [(timestamp, manifest hash)] in time order
+        """
+        if self._timeline is None:
+            path = self.store.path(self.key("timeline.jsonl"))
+            entries = []
+            if path.exists():
+                for line in path.read_bytes().splitlines():
+                    if line.strip():
+                        entry = serialization.loads(line)
+                        entries.append((entry['timestamp'], entry['manifest']))
+            self._timeline = entries
+        return self._timeline
+
+    def manifest(self, digest: str) -> dict:
+        return self.store.read_json(self.key("manifests", f"{digest}.json"))
+
+    def current(self) -> dict:
+        """
+        {unit_code: object hash} of the latest state
+        """
+        if self._current is None:
+            timeline = self.timeline()
+            self._current = self.manifest(timeline[-1][1]) if timeline else {}
+        return self._current
+
+    @instrumentation.timed("snapshots")
+    def put(self, results: list, timestamp=None) -> dict:
+        """
+        Record a poll of unit results. Units missing from `results` keep their previous state.
+        :param timestamp: time of the poll (defaults to now)
+        :return: {"timestamp", "manifest", "changed", "new_objects"}; manifest is None if nothing changed
+        """
+        timestamp = timestamp_of(timestamp or datetime.now(timezone.utc))
+        with self._lock:
+            timeline = self.timeline()
+            if timeline and timestamp < timeline[-1][0]:
+                raise ValueError(f"Snapshot {timestamp} is older than the latest snapshot {timeline[-1][0]}")
+
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                written = list(pool.map(lambda r: self.write_object(self.canonical(r)), results))
+            state = dict(self.current())
+            changed = 0
+            for result, (digest, _) in zip(results, written):
+                if state.get(result['unit_code']) != digest:
+                    state[result['unit_code']] = digest
+                    changed += 1
+            summary = {
+                "timestamp": timestamp, "manifest": None, "changed": changed,
+                "new_objects": sum(new for _, new in written),
+            }
+            if not changed:
+                return summary
+
+            state = dict(sorted(state.items()))
+            manifest = hashlib.sha256(serialization.dumps(state)).hexdigest()
+            manifest_key = self.key("manifests", f"{manifest}.json")
+            if not self.store.exists(manifest_key):
+                self.store.write_json(state, manifest_key)
+            with open(self.store.path(self.key("timeline.jsonl")), "ab") as f:
+                f.write(serialization.dumps({"timestamp": timestamp, "manifest": manifest}) + b"\n")
+            timeline.append((timestamp, manifest))
+            self._current = state
+            summary['manifest'] = manifest
+            return summary
+
+    def state_at(self, timestamp):
+        """
+        :return: (snapshot timestamp, manifest) of the latest state at or before `timestamp`, or (None, {})
+        """
+        timeline = self.timeline()
+        i = bisect_right([t for t, _ in timeline], timestamp_of(timestamp))
+        if not i:
+            return None, {}
+        snapshot, digest = timeline[i - 1]
+        return snapshot, self.manifest(digest)
+
+    def restore(self, result: dict, snapshot: str) -> dict:
+        return {**result, "retrieved_on": snapshot[:10]} if "retrieved_on" in self.VOLATILE else result
+
+    def as_of(self, timestamp) -> list:
+        """
+        Unit results as they stood at `timestamp`
+        :return: list of result dicts ordered by unit code (empty before the first snapshot)
+        """
+        snapshot, state = self.state_at(timestamp)
+        if snapshot is None:
+            return []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.read_object, state.values()))
+        return [self.restore(result, snapshot) for result in results]
+
+    def latest(self) -> list:
+        timeline = self.timeline()
+        return self.as_of(timeline[-1][0]) if timeline else []
+
+    def history(self, unit_code: str) -> list:
+        """
+        Every distinct state of one unit
+        :return: [(timestamp first seen, result)]
+        """
+        versions = []
+        previous = None
+        for timestamp, digest in self.timeline():
+            current = self.manifest(digest).get(unit_code)
+            if current is not None and current != previous:
+                versions.append((timestamp, self.restore(self.read_object(current), timestamp)))
+            previous = current
+        return versions
@@ -1,2 +1,86 @@
-## In case of analog testing for anything form the US -- in case nor gets too confusing
-## Will be deleted lol
\ No newline at end of file
+from results_processor import ResultsPipeline
+
+
+class UnitedStatesPipeline(ResultsPipeline):
+    """
+    US presidential results by county from a local copy of the MIT Election Data and Science Lab county returns
+    (countypres_2000-2020.csv: year, state, state_po, county_name, county_fips, office, candidate, party,
+    candidatevotes, totalvotes, mode).
+
+    Adapter only: one local file source, parsing rules for the MEDSL columns, and a state hierarchy derived from the
+    county FIPS codes (the first two digits are the state). Fetching, storage and the state/national roll-ups are the
+    shared ResultsPipeline engines.
+
+    Units:
+        * 1 - states (aggregated from counties)
+        * 2 - counties, keyed by five digit FIPS code
+    """
+    country = "usa"
+    levels = {2: "2"}
+    election_type = "presidential"
+    OFFICE = "US PRESIDENT"
+
+    def __init__(self, year, path, **kwargs):
+        """
+        :param path: county returns CSV
+        """
+        super().__init__(year, **kwargs)
+        self.path = path
+        self.states = {}
+
+    def sources(self, level) -> list:
+        return [{"id": "countypres", "path": self.path}]
+
+    def parse(self, level, payloads: dict) -> list:
+        import pandas as pd
+
+        rows = payloads['countypres']
+        rows = rows[(rows["year"].astype(int) == self.year) & (rows["office"] == self.OFFICE)].dropna(
+            subset=["county_fips"]
+        )
+        rows = rows.assign(
+            unit_code=rows["county_fips"].str.split(".").str[0].str.zfill(5),
+            party=rows["party"].fillna("OTHER"),
+            candidatevotes=pd.to_numeric(rows["candidatevotes"]).fillna(0).astype(int),
+            totalvotes=pd.to_numeric(rows["totalvotes"]),
+        )
+        self.states = dict(zip(rows["unit_code"].str[:2], rows["state"].str.title()))
+
+        # returns are split by voting mode (election day, absentee, ...) in some states, and several candidates can
+        # share a party (write-ins and minor candidates under OTHER): sum them into one row per party, named after
+        # its candidate where there is only one
+        votes = rows.groupby(["unit_code", "party"], sort=True).agg(
+            candidatevotes=("candidatevotes", "sum"),
+            candidate=("candidate", "first"),
+            candidates=("candidate", "nunique"),
+        ).reset_index()
+        votes["party_name"] = votes["candidate"].str.title().where(votes["candidates"] == 1, votes["party"].str.title())
+        totals = rows.groupby("unit_code")["totalvotes"].max()  # county total, repeated on every row
+        names = rows.groupby("unit_code").agg(county_name=("county_name", "first"), state_po=("state_po", "first"))
+
+        results = []
+        for unit_code, unit_votes in votes.groupby("unit_code", sort=True):
+            results.append(self.unit_result(
+                self.year, self.election_type, self.levels[level], unit_code,
+                f"{names.at[unit_code, 'county_name'].title()}, {names.at[unit_code, 'state_po']}",
+                votes=[
+                    {"party_code": party, "party_name": name, "votes": int(count)}
+                    for party, name, count in unit_votes[["party", "party_name", "candidatevotes"]].itertuples(
+                        index=False, name=None
+                    )
+                ],
+                valid_votes_cast=int(totals[unit_code]),
+            ))
+        return results
+
+    def hierarchy(self, table) -> list:
+        counties = sorted(table.units["unit_code"])
+        unit_mappings = [
+            {
+                "source_unit_code": state,
+                "source_unit_name": name,
+                "target_units": [{"target_unit_code": code} for code in counties if code[:2] == state],
+            }
+            for state, name in sorted(self.states.items())
+        ]
+        return [{"level_1_type_code": "1", "level_1_type_name": "state", "unit_mappings": unit_mappings}]